@@ -8,13 +8,17 @@
 #TODO: exit function should be replaced by exceptions.
 
 
+import functools
+
 import numpy as np
 import math
 from sys import exit
 
+from exceptions import IllegalMassSizeError
+
 def mtobetp(InputVec):
     """Computing BetP on the signal points from the m vector (InputVec) out = BetP
-    vector beware: not optimize, so can be slow for >10 atoms
+    vector. See mtobetpBatch for a whole matrix of masses.
     """
     # the length of the power set, f
     mf = InputVec.size
@@ -26,14 +30,7 @@ def mtobetp(InputVec):
             exit("warning: all bba is given to the empty set, check the frame\n")
             out = np.ones(natoms)/natoms
         else:
-            betp = np.zeros(natoms)
-            for i in range(1, mf - 1):
-                # x , the focal sets InputVec the dec2bin form
-                x = np.array(list(map(int,np.binary_repr(i, natoms)))[::-1]) # reverse the binary expression
-                # m_i is assigned to all the signal points equally
-                
-                betp = betp + np.multiply(InputVec[i]/sum(x), x)
-            out = np.divide(betp,(1.0 - InputVec[0]))
+            out = mtobetpBatch(InputVec.reshape(mf))
         return out
     else:
         exit("Error: the length of the InputVec vector should be power set of 2\n")
@@ -48,20 +45,10 @@ def mtoq(InputVec):
     Return:
     out: vector q
     """
-    InputVec = InputVec.copy()
     mf = InputVec.size
     natoms =round(math.log(mf,2))
     if math.pow(2, natoms) == mf:
-        for i in range(natoms):
-            i124 = int(math.pow(2, i))
-            i842 = int(math.pow(2, natoms - i))
-            i421 = int(math.pow(2, natoms - i - 1))
-            InputVec = InputVec.reshape(i124, i842,order='F')
-            #for j in range(1, i421 + 1): #to be replaced by i842
-            for j in range(i421):    #not a good way for add operation coz loop matrix for i842 times
-                InputVec[:, j * 2 ] = InputVec[:, j * 2 ] + InputVec[:, j * 2+1]
-        out = InputVec.reshape(1,mf,order='F')[0]
-        return out
+        return mtoqBatch(InputVec.reshape(mf))
     else:
         print("ACCIDENT in mtoq: length of input vector not OK: should be a power of 2\n")
             
@@ -75,20 +62,10 @@ def mtob(InputVec):
     Comput InputVec from m to b function.  belief function + m(emptset) InputVec = m
     vector out = b vector
     """
-    InputVec = InputVec.copy()
     mf = InputVec.size
     natoms =round(math.log(mf,2))
     if math.pow(2, natoms) == mf:
-        for i in range(natoms):
-            i124 = int(math.pow(2, i))
-            i842 = int(math.pow(2, natoms - i))
-            i421 = int(math.pow(2, natoms - i - 1))
-            InputVec = InputVec.reshape(i124, i842,order='F')
-            #for j in range(1, i421 + 1): #to be replaced by i842
-            for j in range(i421):    #not a good way for add operation coz loop matrix for i842 times
-                InputVec[:, j * 2 + 1 ] = InputVec[:, j * 2 + 1 ] + InputVec[:, j * 2]
-        out = InputVec.reshape(1,mf,order='F')[0]
-        return out
+        return mtobBatch(InputVec.reshape(mf))
     else:
         exit("ACCIDENT in mtoq: length of input vector not OK: should be a power of 2\n")
 
@@ -112,21 +89,249 @@ def qtom(InputVec):
     input: vetor q
     output: vetor m
     """
-    InputVec = InputVec.copy()
     lm = InputVec.size
     natoms =round(math.log(lm,2))
     if math.pow(2, natoms) == lm:
-        for i in range(natoms):
-            i124 = int(math.pow(2, i))
-            i842 = int(math.pow(2, natoms - i))
-            i421 = int(math.pow(2, natoms - i - 1))
-            InputVec = InputVec.reshape(i124, i842, order='F')
-            #for j in range(1, i421 + 1): #to be replaced by i842
-            for j in range(i421):    #not a good way for add operation coz loop matrix for i842 times
-                InputVec[:, j * 2 ] = InputVec[:, j * 2 ] - InputVec[:, j * 2+1]
-        out = InputVec.reshape(1,lm,order='F')[0]
-        return out
+        return qtomBatch(InputVec.reshape(lm))
     else:
         exit("ACCIDENT in qtom: length of input vector not OK: should be a power of 2\n")
             
 
+
+
+#### Batched FMT kernels ####
+# The power set is indexed by bitmask: bit i of the index is set when the i-th atom
+# belongs to the subset. Reshaping the first axis into natoms axes of length 2 (C order)
+# puts the highest bit on the first axis, so each stage of the butterfly is a single
+# vectorized operation between the two halves of one axis.
+
+def _natoms(nbFE):
+    """Return the number of atoms of a power set with nbFE elements."""
+    natoms = int(nbFE).bit_length() - 1
+    if nbFE < 1 or (1 << natoms) != nbFE:
+        raise IllegalMassSizeError("ACCIDENT: the number of focal elements should be a power of 2\n")
+    return natoms
+
+
+def _butterfly(MassMat, inplace, ufunc, target):
+    """Run the FMT butterfly on the first axis of MassMat.
+
+    On every stage, the half of the axis selected by target (0 or 1) is updated with
+    ufunc(target half, other half).
+    """
+    if inplace:
+        if not (isinstance(MassMat, np.ndarray) and MassMat.flags.c_contiguous
+                and MassMat.flags.writeable and np.issubdtype(MassMat.dtype, np.floating)):
+            raise ValueError("inplace transform needs a writeable C-contiguous float array")
+        out = MassMat
+    else:
+        MassMat = np.asarray(MassMat)
+        dtype = MassMat.dtype if np.issubdtype(MassMat.dtype, np.floating) else float
+        out = np.array(MassMat, dtype=dtype, order='C')
+    natoms = _natoms(out.shape[0])
+    view = out.reshape((2,) * natoms + out.shape[1:])
+    for axis in range(natoms):
+        pre = (slice(None),) * axis
+        tgt = view[pre + (target, Ellipsis)]
+        ufunc(tgt, view[pre + (1 - target, Ellipsis)], out=tgt)
+    return out
+
+
+def mtoqBatch(MassMat, inplace=False):
+    """
+    Computing FMT from m to q on every column of a mass matrix.
+
+    Parameters
+    -----------
+    MassMat: ndarray
+        masses of size 2^n on the first axis. Each column is a mass vector.
+    inplace: bool
+        if True, MassMat (a C-contiguous float array) is overwritten by the result.
+
+    Return
+    -----------
+    out: ndarray
+        commonality functions, same shape as MassMat
+    """
+    return _butterfly(MassMat, inplace, np.add, 0)
+
+
+def mtobBatch(MassMat, inplace=False):
+    """
+    Computing FMT from m to b (belief function + m(emptyset)) on every column of a mass matrix.
+    See mtoqBatch for the parameters.
+    """
+    return _butterfly(MassMat, inplace, np.add, 1)
+
+
+def qtomBatch(MassMat, inplace=False):
+    """
+    Computing FMT from q to m on every column of a commonality matrix.
+    See mtoqBatch for the parameters.
+    """
+    return _butterfly(MassMat, inplace, np.subtract, 0)
+
+
+def btomBatch(MassMat, inplace=False):
+    """
+    Computing FMT from b to m on every column of an implicability matrix.
+    See mtoqBatch for the parameters.
+    """
+    return _butterfly(MassMat, inplace, np.subtract, 1)
+
+
+def isSingletonOmega(mass, axis=0):
+    """Whether the only focal elements of the masses (subsets on the given axis) are singletons, the frame and the empty set."""
+    mass = np.asarray(mass)
+    nbFE = mass.shape[axis]
+    used = np.flatnonzero(np.any(mass != 0, axis=tuple(d for d in range(mass.ndim) if d != axis)))
+    return bool(np.all(((used & (used - 1)) == 0) | (used == nbFE - 1)))
+
+
+#### Canonical decompositions (Denoeux) ####
+# A non dogmatic mass (m(Omega) > 0) is the conjunctive combination of the simple masses
+# A^w(A), A != Omega, where A^w gives 1 - w to A and w to Omega. Its conjunctive weights are
+#     ln w(A) = - sum_{B superset of A} (-1)^(|B| - |A|) ln q(B),
+# the Mobius transform of ln q, computed with the butterfly of qtom. Conversely
+#     ln q(A) = sum_{B != Omega, A not subset of B} ln w(B).
+# A subnormal mass (m(emptyset) > 0) is the disjunctive combination of the masses A_v(A),
+# A != emptyset, giving v to the empty set and 1 - v to A. Its disjunctive weights are
+#     ln v(A) = - sum_{B subset of A} (-1)^(|A| - |B|) ln b(B),
+# computed with the butterfly of btom. The weight of the excluded set (w(Omega), v(emptyset))
+# is set to 1. The weights of dogmatic masses for w, normal masses for v, are not finite: discount
+# them first (see combinationRules.DSTBatch, parameter epsilon).
+
+def _logWeights(Mat, target):
+    """Mobius transform of the logarithms of Mat (q for target 0, b for target 1), negated."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.ascontiguousarray(np.log(Mat, dtype=np.float64))
+        _butterfly(out, True, np.subtract, target)
+    np.negative(out, out=out)
+    out[-1 if target == 0 else 0] = 0.0
+    return out
+
+
+def _fromLogWeights(WMat, target):
+    """Inverse of _logWeights: q (target 0) or b (target 1) from weights."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.ascontiguousarray(np.log(WMat, dtype=np.float64))
+        out[-1 if target == 0 else 0] = 0.0
+        _butterfly(out, True, np.add, target)
+        # the sum of all the log weights is ln q(Omega) = ln m(Omega), or ln b(emptyset) = ln m(emptyset)
+        np.subtract(out[0 if target == 0 else -1], out, out=out)
+    return np.exp(out, out=out)
+
+
+def qtowBatch(QMat):
+    """
+    Computing the conjunctive weights from the commonalities, on every column of QMat.
+    See mtoqBatch for the shapes; the weights are always float64 and w(Omega) = 1.
+    """
+    return np.exp(_logWeights(QMat, 0))
+
+
+def wtoqBatch(WMat):
+    """
+    Computing the commonalities from the conjunctive weights, on every column of WMat.
+    w(Omega) is not used.
+    """
+    return _fromLogWeights(WMat, 0)
+
+
+def btovBatch(BMat):
+    """
+    Computing the disjunctive weights from the implicabilities, on every column of BMat.
+    v(emptyset) = 1.
+    """
+    return np.exp(_logWeights(BMat, 1))
+
+
+def vtobBatch(VMat):
+    """
+    Computing the implicabilities from the disjunctive weights, on every column of VMat.
+    v(emptyset) is not used.
+    """
+    return _fromLogWeights(VMat, 1)
+
+
+def mtowBatch(MassMat):
+    """Conjunctive weights of non dogmatic masses, see qtowBatch."""
+    return qtowBatch(mtoqBatch(MassMat))
+
+
+def wtomBatch(WMat):
+    """Masses from conjunctive weights, see wtoqBatch."""
+    return qtomBatch(wtoqBatch(WMat), inplace=True)
+
+
+def mtovBatch(MassMat):
+    """Disjunctive weights of subnormal masses, see btovBatch."""
+    return btovBatch(mtobBatch(MassMat))
+
+
+def vtomBatch(VMat):
+    """Masses from disjunctive weights, see vtobBatch."""
+    return btomBatch(vtobBatch(VMat), inplace=True)
+
+
+
+#### Cached tables of the power set ####
+
+@functools.lru_cache(maxsize=None)
+def membershipMatrix(natoms):
+    """
+    Subset membership table of a frame with natoms atoms.
+    
+    Return
+    -----------
+    out: ndarray of shape (natoms, 2^natoms), read only
+        out[i, A] is 1 if the i-th atom belongs to the subset A, else 0.
+    """
+    out = (np.arange(1 << natoms)[np.newaxis, :] >> np.arange(natoms)[:, np.newaxis]) & 1
+    out = out.astype(float)
+    out.setflags(write=False)
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def cardinalityVector(natoms):
+    """
+    Cardinality of every subset of a frame with natoms atoms, as a read only int vector of size 2^natoms.
+    """
+    out = membershipMatrix(natoms).sum(axis=0).astype(int)
+    out.setflags(write=False)
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _betpMatrix(natoms):
+    """Share every subset equally among its atoms: membershipMatrix / cardinality, empty set column is 0."""
+    out = membershipMatrix(natoms) / np.maximum(cardinalityVector(natoms), 1)
+    out.setflags(write=False)
+    return out
+
+
+def mtobetpBatch(MassMat):
+    """
+    Computing BetP on the signal points for every column of a mass matrix, with one matrix product.
+    A column whose mass is all given to the empty set gets the uniform probability.
+    
+    Parameters
+    -----------
+    MassMat: ndarray
+        masses of size 2^n on the first axis. Each column is a mass vector.
+    
+    Return
+    -----------
+    out: ndarray
+        pignistic probabilities, of size n on the first axis
+    """
+    MassMat = np.asarray(MassMat, dtype=float)
+    natoms = _natoms(MassMat.shape[0])
+    flat = MassMat.reshape(MassMat.shape[0], -1)
+    betp = _betpMatrix(natoms) @ flat
+    normal = 1.0 - flat[0]
+    conflict = normal <= 0
+    betp[:, ~conflict] /= normal[~conflict]
+    betp[:, conflict] = 1.0 / natoms
+    return betp.reshape((natoms,) + MassMat.shape[1:])
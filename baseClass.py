@@ -1,26 +1,102 @@
 """
 Definition of basic class used in the experiment
-The basic classes are PairBelief, Alternative and User
+The basic classes are PairBelief, Alternative and User.
+The beliefs of all the pairs of a user are stored in a PairBeliefTable.
 """
 #
 #Author: Yiru ZHANG <yiru.zhang@irisa.fr>
 #License: Unlicense
 
 
+import os
 import math
 import itertools
-import csv
+from collections import OrderedDict
+from collections.abc import MutableMapping
 
 import numpy as np
-import matplotlib.pyplot as plt
-import networkx as nx
 
-from combinationRules import *
+# networkx and matplotlib are imported when a graph is drawn, so that the fusion code does not load them
+from DST_fmt_functions import mtobetp
+from decisionDST import decisionDST
+import instrumentation
+from preferenceGraph import PreferenceGraph, relationEdges
 from exceptions import IllegalMassSizeError
 from sys import version_info
 if version_info[0] == 3: # python 3
     from functools import reduce
     
+
+#columns of the mass arrays, for a pair (a, b) and for the same pair seen as (b, a)
+_MASS_COLUMNS = {"pref": 0, "invPref": 1, "indiff": 2, "incompa": 3, "empty": 4, "ignorance": 5}
+_SWAPPED_COLUMNS = dict(_MASS_COLUMNS, pref = 1, invPref = 0)
+
+
+class _LRUCache():
+    """Mapping of bounded size, evicting the least recently used entries."""
+    def __init__(self, maxSize):
+        self.maxSize_ = maxSize
+        self.data_ = OrderedDict()
+    
+    def __len__(self):
+        return len(self.data_)
+    
+    def get(self, key, default = None):
+        if key not in self.data_:
+            return default
+        self.data_.move_to_end(key)
+        return self.data_[key]
+    
+    def put(self, key, value):
+        self.data_[key] = value
+        self.data_.move_to_end(key)
+        if len(self.data_) > self.maxSize_:
+            self.data_.popitem(last = False)
+    
+    def discard(self, keys):
+        """Remove the given keys if they are cached."""
+        if len(keys) > len(self.data_):
+            keys = set(keys)
+            for key in [key for key in self.data_ if key in keys]:
+                del self.data_[key]
+        else:
+            for key in keys:
+                self.data_.pop(key, None)
+    
+    def clear(self):
+        self.data_.clear()
+
+
+class _MassDict(MutableMapping):
+    """
+    Dictionary view on the mass values of a PairBelief: values are read from and written to its array.
+    Writing a value clears the cached quantities of the belief.
+    """
+    __slots__ = ("belief_",)
+    
+    def __init__(self, belief):
+        self.belief_ = belief
+    
+    def __getitem__(self, key):
+        return float(self.belief_.massArr_[self.belief_.columns_[key]])
+    
+    def __setitem__(self, key, value):
+        self.belief_.massArr_[self.belief_.columns_[key]] = value
+        self.belief_._invalidate()
+    
+    def __delitem__(self, key):
+        raise TypeError("mass types of a PairBelief cannot be removed")
+    
+    def __iter__(self):
+        return iter(self.belief_.columns_)
+    
+    def __len__(self):
+        return len(self.belief_.columns_)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
+
 #define the class for belief fuction of one pairwise relation
 class PairBelief():
     """Belief function for a pairwise relation.
@@ -40,6 +116,7 @@ class PairBelief():
     massValDict_ : Dict of float
         Dictionary containing preference, inverse preference, indifference
         and incomparability mass function values.
+        It is a view on massArr_: setting a value changes the belief.
         It includes following keys:
     pref:
         mass function value for aPb.
@@ -58,29 +135,64 @@ class PairBelief():
         
     ignorance:
         mass function value for ignorance.
+    
+    massArr_ : ndarray of 6 floats
+        mass values in the order of the keys above. For a belief taken from a User,
+        it is a row of the PairBeliefTable of the user.
+    
+    The mean mass vector, BetP and relations derived from the masses are cached, in the belief
+    or in the table it is a view on, until the masses are changed through setMass, autoGen or
+    massValDict_.
     """
-    def __init__(self, massList): #, massIgnor=1)
+    massTypeList_ = ["pref","invPref", "indiff", 
+                     "incompa", "ignorance"] #we omit "empty" here coz it's not used
+    #type list is used to order the dictionary
+    
+    def __init__(self, massList, massEmpty=0): #, massIgnor=1)
         if len(massList) != 4:
             raise IllegalMassSizeError("ACCIDENT: mass lengh should be 4")
         massPref,massInvPref,massIndiff, massIncompa = massList
-        self.massTypeList_ = ["pref","invPref", "indiff", 
-                             "incompa", "ignorance"] #we omit "empty" here coz it's not used
-        #type list is used to order the dictionary
-        self.massValDict_ = {"pref": massPref,
-                           "invPref" : massInvPref,
-                           "indiff": massIndiff,
-                           "incompa": massIncompa,
-                           "empty":massEmpty, 
-                           "ignorance" :1.0-massPref-massInvPref-massIndiff
-                            -massIncompa-massEmpty 
-                           }
+        self.massArr_ = np.array([massPref, massInvPref, massIndiff, massIncompa, massEmpty,
+                                  1.0-massPref-massInvPref-massIndiff-massIncompa-massEmpty], dtype = float)
+        self.columns_ = _MASS_COLUMNS
+        self.table_ = None  # PairBeliefTable and row of a view
+        self.row_ = None
+        self.cache_ = {}
         #self.massPref_ = massPref
         #self.massInvPref_ = massInvPref
         #self.massIndiff_ = massIndiff
         #self.massIncompa_ = massIncompa 
         #self.massNull_ = massNull
         #self.massIgnor_ = 1.0-massPref-massInvPref-massIndiff-massIncompa-massNull
-        
+    
+    @property
+    def massValDict_(self):
+        return _MassDict(self)
+    
+    def _getCached(self, name):
+        """Return a cached derived quantity, None if it is not cached."""
+        if self.table_ is None:
+            return self.cache_.get(name)
+        entry = self.table_.cache_.get(self.row_)
+        return None if entry is None else entry.get((name, self.columns_ is _SWAPPED_COLUMNS))
+    
+    def _setCached(self, name, value):
+        if self.table_ is None:
+            self.cache_[name] = value
+            return
+        entry = self.table_.cache_.get(self.row_)
+        if entry is None:
+            entry = {}
+            self.table_.cache_.put(self.row_, entry)
+        entry[(name, self.columns_ is _SWAPPED_COLUMNS)] = value
+    
+    def _invalidate(self):
+        """Forget the cached quantities, the masses have changed."""
+        if self.table_ is None:
+            self.cache_.clear()
+        else:
+            self.table_.invalidate([self.row_])
+    
     
     def setMass(self, massPref=0, massInvPref=0,
                 massIndiff=0, massIncompa=0, massNull=0): #, massIgnor=1)
@@ -109,7 +221,8 @@ class PairBelief():
             criterion=2 maximum of the credibility
             criterion=3 maximum of the credibility with rejection
 	        criterion=4 maximum of the pignistic probability
-	        criterion=5 Appriou criterion (decision onto \eqn{2^\Theta})
+	        criterion=5 Appriou criterion (decision onto \eqn{2^\Theta}), a subset of several
+	            relations gives 5, see decideRelations
         
         Ignorance is returned only when it's 1
         """ 
@@ -118,39 +231,50 @@ class PairBelief():
         
       
         # return 1 # for test
+        relation = self._getCached(("relation", criterion))
+        if relation is not None:
+            return relation
         if (self.massValDict_["ignorance"] == 1):
-            return 5 #5 for ignorance
+            relation = 5 #5 for ignorance
         else:
-            relation = int(decisionDST(self.getMeanMassVect(),criterion))   # decision with rule probP (4)
-            
-            return relation
+            relation = int(decideRelations(self.getMeanMassVect(),criterion)[0])   # decision with rule probP (4)
+        self._setCached(("relation", criterion), relation)
+        return relation
+    
+    def getBetP(self):
+        """Return the pignistic probabilities of the 4 relations (pref, invPref, indiff, incompa), from the mean mass vector."""
+        betP = self._getCached("betP")
+        if betP is None:
+            betP = mtobetp(self.getMeanMassVect())
+            self._setCached("betP", betP)
+        return betP.copy()
     
+    @instrumentation.instrumented("meanMassVect", lambda self: (1, self.massArr_.nbytes))
     def getMeanMassVect(self):
         """
         Construct a mass vector with binary discernment of 2^Omega
         The returned mass vector combines all mass vectors of each singleton follonwing the averange rule. (criterion = 12 in combinationRules.py)
-        In the paper, natural discernment is represented by {w1, w2, w3, w4}, so discernment has 16 elements in which 5 are focal (4 singletons + empty element )
+        In the paper, natural discernment is represented by {w1, w2, w3, w4}, so discernment has 16 elements in which 5 are focal (4 singletons + Omega for ignorance)
         The order of the vector respect the order of the discernment 2^Omega 
         """
+        meanMass = self._getCached("meanMass")
+        if meanMass is not None:
+            return meanMass.copy()
         
-        Omega = 4   #4 singletons in this case
-        nbFE = math.pow(2,Omega)    #focal elements number
-        massVects = np.zeros((Omega,nbFE))
-        for i in range(Omega):
-            messVects[i][int(math.pow(2,i))] = self.massValDict_[self.massTypeList_[i]]
-        meanMassSingle = DST(massVects,criterion=12)    #combination on mean rules
-        meanMass = np.zeros(nbFE)
-        for i in range(Omega):
-            meanMass[int(math.pow(2,i))] = meanMassSingle[i]
-        return meanMass  #combination on mean rules
+        # mean of the 4 simple masses m({w_i}) = mass of the i-th relation, m(Omega) = the rest,
+        # computed in closed form (see meanMassMatrix)
+        singles = np.array([[self.massValDict_[massType] for massType in self.massTypeList_[:4]]])
+        meanMass = meanMassMatrix(singles)[:,0]
+        self._setCached("meanMass", meanMass)
+        return meanMass.copy()  #combination on mean rules
         
         
         
-    def autoGen(self, relation=0):
+    def autoGen(self, relation=None, rng=None):
         """Generate mass function values automatically. Simplify the experiment process.
-        The mass function value is a float randomly generated from 0 to 1.
-        If relationship type is given, the largest generated mass function value is distributed
-        to the given relationship.
+        The mass function values are drawn from a uniform Dirichlet distribution over the 5 types
+        (see generator.randomMasses). If relationship type is given, the largest generated mass
+        function value is distributed to the given relationship.
         
         The relationship type is represented by integers:
         0 for strict preference (aPb)
@@ -161,25 +285,255 @@ class PairBelief():
         
         Parameter
         -----------------
-        relation : int from 0 to 4
+        relation : int from 0 to 4, optional
         wanted relation type.
+        rng : np.random.Generator or seed, optional
         """
-        #TODO exception for illegal relation value
-        
-        keyList = self.massTypeList_.copy()
-        
-        randomValueList = np.random.dirichlet(np.ones(5),size=1).tolist()[0]
-        if (relation != 0 ):
-            self.massValDict_[keyList[relation - 1]] = max(randomValueList)
-            keyList.pop(relation-1) 
-            randomValueList.remove(max(randomValueList))
-        keyList = random.shuffle(keyList)
-        for i in range(len(keyList)):
-            self.massValDict_[keyList[i]] = randomValueList[i]    
-            
-            
+        from generator import randomMasses
+        if relation is not None and relation not in range(5):
+            raise ValueError("ACCIDENT: relation should be an integer from 0 to 4")
+        masses = randomMasses(1, rng, None if relation is None else [relation])[0]
+        self.setMass(*masses[:4].tolist())
             
             
+def meanMassMatrix(singles):
+    """
+    Mean mass vectors (see PairBelief.getMeanMassVect) of pairs given by the masses (k, 4) of
+    pref, invPref, indiff and incompa, one vector per column: a (16, k) matrix.
+    """
+    massMat = np.zeros((16, singles.shape[0]))
+    massMat[[1, 2, 4, 8]] = singles.T / 4.0
+    massMat[-1] = 1.0 - singles.sum(axis = 1) / 4.0
+    return massMat
+
+
+def pairRows(n, i, j):
+    """
+    Rows of the pairs of positions (i, j) in the upper-triangular order of n alternatives
+    (see PairBeliefTable), and whether each pair is stored in the other orientation (i > j).
+    """
+    i = np.asarray(i, dtype = np.int64)
+    j = np.asarray(j, dtype = np.int64)
+    if np.any(i == j):
+        raise ValueError("an alternative is not paired with itself")
+    swapped = i > j
+    lo = np.where(swapped, j, i)
+    hi = np.where(swapped, i, j)
+    return lo * n - lo * (lo + 1) // 2 + hi - lo - 1, swapped
+
+
+def decideRelations(meanMass, criterion = 4, singletonOmega = None, r = 0.5):
+    """
+    Relations (see PairBelief.getRelation) decided by decisionDST on mean mass vectors (16, k).
+    The Appriou criterion (5) decides a subset of the 4 relations: a singleton is its relation,
+    a larger subset leaves the pair undecided, 5 as for ignorance. r is the parameter of Appriou.
+    """
+    decisions = decisionDST(meanMass, criterion, r, singletonOmega = singletonOmega)
+    if criterion == 5:
+        decisions = np.asarray(decisions)
+        single = (decisions & (decisions - 1)) == 0
+        decisions = np.where(single & (decisions > 0), np.log2(np.maximum(decisions, 1)).astype(int), 5)
+    return decisions
+
+
+class PairBeliefTable():
+    """Belief functions of all the pairwise relations among a list of alternatives.
+    
+    The masses of the n(n-1)/2 pairs are stored in one contiguous array, one row per pair.
+    The pair of the i-th and the j-th alternatives (i < j) is stored in the upper-triangular
+    order, at row i*n - i*(i+1)/2 + j - i - 1, oriented as (alterList_[i], alterList_[j]):
+    "pref" is the mass of "alterList_[i] is preferred to alterList_[j]".
+    
+    Getters and setters take alternatives or positions as arrays, so that many pairs are
+    read or written at once. They are oriented as given: setting the masses of (b, a) stores
+    "pref" as the inverse preference of (a, b).
+    
+    Attributes
+    -------------
+    alterList_ : list
+        the alternatives, their positions in this list index the pairs.
+    
+    massArr_ : ndarray of shape (nbPairs, 6)
+        mass values of every pair, columns in the order pref, invPref, indiff, incompa, empty, ignorance.
+    
+    defined_ : ndarray of bool
+        True for the pairs whose masses have been given.
+    
+    present_ : ndarray of bool
+        True for the pairs known by the user (with or without masses).
+    
+    cache_ : LRU cache
+        quantities derived from the masses of the most recently used rows (see PairBelief),
+        at most cacheSize rows. The rows are invalidated when their masses are set.
+    """
+    def __init__(self, alterList, dtype = float, cacheSize = 4096):
+        self.alterList_ = list(alterList)
+        self.alterIndex_ = {alter: i for i, alter in enumerate(self.alterList_)}
+        n = len(self.alterList_)
+        self.nbPairs_ = n * (n - 1) // 2
+        self.massArr_ = np.zeros((self.nbPairs_, 6), dtype = dtype)
+        self.massArr_[:, 5] = 1.0 # ignorance
+        self.defined_ = np.zeros(self.nbPairs_, dtype = bool)
+        self.present_ = np.zeros(self.nbPairs_, dtype = bool)
+        self.cache_ = _LRUCache(cacheSize)
+        self.decisions_ = {}    # criterion -> (rows, relations) of all the defined rows
+        self.listeners_ = []    # functions called with the rows whose masses change
+    
+    def invalidate(self, rows):
+        """Forget the cached quantities of the given rows and notify the listeners."""
+        rows = np.asarray(rows).ravel().tolist()
+        self.cache_.discard(rows)
+        self.decisions_.clear()
+        for listener in self.listeners_:
+            listener(rows)
+    
+    def positions(self, alters):
+        """Return the positions of the given alternatives in alterList_."""
+        return np.array([self.alterIndex_[alter] for alter in alters], dtype = np.int64)
+    
+    def pairIndex(self, i, j):
+        """
+        Return the rows of the pairs of positions (i, j), and whether each pair is stored
+        in the other orientation (i > j).
+        """
+        return pairRows(len(self.alterList_), i, j)
+    
+    def pairPositions(self, rows):
+        """Return the positions (i, j), i < j, of the alternatives of the given rows."""
+        rows = np.asarray(rows, dtype = np.int64)
+        n = len(self.alterList_)
+        start = lambda i: i * n - i * (i + 1) // 2   # first row of the pairs (i, .)
+        # invert the upper-triangular index, then correct the rounding of the square root
+        lo = n - 2 - np.floor(np.sqrt(-8.0 * rows + 4 * n * (n - 1) - 7) / 2.0 - 0.5).astype(np.int64)
+        lo = np.where(start(lo) > rows, lo - 1, lo)
+        lo = np.where(start(lo + 1) <= rows, lo + 1, lo)
+        return lo, rows - start(lo) + lo + 1
+    
+    def getRows(self, rows, swapped = None):
+        """Return the masses (k, 6) of the given rows, inverted where swapped is True."""
+        masses = self.massArr_[rows]
+        if swapped is not None:
+            masses[np.asarray(swapped), :2] = masses[np.asarray(swapped)][:, [1, 0]]
+        return masses
+    
+    def setRows(self, rows, masses, swapped = None):
+        """
+        Set the masses of the given rows.
+        masses has 4 columns (pref, invPref, indiff, incompa), 5 columns (with empty) or 6 columns
+        (with ignorance). The ignorance is computed when it is not given. Rows where swapped is
+        True are given in the other orientation.
+        """
+        masses = np.array(masses, dtype = self.massArr_.dtype, ndmin = 2)
+        nbTypes = masses.shape[1]
+        if nbTypes not in (4, 5, 6):
+            raise IllegalMassSizeError("ACCIDENT: masses should have 4, 5 or 6 columns")
+        if swapped is not None:
+            masses[np.asarray(swapped), :2] = masses[np.asarray(swapped)][:, [1, 0]]
+        values = np.zeros((masses.shape[0], 6), dtype = self.massArr_.dtype)
+        values[:, :nbTypes] = masses
+        if nbTypes < 6:
+            values[:, 5] = 1.0 - values[:, :5].sum(axis = 1)
+        self.massArr_[rows] = values
+        self.defined_[rows] = True
+        self.present_[rows] = True
+        self.invalidate(rows)
+    
+    def getMasses(self, altersA, altersB):
+        """Return the masses (k, 6) of the pairs (altersA[k], altersB[k]), oriented as given."""
+        rows, swapped = self.pairIndex(self.positions(altersA), self.positions(altersB))
+        return self.getRows(rows, swapped)
+    
+    def setMasses(self, altersA, altersB, masses):
+        """Set the masses of the pairs (altersA[k], altersB[k]), oriented as given. See setRows."""
+        rows, swapped = self.pairIndex(self.positions(altersA), self.positions(altersB))
+        self.setRows(rows, masses, swapped)
+    
+    def definedRows(self):
+        """Return the rows whose masses have been given."""
+        return np.flatnonzero(self.defined_)
+    
+    def meanMassMatrix(self, rows = None):
+        """
+        Mean mass vectors (see PairBelief.getMeanMassVect) of the given rows, or of every
+        defined row, one vector per column: a (16, k) matrix.
+        """
+        if rows is None:
+            rows = self.definedRows()
+        return meanMassMatrix(self.massArr_[rows, :4])
+    
+    def beliefView(self, row, swapped = False):
+        """Return a PairBelief sharing the masses of the given row."""
+        belief = PairBelief.__new__(PairBelief)
+        belief.massArr_ = self.massArr_[row]
+        belief.columns_ = _SWAPPED_COLUMNS if swapped else _MASS_COLUMNS
+        belief.table_ = self
+        belief.row_ = row
+        return belief
+
+
+def orderedPair(pair):
+    """
+    Return the two alternatives of a pair (frozenset) in increasing order: the PairBelief of the
+    pair is oriented this way. Alternatives that cannot be compared are ordered by their repr.
+    """
+    try:
+        return tuple(sorted(pair))
+    except TypeError:
+        return tuple(sorted(pair, key = repr))
+
+
+class _RelationDict(MutableMapping):
+    """
+    Dictionary view of a PairBeliefTable, indexed by pairs of alternatives (frozenset).
+    A pair is oriented by orderedPair. The value is a PairBelief
+    view on the table, or None when the masses of a known pair are not given.
+    """
+    def __init__(self, table):
+        self.table_ = table
+    
+    def _row(self, pair):
+        i, j = orderedPair(pair)
+        try:
+            row, swapped = self.table_.pairIndex(self.table_.alterIndex_[i], self.table_.alterIndex_[j])
+        except KeyError:
+            raise KeyError(pair)
+        return int(row), bool(swapped)
+    
+    def __getitem__(self, pair):
+        row, swapped = self._row(pair)
+        if not self.table_.present_[row]:
+            raise KeyError(pair)
+        if not self.table_.defined_[row]:
+            return None
+        return self.table_.beliefView(row, swapped)
+    
+    def __setitem__(self, pair, belief):
+        row, swapped = self._row(pair)
+        if belief is None:
+            self.table_.defined_[row] = False
+            self.table_.present_[row] = True
+            self.table_.invalidate([row])
+        else:
+            self.table_.setRows([row], list(belief.massValDict_.values()), [swapped])
+    
+    def __delitem__(self, pair):
+        row, swapped = self._row(pair)
+        if not self.table_.present_[row]:
+            raise KeyError(pair)
+        self.table_.defined_[row] = False
+        self.table_.present_[row] = False
+        self.table_.invalidate([row])
+    
+    def __iter__(self):
+        alterList = self.table_.alterList_
+        lo, hi = self.table_.pairPositions(np.flatnonzero(self.table_.present_))
+        for i, j in zip(lo.tolist(), hi.tolist()):
+            yield frozenset((alterList[i], alterList[j]))
+    
+    def __len__(self):
+        return int(np.count_nonzero(self.table_.present_))
+
+
 class Alternative():
     """An alternative.
     The preferences are on the alternatives.
@@ -215,17 +569,30 @@ class User():
         matrx of PairBelief instances. 
         Each element represent a pairwise preference relationship in the Cartisan product of alternatives
     
-    prefDG_ : NetworkX directed graph
-        a directed graph representing the preference.
-    """
-    def __init__(self, constrPara, m = 0):
-    """
-    Constructor of User with different construction mode.
-    m is the mode of the construction.
-    if m=0 (default value), User is constructed by alternative list
-    if m=1, User is constructed by all preference pair with their mass function vector respctively in a dictionary. Usually used in the construction on the fusionned data
-    if m=2, User is constructed by a csv file 
+    beliefTable_ : PairBeliefTable
+        masses of all the pairs of alternatives.
+    
+    relationDict_ : Dict of PairBelief
+        dictionary view of beliefTable_ indexed by pairs (frozenset), its values are PairBelief
+        views on the table.
+    
+    prefG_ : NetworkX directed graph
+        a directed graph representing the preference, built by drawGraph (empty until then).
+    
+    graph_ : PreferenceGraph
+        preference graph maintained incrementally, see trackGraph. None until it is enabled.
     """
+    def __init__(self, constrPara, m = 0, cacheSize = 4096, userId = None):
+        """
+        Constructor of User with different construction mode.
+        cacheSize is the number of pairs whose derived quantities (mean mass vector, BetP, relations)
+        are kept in cache, see PairBeliefTable.
+        m is the mode of the construction.
+        if m=0 (default value), User is constructed by alternative list
+        if m=1, User is constructed by all preference pair with their mass function vector respctively in a dictionary. Usually used in the construction on the fusionned data
+        if m=2, User is constructed by a csv file of mass rows, or a directory of columns written
+        by loader.csvToColumns (see loader). Only the rows of userId are used if it is given.
+        """
         if type(constrPara) == list:
             m = 0
         elif type(constrPara) == dict:
@@ -237,52 +604,177 @@ class User():
         #self.alterDict_ = {key: Alternative(key) for key in list(range(alterNum))}
         #self.prefMat_ = [[PairBelief() for _ in range(alterNum)] for _ in range(alterNum)]
             self.alterList_ = constrPara
-            self.relationDict_ = {}
-            for pair in itertools.combinations(self.alterList_, 2):  #all possible combination of alternatives
-                self.relationDict_[frozenset(pair)] = None   # initialization of the relation pairs
+            self.beliefTable_ = PairBeliefTable(self.alterList_, cacheSize = cacheSize)
+            self.beliefTable_.present_[:] = True   # all possible combination of alternatives, initialized without masses
+            self.relationDict_ = _RelationDict(self.beliefTable_)
         
         if m == 1:
-            self.relatio                  nDict_ = constrPara
-            self.alterList_ = reduce(lambda x,y: x.union(y), constrPara.keys(), set() )
-        #if m == 2
+            alters = reduce(lambda x,y: x.union(y), constrPara.keys(), set() )
+            try:
+                self.alterList_ = sorted(alters)
+            except TypeError:
+                self.alterList_ = list(alters)
+            self.beliefTable_ = PairBeliefTable(self.alterList_, cacheSize = cacheSize)
+            self.relationDict_ = _RelationDict(self.beliefTable_)
+            for pair, belief in constrPara.items():
+                self.relationDict_[pair] = belief
+        if m == 2:
+            import loader
+            if os.path.isdir(constrPara):
+                columns = loader.loadColumns(constrPara)
+            else:
+                columns = loader.readCSV(constrPara)
+            alters, masses = loader.selectUser(columns, userId)
+            alterIds = np.unique(alters)
+            self.alterList_ = alterIds.tolist()
+            self.beliefTable_ = PairBeliefTable(self.alterList_, cacheSize = cacheSize)
+            self.relationDict_ = _RelationDict(self.beliefTable_)
+            rows, swapped = self.beliefTable_.pairIndex(np.searchsorted(alterIds, alters[:, 0]),
+                                                        np.searchsorted(alterIds, alters[:, 1]))
+            self.beliefTable_.setRows(rows, masses, swapped)
             
-        self.prefG_ = nx.DiGraph()
-        
-    #def __init__(self, csvFileName):
-        """
-        Create User object based on mass function value data in csv format.
-        """
-        #TODO not finished.
-     #   with open (csvFileName, 'rb') as csvMassValues:
-     #       csvReader = csv.reader(csvFileName)
+        self._prefG = None
+        self.graph_ = None
     
     
     def getAlters(self):
         return self.alterList_
     
         
+    def getRelations(self, criterion = 4):
+        """
+        Return the most possible relationship of every pair, in a dictionary indexed by pairs
+        oriented by orderedPair.
+        All pairs are decided with one call of decisionDST, see PairBelief.getRelation for
+        the relation types and the criteria. Pairs without belief are omitted.
+        """
+        alterList = self.beliefTable_.alterList_
+        rows, relations = self._decideRows(criterion)
+        lo, hi = self.beliefTable_.pairPositions(rows)
+        inverse = {0: 1, 1: 0}
+        relationDict = {}
+        for i, j, rType in zip(lo.tolist(), hi.tolist(), relations.tolist()):
+            pair = frozenset((alterList[i], alterList[j]))
+            if orderedPair(pair)[0] != alterList[i]:   # the pair is seen as (j, i)
+                rType = inverse.get(rType, rType)
+            relationDict[pair] = rType
+        return relationDict
+    
+    def _decideRows(self, criterion = 4):
+        """
+        Decide every pair with masses in one call of decisionDST.
+        Return the rows of beliefTable_ and their relations, oriented as the table.
+        """
+        table = self.beliefTable_
+        if criterion in table.decisions_:   # nothing changed since the last decision
+            return table.decisions_[criterion]
+        rows = table.definedRows()
+        relations = np.full(rows.size, 5, dtype = int)   #5 for ignorance
+        decided = table.massArr_[rows, 5] != 1
+        if np.any(decided):
+            relations[decided] = decideRelations(table.meanMassMatrix(rows[decided]), criterion, singletonOmega = True)
+        table.decisions_[criterion] = (rows, relations)
+        return rows, relations
+    
+    @property
+    def prefG_(self):
+        if self._prefG is None:
+            import networkx as nx
+            self._prefG = nx.DiGraph()
+        return self._prefG
+    
+    @prefG_.setter
+    def prefG_(self, graph):
+        self._prefG = graph
+    
     def drawGraph(self):
         """
-        Show the preference represented by a directed graph.
+        Build the directed graph prefG_ representing the preference, from the current relations.
         """
+        import networkx as nx
+        self.prefG_ = nx.DiGraph()
         self.prefG_.add_nodes_from(self.alterList_) # add all nodes representing alternatives
-        for pair,mass in self.relationDict_.items():
-            i,j = pair
-            rType = mass.getRelation()
-            if (rType == 0):
-                self.prefG_.add_edge(i,j)
-            elif(rType == 1):
-                self.prefG_.add_edge(j,i)
-            elif(rType == 2):
-                self.prefG_.add_edge(i,j)
-                self.prefG_.add_edge(j,i)
+        if self.graph_ is not None:
+            self._syncGraph()
+            self.prefG_.add_edges_from(self.graph_.edges())
+            return
+        alterList = self.beliefTable_.alterList_
+        rows, relations = self._decideRows()
+        lo, hi = self.beliefTable_.pairPositions(rows)
+        forward = (relations == 0) | (relations == 2)   # aPb or aIb
+        backward = (relations == 1) | (relations == 2)  # bPa or aIb
+        self.prefG_.add_edges_from((alterList[i], alterList[j]) for i, j in zip(lo[forward].tolist(), hi[forward].tolist()))
+        self.prefG_.add_edges_from((alterList[j], alterList[i]) for i, j in zip(lo[backward].tolist(), hi[backward].tolist()))
         
-    def findCircles(self):
+    def trackGraph(self, criterion = 4):
+        """
+        Maintain the preference graph graph_ incrementally: when the masses of pairs change,
+        only the edges of these pairs are decided again and the cycles are updated from them
+        (see preferenceGraph.PreferenceGraph). findCircles and drawGraph then use graph_.
+        """
+        table = self.beliefTable_
+        alterList = table.alterList_
+        self.graph_ = PreferenceGraph(alterList)
+        self.graphCriterion_ = criterion
+        self.dirtyRows_ = set()
+        rows, relations = self._decideRows(criterion)
+        lo, hi = table.pairPositions(rows)
+        for i, j, relation in zip(lo.tolist(), hi.tolist(), relations.tolist()):
+            for edge in relationEdges(alterList[i], alterList[j], relation):
+                self.graph_.addEdge(*edge)
+        if self._markDirty not in table.listeners_:
+            table.listeners_.append(self._markDirty)
+        return self.graph_
+    
+    def _markDirty(self, rows):
+        self.dirtyRows_.update(rows)
+    
+    def _syncGraph(self):
+        """Update the edges of graph_ for the pairs changed since the last update."""
+        table = self.beliefTable_
+        alterList = table.alterList_
+        for row in self.dirtyRows_:
+            i, j = table.pairPositions(row)
+            relation = table.beliefView(row).getRelation(self.graphCriterion_) if table.defined_[row] else 5
+            self.graph_.setPair(alterList[int(i)], alterList[int(j)], relation)
+        self.dirtyRows_.clear()
+    
+    def adjacency(self, criterion = 4, sparse = False):
+        """
+        Adjacency matrix of the preference graph, indexed by the positions of the alternatives in
+        alterList_: a dense boolean array or, if sparse, a scipy CSR matrix. See prefMatrix.
+        """
+        import prefMatrix   # scipy is only needed by the matrix backend
+        rows, relations = self._decideRows(criterion)
+        lo, hi = self.beliefTable_.pairPositions(rows)
+        return prefMatrix.adjacencyMatrix(len(self.beliefTable_.alterList_), lo, hi, relations, sparse)
+    
+    def findCircles(self, backend = None):
+        """
+        Return the strongly connected components of more than one alternative of the preference graph.
+        
+        backend: "networkx", "matrix" (adjacency matrix and scipy, see prefMatrix) or "incremental"
+        (see trackGraph). By default the incremental graph if it is tracked, networkx otherwise.
+        """
+        if backend == "matrix":
+            import prefMatrix
+            alterList = self.beliefTable_.alterList_
+            return [set(alterList[i] for i in comp.tolist()) for comp in prefMatrix.cycles(self.adjacency(sparse = True))]
+        if backend is None and self.graph_ is not None:
+            backend = "incremental"
+        if backend == "incremental":
+            if self.graph_ is None:
+                self.trackGraph()
+            self._syncGraph()
+            return self.graph_.cycles()
+        import networkx as nx
         self.drawGraph()
         scc = nx.strongly_connected_components(self.prefG_)
         return [c for c in scc if len(c)>1]
         
     def showGraph(self):
         self.drawGraph()
+        import networkx as nx
+        import matplotlib.pyplot as plt
         nx.draw(self.prefG_)
         plt.show()
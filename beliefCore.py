@@ -0,0 +1,20 @@
+"""
+Lightweight entry point to the belief function computations: transforms of masses,
+combination, discounting and decision, without the User and graph classes.
+
+It only depends on numpy, so that short-lived workers combining masses start quickly:
+
+    from beliefCore import DSTBatch, decisionDST
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+from DST_fmt_functions import (mtoq, mtob, qtom, mtobetp, mtoqBatch, mtobBatch, qtomBatch, btomBatch,
+                               mtobetpBatch, membershipMatrix, cardinalityVector, qtowBatch, wtoqBatch,
+                               btovBatch, vtobBatch, mtowBatch, wtomBatch, mtovBatch, vtomBatch)
+from combinationRules import DST, DSTBatch, FusionState, loadFusionState, combinationAccuracy
+from discounting import discounting, contextualDiscounting
+from decisionDST import decisionDST
+from sparseMass import SparseMass, denseToSparse, combineSparse
+from exceptions import IllegalMassSizeError, IllegalCriterionError
@@ -0,0 +1,216 @@
+"""
+Benchmarks of the transforms, combination rules, decisions and fusion.
+
+Every benchmark is run on seeded synthetic masses over a sweep of sizes (number of atoms,
+sources, alternatives, users). For every case the best time per call and the peak of memory
+allocated during one call (tracemalloc) are recorded. The results of a run are saved as JSON,
+named after the current git commit, so that runs of two commits can be compared:
+
+    python benchmark.py run [--quick] [--filter mtoq] [--output benchmarks]
+    python benchmark.py compare benchmarks/<old>.json benchmarks/<new>.json
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import itertools
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+from DST_fmt_functions import mtoq, mtob, qtom, mtobetp, mtoqBatch, mtobBatch, qtomBatch, mtobetpBatch
+from combinationRules import DST
+from discounting import discounting
+from decisionDST import decisionDST
+from baseClass import User
+from preferenceFusion import fusion
+
+SEED = 0
+CRITERIA = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 131)
+
+
+def randomMasses(natoms, nbMasses, rng, nbFocals = None):
+    """Random mass vectors (2^natoms, nbMasses), with nbFocals focal sets each (all sets by default)."""
+    nbFE = 2 ** natoms
+    masses = np.zeros((nbFE, nbMasses))
+    for k in range(nbMasses):
+        focals = np.arange(nbFE) if nbFocals is None else rng.choice(nbFE, size = nbFocals, replace = False)
+        masses[focals, k] = rng.dirichlet(np.ones(focals.size))
+    return masses
+
+
+def bayesianMasses(natoms, nbMasses, rng):
+    masses = np.zeros((2 ** natoms, nbMasses))
+    masses[2 ** np.arange(natoms)] = rng.dirichlet(np.ones(natoms), size = nbMasses).T
+    return masses
+
+
+def simpleMasses(natoms, nbMasses, rng):
+    """Simple (hence separable) masses: one random focal set besides the frame."""
+    nbFE = 2 ** natoms
+    masses = np.zeros((nbFE, nbMasses))
+    weights = rng.random(nbMasses)
+    masses[rng.integers(1, nbFE - 1, size = nbMasses), np.arange(nbMasses)] = 1.0 - weights
+    masses[-1] += weights
+    return masses
+
+
+def randomUsers(nbUsers, nbAlters, rng):
+    """Users giving random masses to every pair of nbAlters alternatives."""
+    users = []
+    for _ in range(nbUsers):
+        user = User(list(range(nbAlters)))
+        rows = np.arange(user.beliefTable_.nbPairs_)
+        user.beliefTable_.setRows(rows, rng.dirichlet(np.ones(5), size = rows.size)[:, :4])
+        users.append(user)
+    return users
+
+
+def _transforms(natoms, rng):
+    vector, matrix = randomMasses(natoms, 1, rng)[:, 0], randomMasses(natoms, 64, rng)
+    return {"mtoq": lambda: mtoq(vector), "mtob": lambda: mtob(vector), "qtom": lambda: qtom(vector),
+            "mtobetp": lambda: mtobetp(vector),
+            "mtoqBatch64": lambda: mtoqBatch(matrix), "mtobBatch64": lambda: mtobBatch(matrix),
+            "qtomBatch64": lambda: qtomBatch(matrix), "mtobetpBatch64": lambda: mtobetpBatch(matrix)}
+
+
+def _combinations(natoms, nbSources, rng):
+    cases = {}
+    for criterion in CRITERIA:
+        if criterion == 8 and 3 ** nbSources > 2 ** 22:
+            continue    # exact PCR6 enumerates the tuples of focal sets
+        if criterion == 6:
+            masses = bayesianMasses(natoms, nbSources, rng)
+        elif criterion in (13, 131):
+            masses = simpleMasses(natoms, nbSources, rng)    # LNS rules are only for separable masses
+        else:
+            masses = randomMasses(natoms, nbSources, rng, 3)
+        cases["DST%d" % criterion] = (lambda masses = masses, criterion = criterion: DST(masses, criterion))
+    masses = randomMasses(natoms, nbSources, rng)
+    alpha = rng.random(nbSources)
+    cases["discounting"] = lambda: discounting(masses, alpha)
+    return cases
+
+
+def _decisions(natoms, nbMasses, rng):
+    masses = randomMasses(natoms, nbMasses, rng)
+    return {"decisionDST%d" % criterion: (lambda criterion = criterion: decisionDST(masses, criterion))
+            for criterion in (1, 2, 3, 4, 5)}
+
+
+def _fusions(nbUsers, nbAlters, rng):
+    users = randomUsers(nbUsers, nbAlters, rng)
+    return {"fusion%d" % criterion: (lambda criterion = criterion: fusion(users, criterion)) for criterion in (1, 12)}
+
+
+# benchmark groups: case builder and sweep of its parameters (full, quick)
+SUITES = {
+    "transforms": (_transforms, {"natoms": ((2, 4, 6, 8, 10, 12), (2, 4))}),
+    "combinations": (_combinations, {"natoms": ((2, 4, 6, 8), (2, 4)), "nbSources": ((2, 8, 32), (2, 8))}),
+    "decisions": (_decisions, {"natoms": ((2, 4, 6, 8), (2, 4)), "nbMasses": ((1, 100, 10000), (1, 100))}),
+    "fusions": (_fusions, {"nbUsers": ((3, 10, 30), (3,)), "nbAlters": ((5, 10, 20, 40), (5, 10))}),
+}
+
+
+def measure(function, minTime = 0.2, repeat = 3):
+    """Return the best time per call (seconds) and the peak of memory allocated during one call (bytes)."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * minTime / 0.2))
+    best = min(timer.repeat(repeat = repeat, number = number)) / number
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(quick = False, pattern = None, minTime = 0.2):
+    """Run the benchmarks whose name contains pattern. Return the list of results."""
+    results = []
+    for suite, (build, sweep) in SUITES.items():
+        names = list(sweep)
+        for values in itertools.product(*(sweep[name][1 if quick else 0] for name in names)):
+            params = dict(zip(names, values))
+            cases = build(rng = np.random.default_rng(SEED), **params)
+            for name, function in cases.items():
+                if pattern is not None and pattern not in name:
+                    continue
+                seconds, peak = measure(function, minTime)
+                results.append({"suite": suite, "name": name, "params": params, "time": seconds, "peak": peak})
+                print("%-16s %-36s %12.3e s %12d B" % (name, json.dumps(params), seconds, peak))
+    return results
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr = subprocess.DEVNULL,
+                                       cwd = os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(results, directory):
+    """Save the results of a run in directory/<commit>.json. Return the path."""
+    os.makedirs(directory, exist_ok = True)
+    commit = gitCommit()
+    path = os.path.join(directory, commit + ".json")
+    with open(path, "w") as output:
+        json.dump({"commit": commit, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                   "numpy": np.__version__, "machine": platform.machine(), "results": results}, output, indent = 1)
+    return path
+
+
+def compare(oldPath, newPath, threshold = 1.2):
+    """
+    Print the ratios new/old of the times and memory peaks of the cases of two runs, flagging those
+    slower than threshold. Return the list of regressions (name, params, time ratio).
+    """
+    runs = []
+    for path in (oldPath, newPath):
+        with open(path) as data:
+            runs.append({(r["name"], json.dumps(r["params"], sort_keys = True)): r for r in json.load(data)["results"]})
+    regressions = []
+    for key in sorted(set(runs[0]) & set(runs[1])):
+        old, new = runs[0][key], runs[1][key]
+        ratio = new["time"] / old["time"]
+        memRatio = new["peak"] / old["peak"] if old["peak"] else float("nan")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append((key[0], key[1], ratio))
+        print("%-16s %-36s time x%6.2f  memory x%6.2f%s" % (key[0], key[1], ratio, memRatio, flag))
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmarks of the DST functions and preference fusion.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    runParser = commands.add_parser("run", help = "run the benchmarks and save the results")
+    runParser.add_argument("--quick", action = "store_true", help = "small sweep")
+    runParser.add_argument("--filter", default = None, help = "only the benchmarks whose name contains this")
+    runParser.add_argument("--min-time", type = float, default = 0.2, help = "minimal time of a measure (s)")
+    runParser.add_argument("--output", default = "benchmarks", help = "directory of the results")
+    compareParser = commands.add_parser("compare", help = "compare the results of two runs")
+    compareParser.add_argument("old")
+    compareParser.add_argument("new")
+    compareParser.add_argument("--threshold", type = float, default = 1.2)
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        print("results saved in", save(run(args.quick, args.filter, args.min_time), args.output))
+        return 0
+    return 1 if compare(args.old, args.new, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
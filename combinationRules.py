@@ -33,10 +33,16 @@
 ##' @param TypeSSF If TypeSSF = 0, it is not a SSF, the general case. If TypeSSF = 1, a SSF with a singleton as a focal element. If TypeSSF = 2, a SSF with any subset of \eqn{\Theta} as a focal element. 
 ##' @return The combined mass vector. One column. 
 
+import math
 import numpy as np
 from DST_fmt_functions import *
+from exceptions import IllegalMassSizeError, IllegalCriterionError
+from discounting import contextualFactors, discountCommonality, discountImplicability
+import instrumentation
 
-def DST(massIn, criterion, TypeSSF=0):
+_WEIGHT_RULES = (9, 10, 13, 131)    # rules on the conjunctive weights
+
+def DST(massIn, criterion, TypeSSF=0, alpha=None, beta=None, singletonOmega=None):
     """
     Combination rules for multiple masses.
     
@@ -51,7 +57,10 @@ def DST(massIn, criterion, TypeSSF=0):
             criterion=2 Dempster-Shafer criterion (normalized)
             criterion=3 Yager criterion
             criterion=4 Disjunctive combination criterion
-            criterion=5 Dubois criterion (normalized and disjunctive combination)
+            criterion=5 Dubois criterion (normalized and disjunctive combination): every source is
+                normalized (its mass of the empty set shared out by 1 / (1 - m(emptyset))) before the
+                disjunctive combination. For subnormal sources this differs from normalizing the
+                disjunctive combination of the sources.
             criterion=6 Dubois and Prade criterion (mixt combination), only for Bayesian masses whose focal elements are singletons
             criterion=7 Florea criterion
             criterion=8 PCR6
@@ -65,40 +74,592 @@ def DST(massIn, criterion, TypeSSF=0):
         If TypeSSF = 0, it is not a SSF (the general case).
         If TypeSSF = 1, it is a SSF with a singleton as a focal element. 
         If TypeSSF = 2, it is a SSF with any subset of \Theta as a focal element.
+    alpha: float or ndarray, optional
+        reliability of every source (column), the masses are discounted before the combination.
+    beta: ndarray, optional
+        reliabilities of the sources in the context of every atom (contextual discounting): a vector
+        of size n for all the sources or a matrix (nbSources, n).
+    singletonOmega: boolean, optional
+        whether the masses only have singletons, the frame (and the empty set) as focal elements,
+        see DSTBatch. Detected by default.
         
     Return:
     ----------
     Mass: ndarray
         a final mass vector combining all masses
     """
-    n, m = massIn.shape
-    if criterion in (4,5,6,7):
-        b_mat = np.apply_along_axis(mtob, axis = 0, arr = massIn)
-        b = np.apply_along_axis(np.prod, axis = 1, arr = b_mat )
-    if criterion in (1,2,3,6,7):
+    Mass = DSTBatch(np.asarray(massIn)[np.newaxis], criterion, alpha = alpha, beta = beta,
+                    singletonOmega = singletonOmega)[0]
+    return Mass[np.newaxis].transpose()
+
+
+@instrumentation.instrumented("DST", lambda massTensor, *args, **kwargs: (np.shape(massTensor)[0], np.asarray(massTensor).nbytes))
+def DSTBatch(massTensor, criterion, mask=None, alpha=None, beta=None, logDomain=False, singletonOmega=None,
+             epsilon=1e-6, sequentialPCR6=False):
+    """
+    Combination rules applied on many groups of masses in one call.
+    Each group (e.g. all the masses given by users on one preference pair) is combined
+    independently, with the same rules as DST.
+    
+    Parameters:
+    ----------
+    massTensor: ndarray
+        Masses to be combined, represented by a 3D tensor of shape (nbGroups, nbFE, nbSources).
+        massTensor[k] is the massIn matrix of DST for the k-th group.
+    criterion: integer
+        Combination rule to be applied, see DST.
+    mask: ndarray of bool, optional
+        Matrix of shape (nbGroups, nbSources). mask[k, s] is False when source s gives no mass
+        for group k, the source is then left out of the combination of this group.
+        A group without any source gets the vacuous mass.
+    alpha: float or ndarray, optional
+        reliabilities for classical discounting, broadcast to the shape (nbGroups, nbSources)
+        of mask: one per source, or one per source and group.
+    beta: ndarray, optional
+        reliabilities for contextual discounting, broadcast to (nbGroups, nbSources, n): one per atom,
+        per source and atom, or per group, source and atom.
+    
+    The discounting is applied to the commonalities or implicabilities of the sources while they are
+    transformed, so no discounted copy of massTensor is made, except for criteria 8 and 12 with
+    contextual discounting. Criterion 6 does not accept discounting: discounted masses are not Bayesian.
+    logDomain: boolean
+        accumulate the products of commonalities and implicabilities of the sources as sums of their
+        logarithms (in float64). With many sources the products underflow; the normalized rule
+        (criterion 2) then rescales the commonalities before going back to masses, so it stays
+        defined where the direct product gives nan. See combinationAccuracy.
+    
+    A float32 massTensor is transformed in float32, halving the memory of the transforms;
+    the combined masses are always float64.
+    singletonOmega: boolean, optional
+        whether the sources only give masses to singletons, the frame and the empty set (as the
+        mean mass vectors of preference pairs). Criteria 1, 2 and 3 then use closed forms in
+        O(nbSources x n) instead of the transforms (see _singletonOmegaCombination), with the same
+        results. By default the structure is detected; False forces the general path.
+    epsilon: float
+        criteria 9, 10, 13 and 131 work on the conjunctive weights, which are not defined for dogmatic
+        sources (m(Omega) = 0): these sources are discounted by 1 - epsilon first. Likewise criterion 11
+        moves the fraction epsilon of the normal sources (m(emptyset) = 0) to the empty set.
+    sequentialPCR6: boolean
+        PCR6 (criterion 8) enumerates the tuples of focal elements of the sources of a group, their
+        number grows exponentially with the number of sources; above a limit IllegalCriterionError is
+        raised. With sequentialPCR6, such groups are combined two sources at a time instead, which is
+        polynomial but is not PCR6 and depends on the order of the sources (see _PCR6).
+    
+    The rules in the weight domain (see DST_fmt_functions.qtowBatch and btovBatch) are:
+        criterion=9  cautious rule: w = min of the conjunctive weights of the sources
+        criterion=10 w = max of the conjunctive weights, for separable masses (w <= 1)
+        criterion=11 bold rule: v = min of the disjunctive weights of the sources
+        criterion=13 LNS rule: the separable sources are decomposed into simple masses A^w(A), grouped by
+                     focal set A. The n_A simple masses of group A are combined conjunctively (weight
+                     W_A = product of their weights) and the groups are averaged with the proportions
+                     n_A / N of the N simple masses: m(A) = n_A / N (1 - W_A), the rest goes to Omega.
+        criterion=131 LNSa rule: as 13 with W_A the minimum of the weights (cautious rule in every group)
         
-        q_mat = np.apply_along_axis(mtoq, axis = 0, arr = massIn) #apply on column. (2 in R)
-        q = np.apply_along_axis(np.prod, axis = 1,arr = q_mat) # apply on row (1 in R)
-    if criterion == 1:
-        #Smets criterion
-        Mass = qtom(q)
-        Mass[0] = 1.0 - np.sum(Mass[1:])  
-    #elif criterion == 2:
-        #Dempster-Shafer criterion (normalized)
-    #elif criterion == 3:
-        #Yager criterion
-    #elif criterion == 4:
-        #disjunctive combination
-    #elif criterion == 5:
-    #elif criterion == 6:
-    #elif criterion == 7:
-    #elif criterion == 8:
-    #elif criterion == 9:
-    #elif criterion == 10:
-    #elif criterion == 11:
-    elif criterion == 12:
-        # mean of the masses
-        Mass = np.apply_along_axis(np.mean, axis = 1, arr = massIn)
-    #elif criterion == 13:
+    Return:
+    ----------
+    Mass: ndarray
+        combined masses of shape (nbGroups, nbFE), one row per group
+    """
+    massTensor = np.asarray(massTensor)
+    if massTensor.dtype not in (np.float32, np.float64):
+        massTensor = massTensor.astype(float)
+    nbGroups, nbFE, nbSources = massTensor.shape
+    if mask is not None:
+        mask = np.asarray(mask, dtype = bool)
+        if mask.shape != (nbGroups, nbSources):
+            raise IllegalMassSizeError("ACCIDENT: the mask shape should be (nbGroups, nbSources)\n")
+    if alpha is not None:
+        alpha = np.broadcast_to(np.asarray(alpha, dtype = float), (nbGroups, nbSources))
+    factors = None
+    if beta is not None:
+        beta = np.asarray(beta, dtype = float)
+        beta = beta.reshape((1,) * (3 - beta.ndim) + beta.shape)
+        factors = contextualFactors(beta, nbFE.bit_length() - 1)  # (nbFE, groups or 1, sources or 1)
+    if criterion == 6 and (alpha is not None or factors is not None):
+        raise IllegalCriterionError("ACCIDENT: Dubois and Prade criterion is only for Bayesian masses, they cannot be discounted\n")
+    if criterion in (1,2,3) and factors is None and nbFE > 2 and singletonOmega is not False:
+        if singletonOmega or isSingletonOmega(massTensor, axis = 1):
+            with instrumentation.stage("DST.singletonOmega", nbGroups * nbSources):
+                return _singletonOmegaCombination(massTensor, criterion, mask, alpha, logDomain)
+    with instrumentation.stage("DST.transform", nbGroups * nbSources):
+        # transforms work on the first axis: (nbFE, nbGroups, nbSources)
+        massT = np.moveaxis(massTensor, 1, 0)
+        if factors is not None and criterion in (8, 12):
+            # these rules work on the masses themselves
+            massT = btomBatch(discountImplicability(mtobBatch(massT), alpha, factors), inplace = True)
+            massTensor = np.moveaxis(massT, 0, 1)
+            alpha, factors = None, None
+        if criterion in (4,5,6,7,11) or (factors is not None and criterion in (1,2,3) + _WEIGHT_RULES):
+            b_mat = mtobBatch(massT)
+            if alpha is not None or factors is not None:
+                discountImplicability(b_mat, alpha, factors)
+        if criterion in (1,2,3,6,7) + _WEIGHT_RULES:
+            if factors is not None:
+                # contextual discounting is a product of implicabilities only
+                q_mat = mtoqBatch(btomBatch(b_mat, inplace = criterion != 7), inplace = True)
+            else:
+                q_mat = mtoqBatch(massT)
+                if alpha is not None:
+                    discountCommonality(q_mat, alpha)
+            if criterion in _WEIGHT_RULES:
+                dogmatic = q_mat[-1] <= 0
+                if np.any(dogmatic):
+                    q_mat[:, dogmatic] = discountCommonality(q_mat[:, dogmatic], 1.0 - epsilon)
+                w_mat = qtowBatch(q_mat)
+            else:
+                if mask is not None:
+                    q_mat[:, ~mask] = 1.0   # commonality of the vacuous mass, neutral for the product
+                q = _logProduct(q_mat, criterion == 2) if logDomain else np.prod(q_mat, axis = 2, dtype = float)
+        if criterion == 11:
+            normal = b_mat[0] <= 0
+            if np.any(normal):
+                b_mat[:, normal] = b_mat[:, normal] * (1.0 - epsilon) + epsilon
+            v_mat = btovBatch(b_mat)
+        if criterion in (4,5,6,7):
+            if criterion == 5:
+                # normalize every source before the disjunctive combination
+                with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                    b_mat = (b_mat - b_mat[0]) / (1.0 - b_mat[0])
+            if mask is not None:
+                b_mat[:, ~mask] = 1.0   # implicability of m(emptyset) = 1, neutral for the product
+            b = _logProduct(b_mat, False) if logDomain else np.prod(b_mat, axis = 2, dtype = float)
+    with instrumentation.stage("DST.combination", nbGroups):
+        if criterion in (1,2,3):
+            #Smets criterion
+            Mass = qtomBatch(q, inplace = True)
+            Mass[0] = 1.0 - np.sum(Mass[1:], axis = 0)
+            if criterion == 2:
+                #Dempster-Shafer criterion (normalized), groups in total conflict give nan
+                with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                    Mass[1:] = Mass[1:] / (1.0 - Mass[0])
+                Mass[0] = 0
+            elif criterion == 3:
+                #Yager criterion: the conflict is given to the ignorance
+                Mass[-1] = Mass[-1] + Mass[0]
+                Mass[0] = 0
+        elif criterion in (4,5):
+            #disjunctive combination, on normalized masses for the Dubois criterion
+            Mass = btomBatch(b, inplace = True)
+        elif criterion == 6:
+            #Dubois and Prade criterion: a non empty intersection of singletons is the singleton
+            #itself, so singletons take the conjunctive masses and the other sets the disjunctive ones
+            singletons = 1 << np.arange(nbFE.bit_length() - 1)
+            others = np.setdiff1d(np.arange(1, nbFE), singletons)
+            used = massTensor if mask is None else massTensor * mask[:, np.newaxis, :]
+            if np.any(used[:, others, :] != 0):
+                raise IllegalCriterionError("ACCIDENT: Dubois and Prade criterion is only for Bayesian masses\n")
+            Mass = btomBatch(b, inplace = True)
+            Mass[singletons] = q[singletons]
+            Mass[0] = 0
+        elif criterion == 7:
+            #Florea criterion: weighted sum of the disjunctive and the normalized conjunctive combinations
+            MassDisj = btomBatch(b, inplace = True)
+            MassConj = qtomBatch(q, inplace = True)
+            k = 1.0 - np.sum(MassConj[1:], axis = 0)   # conflict
+            Mass = (MassDisj * k + MassConj * (1.0 - k)) / (1.0 - k + k * k)
+            Mass[0] = 0
+        elif criterion == 8:
+            #PCR6
+            Mass = _PCR6(massTensor, mask, alpha, sequential = sequentialPCR6).T
+        elif criterion == 12:
+            # mean of the masses
+            if mask is None and alpha is None:
+                Mass = np.mean(massTensor, axis = 2).T
+            else:
+                count = np.full(nbGroups, nbSources) if mask is None else mask.sum(axis = 1)
+                weights = (1.0 if mask is None else mask) / np.maximum(count, 1)[:, np.newaxis]
+                if alpha is not None:
+                    # the discounted part of every source goes to the frame
+                    Mass = np.einsum('kfs,ks->fk', massTensor, weights * alpha)
+                    Mass[-1] += np.sum(weights * (1.0 - alpha), axis = 1)
+                else:
+                    Mass = np.einsum('kfs,ks->fk', massTensor, weights)
+                Mass[-1, count == 0] = 1.0
+        elif criterion in (9,10,11):
+            #cautious and bold rules: min (max for 10) of the weights, the sources left out do not count
+            weights = v_mat if criterion == 11 else w_mat
+            if mask is not None:
+                weights[:, ~mask] = -np.inf if criterion == 10 else np.inf
+            weights = np.max(weights, axis = 2) if criterion == 10 else np.min(weights, axis = 2)
+            empty = ~np.all(np.isfinite(weights), axis = 0)
+            weights[:, empty] = 1.0
+            if criterion == 11:
+                Mass = vtomBatch(weights)
+            else:
+                Mass = wtomBatch(weights)
+                Mass[0] = 1.0 - np.sum(Mass[1:], axis = 0)
+            Mass[:, empty] = 0.0
+            Mass[-1, empty] = 1.0
+        elif criterion in (13,131):
+            Mass = _LNS(w_mat, mask, criterion == 131)
+        else:
+            raise IllegalCriterionError("ACCIDENT: combination criterion %s is not available\n" % criterion)
+    return np.ascontiguousarray(Mass.T, dtype = float)
+
+
+def _LNS(w_mat, mask, cautious, tol = 1e-9):
+    """
+    LNS (cautious: LNSa) rule on the conjunctive weights w_mat (nbFE, nbGroups, nbSources), see DSTBatch.
+    Return the combined masses (nbFE, nbGroups).
+    """
+    if mask is not None:
+        w_mat[:, ~mask] = 1.0
+    if np.any(w_mat > 1.0 + tol):
+        raise IllegalCriterionError("ACCIDENT: LNS rule is only for separable masses\n")
+    simple = w_mat < 1.0 - tol     # the simple masses of the decomposition, A^w(A) with w(A) < 1
+    counts = simple.sum(axis = 2)  # n_A, (nbFE, nbGroups)
+    total = counts.sum(axis = 0)   # N
+    combined = np.min(w_mat, axis = 2) if cautious else np.prod(np.minimum(w_mat, 1.0), axis = 2)
+    Mass = counts / np.maximum(total, 1) * (1.0 - combined)
+    Mass[-1] = 0.0
+    Mass[-1] = 1.0 - np.sum(Mass, axis = 0)
+    return Mass
+
+
+def _fromLog(logAcc, rescale):
+    """
+    exp of accumulated logarithms (nbFE, ...). With rescale, the values of the non empty sets are
+    divided by their maximum, a constant factor removed by the normalization of the combined masses
+    (the non empty masses only depend on the commonalities of non empty sets); the empty set keeps 1.
+    """
+    if rescale:
+        with np.errstate(invalid = 'ignore'):
+            logAcc = logAcc - np.max(logAcc[1:], axis = 0)
+        logAcc[0] = 0.0
+    return np.exp(logAcc)
+
+
+def _logProduct(values, rescale):
+    """Product over the last axis computed as the exp of the sum of the logarithms, see _fromLog."""
+    with np.errstate(divide = 'ignore'):
+        logAcc = np.sum(np.log(values), axis = -1, dtype = np.float64)
+    return _fromLog(logAcc, rescale)
+
+
+def combinationAccuracy(massTensor, criterion, mask=None, logDomain=True, dtype=np.float32, **kwargs):
+    """
+    Compare a reduced-precision or log-domain combination with the float64 baseline of DSTBatch.
+    
+    Parameters
+    -----------
+    massTensor, criterion, mask: see DSTBatch. kwargs are passed to DSTBatch (alpha, beta).
+    logDomain: boolean
+        combination mode to evaluate.
+    dtype: numpy dtype
+        type the masses are stored in for the evaluated combination.
+    
+    Return
+    -----------
+    report: dict
+        maxAbsError, meanAbsError: errors on the groups where both results are finite.
+        baselineNonFinite, nonFinite: number of groups with nan or inf masses in each result.
+        decisionAgreement: fraction of the finite groups where the maximum of the pignistic
+        probability is the same atom.
+        nbytes, baselineNbytes: memory of the mass tensor in each type.
+    """
+    massTensor = np.asarray(massTensor)
+    baseline = DSTBatch(massTensor.astype(np.float64), criterion, mask, **kwargs)
+    reduced = massTensor.astype(dtype)
+    Mass = DSTBatch(reduced, criterion, mask, logDomain = logDomain, **kwargs)
+    finiteBase = np.all(np.isfinite(baseline), axis = 1)
+    finite = np.all(np.isfinite(Mass), axis = 1)
+    both = finiteBase & finite
+    error = np.abs(Mass[both] - baseline[both])
+    agreement = np.argmax(mtobetpBatch(Mass[both].T), axis = 0) == np.argmax(mtobetpBatch(baseline[both].T), axis = 0)
+    return {"maxAbsError": float(error.max()) if error.size else 0.0,
+            "meanAbsError": float(error.mean()) if error.size else 0.0,
+            "baselineNonFinite": int(np.sum(~finiteBase)), "nonFinite": int(np.sum(~finite)),
+            "decisionAgreement": float(agreement.mean()) if agreement.size else 1.0,
+            "nbytes": reduced.nbytes, "baselineNbytes": massTensor.size * 8}
+
+
+def _singletonOmegaCombination(massTensor, criterion, mask, alpha, logDomain):
+    """
+    Criteria 1, 2 and 3 for sources with masses a_i on the singletons {i} and w on the frame.
+    Their commonalities are q({i}) = a_i + w and q(A) = w for |A| > 1, so the conjunctive combination is
+        m({i}) = prod(a_i + w) - prod(w),  m(frame) = prod(w),  the rest to the empty set.
+    Discounting by alpha keeps this structure: a_i -> alpha a_i, w -> alpha w + 1 - alpha.
+    """
+    nbGroups, nbFE, nbSources = massTensor.shape
+    singletons = 1 << np.arange(nbFE.bit_length() - 1)
+    a = massTensor[:, singletons, :].astype(float)    # (nbGroups, n, nbSources)
+    w = massTensor[:, -1, :].astype(float)
+    if alpha is not None:
+        a *= alpha[:, np.newaxis, :]
+        w = alpha * w + (1.0 - alpha)
+    if mask is not None:
+        a[~np.broadcast_to(mask[:, np.newaxis, :], a.shape)] = 0.0   # vacuous sources
+        w = np.where(mask, w, 1.0)
+    if logDomain:
+        with np.errstate(divide = 'ignore'):
+            logP = np.sum(np.log(a + w[:, np.newaxis, :]), axis = 2)
+            logW = np.sum(np.log(w), axis = 1)
+        if criterion == 2:
+            # rescaling removed by the normalization, see _fromLog
+            with np.errstate(invalid = 'ignore'):
+                scale = np.maximum(np.max(logP, axis = 1), logW)
+                logP, logW = logP - scale[:, np.newaxis], logW - scale
+        P, W = np.exp(logP), np.exp(logW)
+    else:
+        P = np.prod(a + w[:, np.newaxis, :], axis = 2)
+        W = np.prod(w, axis = 1)
+    Mass = np.zeros((nbGroups, nbFE))
+    Mass[:, singletons] = P - W[:, np.newaxis]
+    Mass[:, -1] = W
+    Mass[:, 0] = 1.0 - np.sum(Mass[:, 1:], axis = 1)
+    if criterion == 2:
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            Mass[:, 1:] = Mass[:, 1:] / np.sum(Mass[:, 1:], axis = 1)[:, np.newaxis]
+        Mass[:, 0] = 0
+    elif criterion == 3:
+        Mass[:, -1] += Mass[:, 0]
+        Mass[:, 0] = 0
+    return Mass
+
+
+def _sumByKey(values, keys, nbFE):
+    """
+    Sum the columns of values (nbGroups, T) sharing the same key (T,) into a (nbGroups, nbFE) matrix.
+    Every row is summed in the order of its columns, whatever the number of rows.
+    """
+    nbGroups = values.shape[0]
+    bins = (np.arange(nbGroups)[:, np.newaxis] * nbFE + keys).ravel()
+    return np.bincount(bins, weights = values.ravel(), minlength = nbGroups * nbFE).reshape(nbGroups, nbFE)
+
+
+def _PCR6(massTensor, mask = None, alpha = None, maxSize = 2**24, maxTuples = 2**22, sequential = False):
+    """
+    PCR6 combination of every group of masses in massTensor (nbGroups, nbFE, nbSources).
+    
+    The tuples of focal elements (one per source) are enumerated as arrays: focal elements are
+    subsets encoded as bitmasks, so the intersection of a tuple is a bitwise and. The product of
+    a tuple goes to its intersection, or, for a conflicting tuple, is shared among its focal
+    elements proportionally to the mass each source gives them.
+    Groups are handled together when their sources have the same focal elements, and only these
+    focal elements are enumerated, so the result of a group does not depend on the other groups of
+    the call. Sources left out by mask take no part in the combination of a group.
+    Tuples and groups are handled by chunks, so that the arrays of a chunk hold about maxSize values.
+    Sources are discounted by alpha (nbGroups, nbSources) if it is given.
+    
+    The number of tuples of a group grows exponentially with its number of sources. Above maxTuples,
+    IllegalCriterionError is raised, unless sequential is set: the sources of such groups are then
+    combined two by two (PCR6 of the combination of the first sources with the next one), in
+    O(nbSources x nbFE^2) per group. This sequential rule is not PCR6 for more than two sources and
+    depends on the order of the sources.
+    
+    Return the combined masses of shape (nbGroups, nbFE).
+    """
+    nbGroups, nbFE, nbSources = massTensor.shape
+    if mask is None:
+        mask = np.ones((nbGroups, nbSources), dtype = bool)
+    massTensor = np.asarray(massTensor, dtype = float)
+    if alpha is not None:
+        massTensor = massTensor * alpha[:, np.newaxis, :]
+        massTensor[:, -1, :] += 1.0 - alpha
+    # focal elements of the sources of every group, a source left out has none
+    used = (massTensor != 0) & mask[:, np.newaxis, :]
+    patterns, inverse = np.unique(used.reshape(nbGroups, -1), axis = 0, return_inverse = True)
+    Mass = np.zeros((nbGroups, nbFE))
+    for pattern, groups in zip(patterns, _indicesByValue(inverse.ravel(), len(patterns))):
+        pattern = pattern.reshape(nbFE, nbSources)
+        sources = np.flatnonzero(pattern.any(axis = 0))
+        focals = [np.flatnonzero(pattern[:, s]) for s in sources]
+        nbTuples = math.prod(f.size for f in focals)    # Python integers, no overflow
+        masses = massTensor[groups][:, :, sources]
+        if sources.size == 0:
+            Mass[groups, -1] = 1.0
+        elif sources.size == 1:
+            Mass[groups] = masses[:, :, 0]
+        elif nbTuples <= maxTuples:
+            Mass[groups] = _PCR6Tuples(masses, focals, nbTuples, maxSize)
+        elif sequential:
+            combined = masses[:, :, 0]
+            for s in range(1, sources.size):
+                combined = _PCR6(np.stack([combined, masses[:, :, s]], axis = 2), maxSize = maxSize)
+            Mass[groups] = combined
+        else:
+            raise IllegalCriterionError("ACCIDENT: PCR6 of %d sources enumerates %d tuples of focal elements "
+                                        "(more than %d), use the sequential approximation\n"
+                                        % (sources.size, nbTuples, maxTuples))
+    return Mass
+
+
+def _indicesByValue(values, nbValues):
+    """Indices of the entries of values equal to 0, 1, ..., nbValues - 1."""
+    order = np.argsort(values, kind = 'stable')
+    return np.split(order, np.cumsum(np.bincount(values, minlength = nbValues))[:-1])
+
+
+def _PCR6Tuples(masses, focals, nbTuples, maxSize):
+    """
+    Exact PCR6 of groups of sources with the same focal elements (focals[s] for source s).
+    The tuples are cut in chunks that do not depend on the number of groups, so a group gets the
+    same result whatever the groups it is combined with.
+    """
+    nbGroups, nbFE, nbSources = masses.shape
+    nbFocals = [f.size for f in focals]
+    tupleChunk = max(1, min(nbTuples, maxSize // (64 * nbSources)))
+    chunk = max(1, maxSize // (tupleChunk * nbSources))
+    Mass = np.zeros((nbGroups, nbFE))
+    for tupleStart in range(0, nbTuples, tupleChunk):
+        choice = np.unravel_index(np.arange(tupleStart, min(tupleStart + tupleChunk, nbTuples)), nbFocals)
+        X = np.stack([focals[s][choice[s]] for s in range(nbSources)])   # (nbSources, T) focal elements
+        inter = np.bitwise_and.reduce(X, axis = 0)
+        conflict = inter == 0
+        for start in range(0, nbGroups, chunk):
+            group = slice(start, start + chunk)
+            vals = masses[group][:, X, np.arange(nbSources)[:, np.newaxis]]   # (chunk, nbSources, T)
+            # products and sums over the sources one at a time, in the same order for any chunk
+            prod = vals[:, 0].copy()
+            for s in range(1, nbSources):
+                prod *= vals[:, s]
+            Mass[group] += _sumByKey(prod[:, ~conflict], inter[~conflict], nbFE)
+            weighted = vals[:, :, conflict]
+            total = weighted[:, 0].copy()
+            for s in range(1, nbSources):
+                total += weighted[:, s]
+            ratio = np.divide(prod[:, conflict], total, out = np.zeros_like(total), where = total > 0)
+            # the share of every source goes to its focal element
+            shares = weighted * ratio[:, np.newaxis, :]
+            Mass[group] += _sumByKey(shares.reshape(shares.shape[0], -1), X[:, conflict].ravel(), nbFE)
+    return Mass
+
+
+class FusionState():
+    """
+    Partial combination of many groups of masses with an associative rule, that can be
+    updated source by source, merged with other partial states and saved to disk.
+    
+    The state keeps, for every group, the product of the commonalities (criteria 1, 2, 3) or
+    of the implicabilities (criteria 4, 5) of the sources seen so far, or their sum and count
+    (criterion 12). The combined masses are only computed by finalize, so states built on
+    different shards of sources (processes, machines) can be merged in any order.
+    Groups are identified by int64 keys, which must mean the same group in merged states.
+    
+    Attributes
+    -------------
+    criterion_ : integer
+        combination rule, see DST.
+    keys_ : ndarray of int64
+        key of the group of each row.
+    acc_ : ndarray of shape (nbGroups, nbFE)
+        partial products, or sums of masses for the mean.
+    count_ : ndarray of int64
+        number of sources combined in each group.
+    logDomain_ : boolean
+        acc_ holds the sums of the logarithms of the commonalities or implicabilities instead of
+        their products, so that states of very many sources do not underflow (see DSTBatch).
+    """
+    def __init__(self, criterion, nbFE = 16, capacity = 1024, logDomain = False):
+        if criterion in (1, 2, 3):
+            self.domain_ = "q"
+        elif criterion in (4, 5):
+            self.domain_ = "b"
+        elif criterion == 12:
+            self.domain_ = "mean"
+        else:
+            raise IllegalCriterionError("ACCIDENT: combination criterion %s is not associative\n" % criterion)
+        self.criterion_ = criterion
+        self.nbFE_ = nbFE
+        self.logDomain_ = logDomain and self.domain_ != "mean"
+        self.neutral_ = 0.0 if self.domain_ == "mean" or self.logDomain_ else 1.0   # value of acc_ without source
+        self.rowOf_ = {}    # group key -> row
+        self.keys_ = np.zeros(capacity, dtype = np.int64)
+        self.acc_ = np.full((capacity, nbFE), self.neutral_)
+        self.count_ = np.zeros(capacity, dtype = np.int64)
+    
+    def __len__(self):
+        return len(self.rowOf_)
+    
+    def _rows(self, keys):
+        """Rows of the given keys, new groups are appended."""
+        rows = np.fromiter((self.rowOf_.setdefault(key, len(self.rowOf_)) for key in np.asarray(keys).tolist()),
+                           dtype = np.int64, count = len(keys))
+        capacity = self.acc_.shape[0]
+        if len(self.rowOf_) > capacity:
+            extra = max(len(self.rowOf_), 2 * capacity) - capacity
+            self.acc_ = np.vstack([self.acc_, np.full((extra, self.nbFE_), self.neutral_)])
+            self.keys_ = np.concatenate([self.keys_, np.zeros(extra, dtype = np.int64)])
+            self.count_ = np.concatenate([self.count_, np.zeros(extra, dtype = np.int64)])
+        self.keys_[rows] = keys
+        return rows
+    
+    def add(self, keys, massMat):
+        """
+        Combine one source into the state.
         
-    return Mass[np.newaxis].transpose()
+        Parameters
+        -----------
+        keys: ndarray of int64
+            keys of the groups the source gives masses to, without repetition.
+        massMat: ndarray
+            masses of the source, a (nbFE, len(keys)) matrix. It is overwritten.
+        """
+        rows = self._rows(keys)
+        if self.domain_ == "mean":
+            self.acc_[rows] += massMat.T
+            self.count_[rows] += 1
+            return
+        if self.domain_ == "q":
+            values = mtoqBatch(massMat, inplace = True)
+        else:
+            values = mtobBatch(massMat, inplace = True)
+            if self.criterion_ == 5:
+                # normalize the source before the disjunctive combination
+                values = (values - values[0]) / (1.0 - values[0])
+        if self.logDomain_:
+            with np.errstate(divide = 'ignore'):
+                self.acc_[rows] += np.log(values).T
+        else:
+            self.acc_[rows] *= values.T
+        self.count_[rows] += 1
+    
+    def merge(self, other):
+        """Combine the sources of another state (same criterion) into this one. Return self."""
+        if other.criterion_ != self.criterion_ or other.nbFE_ != self.nbFE_ or other.logDomain_ != self.logDomain_:
+            raise IllegalCriterionError("ACCIDENT: only states of the same criterion and frame can be merged\n")
+        nbGroups = len(other)
+        rows = self._rows(other.keys_[:nbGroups])
+        if self.domain_ == "mean" or self.logDomain_:
+            self.acc_[rows] += other.acc_[:nbGroups]
+        else:
+            self.acc_[rows] *= other.acc_[:nbGroups]
+        self.count_[rows] += other.count_[:nbGroups]
+        return self
+    
+    def finalize(self):
+        """
+        Return the keys of the groups and their combined masses, a (nbGroups, nbFE) matrix.
+        """
+        nbGroups = len(self)
+        acc = self.acc_[:nbGroups]
+        if self.logDomain_:
+            acc = _fromLog(acc.T, self.criterion_ == 2).T
+        if self.domain_ == "q":
+            Mass = qtomBatch(acc.T)
+        elif self.domain_ == "b":
+            Mass = btomBatch(acc.T)
+        else:
+            Mass = (acc / np.maximum(self.count_[:nbGroups], 1)[:, np.newaxis]).T
+        # the combined mass of each group is combined with itself only, which applies the normalization of the criterion
+        Mass = DSTBatch(Mass.T[:, :, np.newaxis], self.criterion_, mask = (self.count_[:nbGroups] > 0)[:, np.newaxis])
+        return self.keys_[:nbGroups].copy(), Mass
+    
+    def save(self, path):
+        """Save the state in a compressed .npz file, see loadFusionState."""
+        nbGroups = len(self)
+        np.savez_compressed(path, criterion = self.criterion_, nbFE = self.nbFE_, logDomain = self.logDomain_,
+                            keys = self.keys_[:nbGroups],
+                            acc = self.acc_[:nbGroups], count = self.count_[:nbGroups])
+
+
+def loadFusionState(path):
+    """Load a FusionState saved by FusionState.save."""
+    with np.load(path) as data:
+        logDomain = bool(data["logDomain"]) if "logDomain" in data.files else False
+        state = FusionState(int(data["criterion"]), int(data["nbFE"]), capacity = max(1, data["keys"].size),
+                            logDomain = logDomain)
+        rows = state._rows(data["keys"])
+        state.acc_[rows] = data["acc"]
+        state.count_[rows] = data["count"]
+    return state
@@ -1,18 +1,22 @@
 
 
 
-from exceptions import IllegalMassSizeError
+from exceptions import IllegalMassSizeError, IllegalCriterionError
 import numpy as np
 import math
 
 from DST_fmt_functions import *
+import instrumentation
 
-def decisionDST(mass, criterion, r=0.5):
+@instrumentation.instrumented("decision", lambda mass, *args, **kwargs: (np.size(mass) // max(1, np.shape(mass)[0]), np.asarray(mass).nbytes))
+def decisionDST(mass, criterion, r=0.5, singletonOmega=None):
     """Different rules for decision making in the framework of belief functions
+    All the mass vectors are decided at once.
     
     Parameters
     -----------
-    mass: 
+    mass: ndarray
+        a mass vector, or a matrix with one mass vector per column
     
     criterion: integer
         different decision rules to apply.
@@ -21,27 +25,77 @@ def decisionDST(mass, criterion, r=0.5):
             criterion=3 maximum of the credibility with rejection
 	        criterion=4 maximum of the pignistic probability
 	        criterion=5 Appriou criterion (decision onto \eqn{2^\Theta})
+    
+    r: float
+        parameter of the Appriou criterion, a subset A is weighted by 1/|A|^r
+    
+    singletonOmega: boolean, optional
+        whether the masses only have singletons, the frame and the empty set as focal elements.
+        Criteria 1 to 4 then use closed forms on the singletons (pl({i}) = m({i}) + m(frame),
+        bel({i}) = m({i}), BetP({i}) proportional to m({i}) + m(frame)/n) instead of the transforms,
+        with the same decisions. Detected by default, False forces the general path.
+    
+    Return
+    -----------
+    class_fusion: ndarray of int
+        one decision per mass vector. Criteria 1 to 4 give the index of the chosen atom,
+        -1 when criterion 3 rejects the decision. Criterion 5 gives the index of the chosen subset.
     """
-    mass = mass.copy()
+    mass = np.array(mass, dtype = float)
     if (mass.size in mass.shape):   #if mass is a 1*N or N*1 array
         mass = mass.reshape(mass.size,1)
     nbEF, nbvec_test = mass.shape   #number of focal elements = number of mass rows 
     nbClasses = round(math.log(nbEF,2))
-    class_fusion = []
-    for k in range(nbvec_test):
-        massTemp = mass[:,k]
-        if criterion == 1:
-            #TODO
-            pass
-        elif criterion == 2:
-            #TODO
-            pass
-        elif criterion == 3:
-            #TODO
-            pass
-        elif criterion == 4:
-            pign = mtobetp(massTemp.T)
-            indice = np.argmax(pign)
-            class_fusion.append(indice)
+    if math.pow(2, nbClasses) != nbEF:
+        raise IllegalMassSizeError("ACCIDENT: the number of focal elements should be a power of 2\n")
+    singletons = 1 << np.arange(nbClasses)
+    if criterion in (1,2,3,4) and nbEF > 2 and singletonOmega is not False:
+        if singletonOmega or isSingletonOmega(mass):
+            return _decideSingletonOmega(mass, criterion, singletons)
+    if criterion in (1,3,5):
+        pl = 1.0 - mtobBatch(mass)[::-1]   # pl(A) = 1 - b(complement of A)
+    if criterion in (2,3):
+        bel = mtobBatch(mass) - mass[0]   # bel(A) = b(A) - m(emptyset)
+    if criterion == 1:
+        class_fusion = np.argmax(pl[singletons], axis = 0)
+    elif criterion == 2:
+        class_fusion = np.argmax(bel[singletons], axis = 0)
+    elif criterion == 3:
+        # the atom of maximal credibility is rejected (-1) if another atom is more plausible than it is credible
+        class_fusion = np.argmax(bel[singletons], axis = 0)
+        columns = np.arange(nbvec_test)
+        belMax = bel[singletons][class_fusion, columns]
+        plOthers = pl[singletons]
+        plOthers[class_fusion, columns] = -np.inf
+        class_fusion[belMax < np.max(plOthers, axis = 0)] = -1
+    elif criterion == 4:
+        pign = mtobetpBatch(mass)
+        class_fusion = np.argmax(pign, axis = 0)
+    elif criterion == 5:
+        # Appriou: the subset maximizing pl(A) / |A|^r, empty set excluded
+        weights = np.zeros(nbEF)
+        weights[1:] = np.power(cardinalityVector(nbClasses)[1:], -float(r))
+        class_fusion = np.argmax(pl * weights[:, np.newaxis], axis = 0)
+    else:
+        raise IllegalCriterionError("ACCIDENT: decision criterion %s is not available\n" % criterion)
     
-    return np.array(class_fusion)
+    return np.asarray(class_fusion, dtype = int)
+
+
+def _decideSingletonOmega(mass, criterion, singletons):
+    """Criteria 1 to 4 of decisionDST for masses on singletons, the frame and the empty set."""
+    single = mass[singletons]
+    if criterion == 2:
+        return np.asarray(np.argmax(single, axis = 0), dtype = int)
+    if criterion == 4:
+        # BetP({i}) = (m({i}) + m(frame) / n) / (1 - m(emptyset)), uniform in total conflict
+        return np.asarray(np.argmax(single + mass[-1] / singletons.size, axis = 0), dtype = int)
+    pl = single + mass[-1]
+    if criterion == 1:
+        return np.asarray(np.argmax(pl, axis = 0), dtype = int)
+    class_fusion = np.argmax(single, axis = 0)
+    columns = np.arange(mass.shape[1])
+    belMax = single[class_fusion, columns]
+    pl[class_fusion, columns] = -np.inf
+    class_fusion[belMax < np.max(pl, axis = 0)] = -1
+    return np.asarray(class_fusion, dtype = int)
@@ -1,9 +1,30 @@
+"""
+Discounting of masses by the reliability of their sources.
+
+Classical discounting by a reliability alpha keeps the fraction alpha of every mass and gives the
+rest to the frame: m' = alpha m + (1 - alpha) m_Omega. Contextual discounting (Mercier et al.) gives
+a reliability beta_k to the source in the context of every atom k; in terms of implicabilities,
+b'(A) = b(A) * prod of beta_k over the atoms k not in A.
+
+Both are linear in the commonality or implicability domain, so combinationRules.DSTBatch applies them
+in place on the transformed masses of every source (parameters alpha and beta), without building a
+discounted copy of the mass tensor. The functions of this module discount mass matrices directly.
+"""
+
 import numpy as np
 import math
 from exceptions import IllegalMassSizeError
+from DST_fmt_functions import mtobBatch, btomBatch, membershipMatrix
+
+def _checkSize(nbFE):
+    antoms = round(math.log(nbFE,2))
+    if (nbFE != math.pow(2,antoms) or nbFE == 2):
+        raise IllegalMassSizeError('The number of focal element should be 2^n (n>1), with n the number of elements in the discernment frame\n')
+    return antoms
+
 def discounting(massIn, alpha):
     """Dicount masses with given the factors
-    
+
     Parameters
     -----------
     massIn: ndarray of 2 dimension
@@ -12,24 +33,83 @@ def discounting(massIn, alpha):
     alpha: float or ndarray of 1 demension
         alpha discounting factor. a float or a vector with number of bba vectors
     """
-    massIn = massIn.copy()
-    alpha = np.array(alpha)
+    massIn = np.asarray(massIn, dtype = float)
     if len(massIn.shape) == 1: # massIn is a 1-D matrix (vector)
         massIn = massIn.reshape(massIn.size, 1)
     nbFE,nbMass = massIn.shape # nbFE : the number of focal elements
-    
-    antoms = round(math.log(nbFE,2))
-    if (nbFE != math.pow(2,antoms) or nbFE == 2):
-        raise IllegalMassSizeError('The number of focal element should be 2^n (n>1), with n the number of elements in the discernment frame\n')
-        return None
-    if alpha.size == 1: # complete the alpha vector
-        alpha = np.full(nbMass,alpha, dtype = float)
-    
-    if alpha.size == nbMass:
-        alpha_mat = np.repeat(alpha[:,np.newaxis], nbFE, axis = 1).T
-        massOut = np.multiply(alpha_mat, massIn)
-        massOut[-1, :] = 1 - np.apply_along_axis(np.sum, 0, massOut[0:-1,:])
-        return massOut
-    else:
+    _checkSize(nbFE)
+    alpha = np.asarray(alpha, dtype = float).ravel()
+    if alpha.size not in (1, nbMass):
         raise IllegalMassSizeError("Accident: in discounting the size of alpha is incorrect\n")
-        
+    massOut = massIn * alpha     # one factor per column
+    massOut[-1, :] = 1 - massOut[:-1].sum(axis = 0)
+    return massOut
+
+
+def contextualFactors(beta, natoms):
+    """
+    Factors of the implicabilities of contextual discounting.
+
+    Parameters
+    -----------
+    beta: ndarray
+        reliabilities of the contexts, of size natoms on the last axis.
+
+    Return
+    -----------
+    factors: ndarray of shape (2^natoms,) + beta.shape[:-1]
+        factors[A] is the product of beta_k over the atoms k not in A.
+    """
+    beta = np.asarray(beta, dtype = float)
+    if beta.shape[-1] != natoms:
+        raise IllegalMassSizeError("Accident: contextual discounting needs one reliability per atom\n")
+    membership = membershipMatrix(natoms).astype(bool)
+    factors = np.ones((1 << natoms,) + beta.shape[:-1])
+    expand = (slice(None),) + (np.newaxis,) * (beta.ndim - 1)
+    for k in range(natoms):
+        factors *= np.where(membership[k][expand], 1.0, beta[..., k])
+    return factors
+
+
+def contextualDiscounting(massIn, beta):
+    """Contextual discounting of masses.
+
+    Parameters
+    -----------
+    massIn: ndarray
+        a mass vector or a matrix with one mass vector per column.
+    beta: ndarray
+        reliability of the source in the context of every atom: a vector of size n (the same for
+        every column) or a matrix (nbMass, n).
+    """
+    massIn = np.asarray(massIn, dtype = float)
+    if len(massIn.shape) == 1:
+        massIn = massIn.reshape(massIn.size, 1)
+    natoms = _checkSize(massIn.shape[0])
+    b = mtobBatch(massIn)
+    b *= contextualFactors(beta, natoms).reshape(massIn.shape[0], -1)
+    return btomBatch(b, inplace = True)
+
+
+def discountCommonality(q, alpha):
+    """
+    Classical discounting of commonalities, in place: q' = alpha q + 1 - alpha.
+    q has the subsets on the first axis, alpha is broadcast on the other axes.
+    """
+    q *= alpha
+    q += 1.0 - alpha
+    return q
+
+
+def discountImplicability(b, alpha = None, factors = None):
+    """
+    Discounting of implicabilities, in place. b has the subsets on the first axis.
+    Classical discounting by alpha (broadcast on the other axes): b' = alpha b, b'(Omega) = 1;
+    then contextual discounting by factors (see contextualFactors): b' = b * factors.
+    """
+    if alpha is not None:
+        b *= alpha
+        b[-1] = 1.0
+    if factors is not None:
+        b *= factors
+    return b
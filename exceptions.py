@@ -3,4 +3,8 @@ class Error(Exception):
 class IllegalMassSizeError(Error):
     """Exception when size of mass vector is not 2^n"""
     def __init__(self, message):
-        super(IlegalMassSizeError, self).__init__(message)
+        super(IllegalMassSizeError, self).__init__(message)
+class IllegalCriterionError(Error):
+    """Exception when a combination or decision criterion is unknown or not applicable"""
+    def __init__(self, message):
+        super(IllegalCriterionError, self).__init__(message)
@@ -0,0 +1,198 @@
+"""
+Content-addressed on-disk cache of fused pairs.
+
+The key of a pair is the sha256 digest of the inputs of its combination: the masses given by the
+users on the pair (users who did not rate it count as zeros), their discounting factors, the
+combination parameters and the type of the masses. The cache stores, for every key, the combined mass vector and the decisions
+of the fused pair for the decision criteria 1 to 4, so that a fusion of the same data only combines
+the pairs whose inputs changed:
+
+    cache = FusionCache("fusion_cache")
+    fUser = fusion(users, criterion = 2, cache = cache)
+
+A cache is a directory holding one structured array cache.npy, sorted by key and loaded
+memory-mapped, with the fields:
+    key        S32           sha256 digest
+    masses     float64 (16,)
+    decisions  int8 (4,)     relations of decisionDST for the criteria 1 to 4, 5 for ignorance
+The file is written aside and then renamed over the previous one, so an interrupted run leaves
+either the old or the new cache, never a mix of both.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+
+from baseClass import meanMassMatrix
+from decisionDST import decisionDST
+
+DECISION_CRITERIA = (1, 2, 3, 4)
+_SINGLETONS = [1, 2, 4, 8]
+ENTRY = np.dtype([("key", "S32"), ("masses", np.float64, (16,)), ("decisions", np.int8, (len(DECISION_CRITERIA),))])
+
+
+def pairKeys(massTensor, mask, criterion, alpha = None, beta = None, logDomain = False):
+    """
+    Keys of the pairs of a fusion.
+
+    Parameters
+    -----------
+    massTensor: ndarray (nbPairs, 16, nbUsers)
+        mean mass vectors of the users on every pair, zero where mask is False. Tensors of
+        different types (float32, float64) give different keys.
+    mask: ndarray of bool (nbPairs, nbUsers)
+    criterion, alpha, beta, logDomain:
+        parameters of the combination, see combinationRules.DSTBatch.
+
+    Return
+    -----------
+    keys: ndarray of S32 (nbPairs,)
+    """
+    nbPairs, _, nbUsers = massTensor.shape
+    mask = np.asarray(mask, dtype = bool)
+    # the mean mass vectors only depend on the masses of the singletons
+    columns = [np.asarray(massTensor[:, _SINGLETONS, :], dtype = np.float64).transpose(0, 2, 1).reshape(nbPairs, -1)]
+    columns.append(mask.astype(np.float64))
+    if alpha is not None:
+        columns.append(np.broadcast_to(np.asarray(alpha, dtype = np.float64), (nbPairs, nbUsers)) * mask)
+    if beta is not None:
+        beta = np.broadcast_to(np.asarray(beta, dtype = np.float64), (nbPairs, nbUsers, 4))
+        columns.append((beta * mask[:, :, np.newaxis]).reshape(nbPairs, -1))
+    rows = np.ascontiguousarray(np.concatenate(columns, axis = 1))
+    base = hashlib.sha256(repr((criterion, alpha is not None, beta is not None, bool(logDomain),
+                                massTensor.dtype.str)).encode())
+    keys = np.empty(nbPairs, dtype = "S32")
+    for k in range(nbPairs):
+        digest = base.copy()
+        digest.update(rows[k])
+        keys[k] = digest.digest()
+    return keys
+
+
+def pairDecisions(massCom):
+    """
+    Decisions (nbPairs, 4) of the fused pairs of combined masses massCom (nbPairs, 16), as
+    User.getRelations on the fused user for the criteria 1 to 4: 5 for pairs without belief.
+    """
+    singles = massCom[:, _SINGLETONS]
+    decisions = np.full((massCom.shape[0], len(DECISION_CRITERIA)), 5, dtype = np.int8)
+    decided = singles.sum(axis = 1) + massCom[:, 0] != 0
+    if np.any(decided):
+        meanMass = meanMassMatrix(singles[decided])
+        for c, criterion in enumerate(DECISION_CRITERIA):
+            decisions[decided, c] = decisionDST(meanMass, criterion, singletonOmega = True)
+    return decisions
+
+
+class FusionCache():
+    """
+    On-disk cache of fused pairs, see the module documentation.
+
+    Parameters
+    -----------
+    directory: string
+        directory of the cache, created if needed.
+    prune: boolean
+        when new entries are stored, only keep the entries of the last fusion, so that the cache
+        follows the dataset instead of growing with every change.
+
+    Attributes
+    -----------
+    hits_, misses_ : integer
+        number of pairs found and not found by the last lookup.
+    """
+    def __init__(self, directory, prune = False):
+        self.directory_ = directory
+        self.prune_ = prune
+        self.hits_ = 0
+        self.misses_ = 0
+        os.makedirs(directory, exist_ok = True)
+        self._load()
+
+    def _path(self):
+        return os.path.join(self.directory_, "cache.npy")
+
+    def _load(self):
+        entries = None
+        if os.path.exists(self._path()):
+            try:
+                entries = np.load(self._path(), mmap_mode = "r")
+            except (ValueError, OSError):    # not a valid (or a truncated) .npy file
+                entries = None
+            if entries is not None and (entries.dtype != ENTRY or entries.ndim != 1):
+                entries = None
+        self.entries_ = np.empty(0, dtype = ENTRY) if entries is None else entries
+
+    @property
+    def keys_(self):
+        return self.entries_["key"]
+
+    def __len__(self):
+        return self.entries_.size
+
+    def _find(self, keys):
+        """Positions of keys in the cache and whether they are found."""
+        pos = np.searchsorted(self.keys_, keys)
+        found = pos < self.keys_.size
+        found[found] = self.keys_[pos[found]] == keys[found]
+        return pos, found
+
+    def lookup(self, keys):
+        """
+        Return found (bool (k,)), the masses (k, 16) and decisions (k, 4) of the keys, undefined
+        where found is False.
+        """
+        pos, found = self._find(keys)
+        masses = np.zeros((keys.size, 16))
+        decisions = np.full((keys.size, len(DECISION_CRITERIA)), 5, dtype = np.int8)
+        hits = self.entries_[pos[found]]
+        masses[found] = hits["masses"]
+        decisions[found] = hits["decisions"]
+        self.hits_ = int(found.sum())
+        self.misses_ = keys.size - self.hits_
+        return found, masses, decisions
+
+    def store(self, keys, masses, decisions, used = None):
+        """
+        Add entries to the cache and write it. used gives the keys of the last fusion, the only
+        entries kept when prune_ is set.
+        """
+        pos, found = self._find(keys)
+        if not self.prune_ or used is None:
+            keep = np.ones(len(self), dtype = bool)
+        else:
+            usedPos, usedFound = self._find(np.asarray(used, dtype = "S32"))
+            keep = np.zeros(len(self), dtype = bool)
+            keep[usedPos[usedFound]] = True
+        if np.all(found) and np.all(keep):
+            return
+        keys, first = np.unique(keys[~found], return_index = True)
+        new = np.empty(keys.size, dtype = ENTRY)
+        new["key"] = keys
+        new["masses"] = np.asarray(masses)[~found][first]
+        new["decisions"] = np.asarray(decisions)[~found][first]
+        entries = np.concatenate([self.entries_[keep], new])
+        entries = entries[np.argsort(entries["key"], kind = "stable")]
+        descriptor, temp = tempfile.mkstemp(dir = self.directory_, suffix = ".npy")
+        try:
+            with os.fdopen(descriptor, "wb") as output:
+                np.save(output, entries)
+                output.flush()
+                os.fsync(output.fileno())
+            os.replace(temp, self._path())
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self._load()
+
+    def clear(self):
+        """Remove every entry."""
+        if os.path.exists(self._path()):
+            os.remove(self._path())
+        self._load()
@@ -0,0 +1,120 @@
+"""
+Seeded generation of synthetic preference beliefs, for experiments and load tests.
+
+Masses are drawn for many pairs at once: for every pair a Dirichlet sample over the 5 types
+(pref, invPref, indiff, incompa, ignorance) is drawn and its largest value is given to the
+wanted relation, the other values are shuffled among the other types (see PairBelief.autoGen).
+
+For several users, every pair has a consensus relation drawn from a target distribution;
+each user keeps it with probability 1 - conflict and otherwise takes another relation at random,
+so that conflict controls the disagreement between users. Users are produced one by one by
+userStream, as array-backed User objects (PairBeliefTable).
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import numpy as np
+
+from baseClass import User
+from exceptions import IllegalMassSizeError
+
+NB_TYPES = 5    # pref, invPref, indiff, incompa, ignorance
+
+
+def _rng(rng):
+    """A np.random.Generator from a generator, a seed or None."""
+    return rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+
+def drawRelations(nbPairs, rng = None, relationProbs = None):
+    """
+    Draw the relations (0 pref, 1 invPref, 2 indiff, 3 incompa, 4 ignorance) of nbPairs pairs
+    from the distribution relationProbs (5 probabilities, uniform by default).
+    """
+    rng = _rng(rng)
+    if relationProbs is None:
+        return rng.integers(NB_TYPES, size = nbPairs)
+    relationProbs = np.asarray(relationProbs, dtype = float)
+    if relationProbs.size != NB_TYPES:
+        raise IllegalMassSizeError("ACCIDENT: relationProbs should give the probability of the 5 relations")
+    return rng.choice(NB_TYPES, size = nbPairs, p = relationProbs / relationProbs.sum())
+
+
+def randomMasses(nbPairs, rng = None, relations = None, concentration = 1.0):
+    """
+    Draw the masses of nbPairs pairs.
+
+    Parameters
+    -----------
+    nbPairs: integer
+    rng: np.random.Generator or seed, optional
+    relations: ndarray of integers, optional
+        relation of every pair (0 to 4) receiving the largest mass; -1 or None for no wanted relation.
+    concentration: float
+        parameter of the symmetric Dirichlet distribution: lower values give sharper beliefs.
+
+    Return
+    -----------
+    masses: ndarray (nbPairs, 5)
+        masses of pref, invPref, indiff, incompa and ignorance.
+    """
+    rng = _rng(rng)
+    values = rng.dirichlet(np.full(NB_TYPES, float(concentration)), size = nbPairs)
+    if relations is None:
+        return values
+    relations = np.broadcast_to(np.asarray(relations), (nbPairs,))
+    wanted = relations >= 0
+    # random order of the types, with the wanted relation first, receiving the values sorted decreasingly
+    keys = rng.random((nbPairs, NB_TYPES))
+    keys[np.flatnonzero(wanted), relations[wanted]] = -1.0
+    order = np.argsort(keys, axis = 1)
+    masses = values.copy()
+    rows = np.flatnonzero(wanted)[:, np.newaxis]
+    masses[rows, order[wanted]] = -np.sort(-values[wanted], axis = 1)
+    return masses
+
+
+def userStream(nbUsers, alterList, rng = None, conflict = 0.0, relationProbs = None, concentration = 1.0,
+               density = 1.0):
+    """
+    Generate users giving beliefs on the pairs of alterList, one at a time.
+
+    Parameters
+    -----------
+    nbUsers: integer
+    alterList: list
+        alternatives of every user.
+    rng: np.random.Generator or seed, optional
+    conflict: float in [0, 1]
+        probability that a user does not follow the consensus relation of a pair.
+    relationProbs: array of 5 floats, optional
+        distribution of the consensus relations, uniform by default.
+    concentration: float
+        Dirichlet parameter of the masses, see randomMasses.
+    density: float in [0, 1]
+        fraction of the pairs rated by every user.
+
+    Yield
+    -----------
+    user: User
+    """
+    rng = _rng(rng)
+    nbPairs = len(alterList) * (len(alterList) - 1) // 2
+    consensus = drawRelations(nbPairs, rng, relationProbs)
+    for _ in range(nbUsers):
+        relations = consensus.copy()
+        deviate = rng.random(nbPairs) < conflict
+        # another relation, uniformly among the 4 others
+        relations[deviate] = (relations[deviate] + rng.integers(1, NB_TYPES, size = int(deviate.sum()))) % NB_TYPES
+        rows = np.arange(nbPairs) if density >= 1 else np.flatnonzero(rng.random(nbPairs) < density)
+        user = User(list(alterList))
+        table = user.beliefTable_
+        table.present_[:] = False
+        table.setRows(rows, randomMasses(rows.size, rng, relations[rows], concentration)[:, :4])
+        yield user
+
+
+def generateUsers(nbUsers, alterList, rng = None, **kwargs):
+    """Generate a list of users, see userStream."""
+    return list(userStream(nbUsers, alterList, rng, **kwargs))
@@ -0,0 +1,178 @@
+"""
+Opt-in instrumentation of the stages of the fusion pipeline.
+
+When enabled, every stage (pair collection, mass vectors, transforms, combination, decision...)
+records its number of calls, wall time, number of mass vectors and bytes of the arrays it works
+on, and optionally the peak of memory allocated during the stage (tracemalloc). The statistics
+are given as a dict or JSON report, and every finished stage can be passed to hook callbacks.
+
+    import instrumentation
+    instrumentation.enable()
+    fusion(users)
+    print(instrumentation.reportJSON())
+
+When disabled (the default), stage returns a shared no-op context manager and instrumented
+functions call the function directly, so the overhead is a flag test per call.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import json
+import time
+import functools
+import tracemalloc
+
+_enabled = False
+_trackMemory = False
+_stats = {}     # stage name -> statistics
+_hooks = []
+_stack = []     # running stages, for the memory peaks of nested stages
+
+
+def enable(trackMemory = False):
+    """Start recording. With trackMemory, the memory peak of every stage is traced (slower)."""
+    global _enabled, _trackMemory
+    _enabled = True
+    _trackMemory = trackMemory
+    if trackMemory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """Stop recording, the statistics are kept until reset."""
+    global _enabled, _trackMemory
+    if _trackMemory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled = False
+    _trackMemory = False
+
+
+def isEnabled():
+    return _enabled
+
+
+def reset():
+    """Forget the recorded statistics."""
+    _stats.clear()
+
+
+def addHook(callback):
+    """Call callback(name, record) at the end of every stage, record being the dict of the call."""
+    _hooks.append(callback)
+
+
+def removeHook(callback):
+    _hooks.remove(callback)
+
+
+class _NullStage():
+    """Stage used when the instrumentation is disabled."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, items = 0, nbytes = 0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage():
+    __slots__ = ("name_", "items_", "nbytes_", "start_", "memStart_", "memPeak_")
+
+    def __init__(self, name, items, nbytes):
+        self.name_ = name
+        self.items_ = items
+        self.nbytes_ = nbytes
+
+    def record(self, items = 0, nbytes = 0):
+        """Add mass vectors and bytes to the stage."""
+        self.items_ += items
+        self.nbytes_ += nbytes
+
+    def __enter__(self):
+        if _trackMemory:
+            current, peak = tracemalloc.get_traced_memory()
+            for outer in _stack:    # the peak is reset, keep it for the running stages
+                outer.memPeak_ = max(outer.memPeak_, peak)
+            tracemalloc.reset_peak()
+            self.memStart_, self.memPeak_ = current, current
+        _stack.append(self)
+        self.start_ = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start_
+        _stack.pop()
+        record = {"time": elapsed, "items": self.items_, "nbytes": self.nbytes_}
+        if _trackMemory:
+            peak = max(self.memPeak_, tracemalloc.get_traced_memory()[1])
+            record["allocated"] = peak - self.memStart_
+            for outer in _stack:
+                outer.memPeak_ = max(outer.memPeak_, peak)
+        stats = _stats.get(self.name_)
+        if stats is None:
+            stats = _stats[self.name_] = {"calls": 0, "time": 0.0, "items": 0, "nbytes": 0, "allocated": 0}
+        stats["calls"] += 1
+        stats["time"] += elapsed
+        stats["items"] += self.items_
+        stats["nbytes"] += self.nbytes_
+        stats["allocated"] = max(stats["allocated"], record.get("allocated", 0))
+        for hook in _hooks:
+            hook(self.name_, record)
+        return False
+
+
+def stage(name, items = 0, nbytes = 0):
+    """
+    Context manager timing a stage of the pipeline.
+
+    Parameters
+    -----------
+    name: string
+        name of the stage, e.g. "fusion.combination".
+    items: integer
+        number of mass vectors handled by the stage.
+    nbytes: integer
+        bytes of the arrays handled by the stage.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, items, nbytes)
+
+
+def instrumented(name, sizeOf = None):
+    """
+    Decorator recording every call of a function as a stage. sizeOf(*args, **kwargs) gives the
+    (items, nbytes) of a call; it is only evaluated when the instrumentation is enabled.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            items, nbytes = sizeOf(*args, **kwargs) if sizeOf is not None else (0, 0)
+            with _Stage(name, items, nbytes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report():
+    """Statistics of every stage: calls, total time (s), mass vectors, bytes and largest memory peak."""
+    return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def reportJSON(path = None):
+    """Report as a JSON string, also written to path if it is given."""
+    text = json.dumps(report(), indent = 1, sort_keys = True)
+    if path is not None:
+        with open(path, "w") as output:
+            output.write(text)
+    return text
@@ -0,0 +1,185 @@
+"""
+Loaders of the mass data of many users.
+
+The masses are given by rows (user, altA, altB, pref, invPref, indiff, incompa): the masses
+of one user on the pair (altA, altB), with integer ids of users and alternatives.
+CSV files are read by chunks of rows, so that files larger than memory can be processed,
+and can be converted once to a columnar binary layout, one .npy file per column group:
+    users.npy   int64 (k,)
+    alters.npy  int64 (k, 2)
+    masses.npy  float64 (k, 4)
+which are loaded memory-mapped, without copy. Fusion and decision work on the columns by chunks,
+without building User or PairBelief objects.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import os
+import itertools
+
+import numpy as np
+
+from baseClass import meanMassMatrix, decideRelations
+from combinationRules import FusionState
+from preferenceFusion import _pairKeys, _orientMassMatrix
+
+COLUMNS = ("user", "altA", "altB", "pref", "invPref", "indiff", "incompa")
+_FILES = {"users": (np.int64, ()), "alters": (np.int64, (2,)), "masses": (np.float64, (4,))}
+_HEADER_SIZE = 128  # bytes reserved for the header of the .npy files written by chunks
+
+
+def readCSVChunks(path, chunkSize = 1000000, header = True, delimiter = ","):
+    """
+    Read a CSV file of mass rows by chunks.
+
+    Parameters
+    -----------
+    path: string
+    chunkSize: integer
+        number of rows per chunk.
+    header: boolean
+        whether the first line is a header.
+    delimiter: string
+
+    Yield
+    -----------
+    chunk: dict of ndarray
+        "users" (k,), "alters" (k, 2) and "masses" (k, 4), the columns of the rows of the chunk.
+    """
+    with open(path) as csvFile:
+        if header:
+            next(csvFile, None)
+        while True:
+            lines = list(itertools.islice(csvFile, chunkSize))
+            if not lines:
+                return
+            values = np.loadtxt(lines, delimiter = delimiter, ndmin = 2)
+            yield {"users": values[:, 0].astype(np.int64), "alters": values[:, 1:3].astype(np.int64),
+                   "masses": values[:, 3:7]}
+
+
+def readCSV(path, header = True, delimiter = ","):
+    """Read a whole CSV file of mass rows, see readCSVChunks. Return the dict of columns."""
+    chunks = list(readCSVChunks(path, header = header, delimiter = delimiter))
+    if not chunks:
+        return {name: np.zeros((0,) + shape, dtype = dtype) for name, (dtype, shape) in _FILES.items()}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in _FILES}
+
+
+def _npyHeader(dtype, shape):
+    """Header of a .npy file (format 1.0) padded to _HEADER_SIZE bytes."""
+    header = repr({"descr": np.dtype(dtype).str, "fortran_order": False, "shape": shape})
+    header = header.ljust(_HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + np.uint16(len(header)).tobytes() + header.encode("latin1")
+
+
+def csvToColumns(path, directory, chunkSize = 1000000, header = True, delimiter = ","):
+    """
+    Convert a CSV file of mass rows to the columnar layout in directory (see the module documentation).
+    The file is read by chunks, every chunk is appended to the column files. Return the number of rows.
+    """
+    os.makedirs(directory, exist_ok = True)
+    files = {name: open(os.path.join(directory, name + ".npy"), "wb") for name in _FILES}
+    nbRows = 0
+    try:
+        for name, outFile in files.items():
+            outFile.write(b"\0" * _HEADER_SIZE)    # the header is written once the size is known
+        for chunk in readCSVChunks(path, chunkSize, header, delimiter):
+            for name, outFile in files.items():
+                dtype = _FILES[name][0]
+                outFile.write(np.ascontiguousarray(chunk[name], dtype = dtype).tobytes())
+            nbRows += chunk["users"].shape[0]
+        for name, outFile in files.items():
+            dtype, shape = _FILES[name]
+            outFile.seek(0)
+            outFile.write(_npyHeader(dtype, (nbRows,) + shape))
+    finally:
+        for outFile in files.values():
+            outFile.close()
+    return nbRows
+
+
+def loadColumns(directory, mmap = True):
+    """Load the columns written by csvToColumns, memory-mapped (read only) unless mmap is False."""
+    return {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode = "r" if mmap else None)
+            for name in _FILES}
+
+
+def _chunks(columns, chunkSize):
+    """Slices of chunkSize rows of the columns (views on memory-mapped columns)."""
+    nbRows = columns["users"].shape[0]
+    for start in range(0, nbRows, chunkSize):
+        yield {name: columns[name][start:start + chunkSize] for name in _FILES}
+
+
+def _occurrences(keys):
+    """Rank of every key among the rows of the same key, in the order of the rows."""
+    order = np.argsort(keys, kind = "stable")
+    sortedKeys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sortedKeys[1:] != sortedKeys[:-1]])
+    ranks = np.arange(keys.size) - np.repeat(starts, np.diff(np.r_[starts, keys.size]))
+    occurrences = np.empty_like(ranks)
+    occurrences[order] = ranks
+    return occurrences
+
+
+def fusionStateColumns(columns, criterion = 1, state = None, chunkSize = 1000000):
+    """
+    Fold the mass rows of columns into a FusionState, as fusionState does for User objects:
+    every row is a source on the pair (altA, altB). The fused user is given by
+    preferenceFusion.userFromState. Alternatives ids must be below 2^32.
+
+    Parameters
+    -----------
+    columns: dict of ndarray
+        see loadColumns or readCSV.
+    criterion: integer
+        associative combination rule, see combinationRules.FusionState.
+    state: FusionState, optional
+        state to update, a new one by default.
+    chunkSize: integer
+        number of rows combined at once.
+    """
+    if state is None:
+        state = FusionState(criterion)
+    for chunk in _chunks(columns, chunkSize):
+        lo, hi = chunk["alters"][:, 0], chunk["alters"][:, 1]
+        keys = _pairKeys(lo, hi)
+        massMat = _orientMassMatrix(meanMassMatrix(np.asarray(chunk["masses"])), lo > hi)
+        # a pair rated by several users of the chunk is combined once per user
+        occurrences = _occurrences(keys)
+        for rank in range(occurrences.max() + 1 if keys.size else 0):
+            sel = np.flatnonzero(occurrences == rank)
+            state.add(keys[sel], np.ascontiguousarray(massMat[:, sel]))
+    return state
+
+
+def decideColumns(columns, criterion = 4, chunkSize = 1000000, out = None):
+    """
+    Decided relation of every mass row (see PairBelief.getRelation), oriented as (altA, altB).
+
+    out: ndarray of integers, optional
+        array of the number of rows receiving the relations (e.g. a memory-mapped array).
+    """
+    nbRows = columns["users"].shape[0]
+    if out is None:
+        out = np.empty(nbRows, dtype = np.int8)
+    start = 0
+    for chunk in _chunks(columns, chunkSize):
+        masses = np.asarray(chunk["masses"])
+        relations = np.full(masses.shape[0], 5, dtype = out.dtype)    # 5 for ignorance
+        decided = masses.sum(axis = 1) != 0
+        if np.any(decided):
+            relations[decided] = decideRelations(meanMassMatrix(masses[decided]), criterion)
+        out[start:start + masses.shape[0]] = relations
+        start += masses.shape[0]
+    return out
+
+
+def selectUser(columns, userId = None):
+    """Return the alternatives (k, 2) and masses (k, 4) of the rows of one user, or of all rows."""
+    if userId is None:
+        return np.asarray(columns["alters"]), np.asarray(columns["masses"])
+    rows = np.flatnonzero(np.asarray(columns["users"]) == userId)
+    return columns["alters"][rows], columns["masses"][rows]
@@ -0,0 +1,149 @@
+"""
+Distances and conflict between masses, computed for whole batches with matrix products.
+
+- Jousselme distance: d(m1, m2) = sqrt(0.5 (m1 - m2)^T D (m1 - m2)), D being the Jaccard
+  similarity matrix of the subsets, D[A, B] = |A inter B| / |A union B|.
+- conflict: mass of the empty set after the conjunctive combination.
+- distances of every source to the consensus of its group, turned into reliability factors for
+  discounting (the alpha of discounting, DSTBatch and fusion).
+
+The Jaccard and disjointness matrices of every frame size are computed once and cached.
+Masses have the subsets on their first axis (one mass per column) as in DST_fmt_functions,
+tensors have the shape (nbGroups, nbFE, nbSources) of DSTBatch.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import functools
+
+import numpy as np
+
+from DST_fmt_functions import _natoms, cardinalityVector
+from combinationRules import DSTBatch
+
+
+@functools.lru_cache(maxsize=None)
+def jaccardMatrix(natoms):
+    """
+    Jaccard similarity of the subsets of a frame with natoms atoms, a read only (2^n, 2^n) matrix.
+    The empty set is only similar to itself.
+    """
+    subsets = np.arange(1 << natoms)
+    card = cardinalityVector(natoms)
+    inter = card[subsets[:, np.newaxis] & subsets[np.newaxis, :]]
+    union = card[subsets[:, np.newaxis] | subsets[np.newaxis, :]]
+    out = np.divide(inter, union, out = np.ones(union.shape), where = union > 0)
+    out.setflags(write=False)
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def disjointMatrix(natoms):
+    """Read only (2^n, 2^n) matrix, 1 where the two subsets do not intersect."""
+    subsets = np.arange(1 << natoms)
+    out = ((subsets[:, np.newaxis] & subsets[np.newaxis, :]) == 0).astype(float)
+    out.setflags(write=False)
+    return out
+
+
+def _quadratic(diff, D):
+    """diff^T D diff for every column of diff (subsets on the first axis, any other axes)."""
+    flat = diff.reshape(diff.shape[0], -1)
+    return np.einsum('fk,fk->k', flat, D @ flat).reshape(diff.shape[1:])
+
+
+def jousselme(mass1, mass2):
+    """
+    Jousselme distance between the masses of mass1 and mass2 (subsets on the first axis, the
+    other axes are broadcast). Return an array of the shape of the other axes.
+    """
+    mass1, mass2 = np.broadcast_arrays(np.asarray(mass1, dtype = float), np.asarray(mass2, dtype = float))
+    D = jaccardMatrix(_natoms(mass1.shape[0]))
+    return np.sqrt(np.maximum(0.5 * _quadratic(mass1 - mass2, D), 0.0))
+
+
+def jousselmeMatrix(masses):
+    """Jousselme distances between all the columns of a mass matrix (nbFE, k): a (k, k) matrix."""
+    masses = np.asarray(masses, dtype = float)
+    gram = masses.T @ jaccardMatrix(_natoms(masses.shape[0])) @ masses
+    norms = np.diag(gram)
+    return np.sqrt(np.maximum(0.5 * (norms[:, np.newaxis] + norms[np.newaxis, :] - 2.0 * gram), 0.0))
+
+
+def pairConflict(mass1, mass2):
+    """
+    Conflict between two masses (or two mass matrices, column by column): the mass of the empty
+    set of their conjunctive combination, sum of m1(B) m2(C) over disjoint B and C.
+    """
+    mass1, mass2 = np.broadcast_arrays(np.asarray(mass1, dtype = float), np.asarray(mass2, dtype = float))
+    K = disjointMatrix(_natoms(mass1.shape[0]))
+    flat1, flat2 = mass1.reshape(mass1.shape[0], -1), mass2.reshape(mass2.shape[0], -1)
+    return np.einsum('fk,fk->k', flat1, K @ flat2).reshape(mass1.shape[1:])
+
+
+def conflict(massTensor, mask = None, **kwargs):
+    """Conflict of every group of massTensor: m(emptyset) of the conjunctive combination of its sources."""
+    return DSTBatch(massTensor, 1, mask, **kwargs)[:, 0]
+
+
+def consensusDistances(massTensor, mask = None, criterion = 12):
+    """
+    Jousselme distance of every source to the consensus of its group, the combination of the group
+    by criterion (the mean of the masses by default).
+
+    Return
+    -----------
+    distances: ndarray (nbGroups, nbSources)
+        nan where mask is False.
+    consensus: ndarray (nbGroups, nbFE)
+    """
+    massTensor = np.asarray(massTensor, dtype = float)
+    consensus = DSTBatch(massTensor, criterion, mask)
+    diff = np.moveaxis(massTensor - consensus[:, :, np.newaxis], 1, 0)  # (nbFE, nbGroups, nbSources)
+    distances = np.sqrt(np.maximum(0.5 * _quadratic(diff, jaccardMatrix(_natoms(massTensor.shape[1]))), 0.0))
+    if mask is not None:
+        distances[~np.asarray(mask, dtype = bool)] = np.nan
+    return distances, consensus
+
+
+def reliability(distances, perSource = False, power = 1.0):
+    """
+    Reliability factors from distances to the consensus: alpha = (1 - d)^power, d in [0, 1].
+
+    Parameters
+    -----------
+    distances: ndarray (nbGroups, nbSources)
+        see consensusDistances, nan for the pairs a source did not rate.
+    perSource: boolean
+        return one factor per source from its mean distance over the groups it rated,
+        instead of one factor per group and source.
+    power: float
+        larger values discount the distant sources more.
+
+    Return
+    -----------
+    alpha: ndarray (nbGroups, nbSources) or (nbSources,), to be used as the alpha of DSTBatch,
+    fusion or discounting. Unrated entries get 1.
+    """
+    distances = np.asarray(distances, dtype = float)
+    if perSource:
+        rated = np.isfinite(distances)
+        counts = rated.sum(axis = 0)
+        distances = np.where(rated, distances, 0.0).sum(axis = 0) / np.maximum(counts, 1)
+    return np.power(1.0 - np.clip(np.nan_to_num(distances, nan = 0.0), 0.0, 1.0), power)
+
+
+def userReliability(users, criterion = 12, power = 1.0):
+    """
+    Reliability of every user, from the mean Jousselme distance of its mean mass vectors to the
+    consensus of the users on the pairs it rated (see consensusDistances). The result is the alpha
+    of preferenceFusion.fusion for the same users.
+    """
+    from preferenceFusion import _pairLayout, _fillMassTensor
+    _, rows, layout = _pairLayout(users)
+    massTensor = np.zeros((rows.size, 16, len(users)))
+    mask = np.zeros((rows.size, len(users)), dtype = bool)
+    _fillMassTensor(users, layout, massTensor, mask)
+    distances, _ = consensusDistances(massTensor, mask, criterion)
+    return reliability(distances, perSource = True, power = power)
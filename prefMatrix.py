@@ -0,0 +1,129 @@
+"""
+Adjacency-matrix backend for the preference graph of a user.
+
+The decided relations of all the pairs are turned at once into the adjacency matrix of the
+preference graph (a -> b when a is preferred or indifferent to b), as a dense boolean array or
+a scipy CSR matrix. Strongly connected components, cycles and transitive closure are then computed
+with array operations, so that networkx is only needed to draw the graph.
+Alternatives are given by their positions 0..n-1 (e.g. in User.alterList_).
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+
+def adjacencyMatrix(n, lo, hi, relations, sparse = False):
+    """
+    Adjacency matrix of the relations of the pairs (lo[k], hi[k]).
+
+    Parameters
+    -----------
+    n: integer
+        number of alternatives.
+    lo, hi: ndarray of integers
+        positions of the alternatives of every pair.
+    relations: ndarray of integers
+        decided relations of the pairs (see PairBelief.getRelation): 0 gives lo -> hi, 1 gives
+        hi -> lo, 2 gives both and the other relations give no edge.
+    sparse: boolean
+        return a scipy CSR matrix instead of a dense boolean array.
+
+    Return
+    -----------
+    adj: ndarray of bool (n, n) or csr_matrix
+    """
+    lo, hi, relations = np.asarray(lo), np.asarray(hi), np.asarray(relations)
+    forward = (relations == 0) | (relations == 2)   # aPb or aIb
+    backward = (relations == 1) | (relations == 2)  # bPa or aIb
+    heads = np.concatenate([lo[forward], hi[backward]])
+    tails = np.concatenate([hi[forward], lo[backward]])
+    if sparse:
+        adj = sp.csr_matrix((np.ones(heads.size, dtype = bool), (heads, tails)), shape = (n, n))
+        adj.sum_duplicates()
+        return adj
+    adj = np.zeros((n, n), dtype = bool)
+    adj[heads, tails] = True
+    return adj
+
+
+def stronglyConnected(adj):
+    """Return the number of strongly connected components and the component label of every node."""
+    return connected_components(sp.csr_matrix(adj), directed = True, connection = "strong")
+
+
+def cycles(adj):
+    """Strongly connected components of more than one node, as arrays of node positions."""
+    nbComp, labels = stronglyConnected(adj)
+    sizes = np.bincount(labels, minlength = nbComp)
+    order = np.argsort(labels, kind = "stable")
+    groups = np.split(order, np.cumsum(sizes)[:-1])
+    return [groups[c] for c in np.flatnonzero(sizes > 1)]
+
+
+def condensation(adj, labels = None):
+    """
+    Adjacency matrix (CSR, bool) of the condensation of the graph: one node per strongly connected
+    component, with an edge between two components joined by an edge of the graph.
+    Return the condensation and the labels of the nodes.
+    """
+    adj = sp.coo_matrix(adj)
+    if labels is None:
+        labels = stronglyConnected(adj)[1]
+    nbComp = labels.max() + 1 if labels.size else 0
+    heads, tails = labels[adj.row], labels[adj.col]
+    keep = heads != tails
+    cond = sp.csr_matrix((np.ones(keep.sum(), dtype = bool), (heads[keep], tails[keep])), shape = (nbComp, nbComp))
+    cond.sum_duplicates()
+    return cond, labels
+
+
+def _closeDAG(cond, sparse):
+    """Reachability by at least one edge in a DAG, by repeated squaring R <- R | R.R."""
+    if sparse:
+        reach = sp.csr_matrix(cond, dtype = np.int32)
+        while True:
+            step = reach + reach @ reach
+            step.data[:] = 1
+            if step.nnz == reach.nnz:
+                return step.astype(bool)
+            reach = step
+    reach = cond.toarray().astype(np.float32)
+    while True:
+        step = (reach + reach @ reach) > 0     # float products are exact for 0/1 matrices of this size
+        if step.sum() == np.count_nonzero(reach):
+            return step
+        reach = step.astype(np.float32)
+
+
+def transitiveClosure(adj, sparse = None):
+    """
+    Transitive closure of the graph: closure[i, j] is True when there is a path of at least one
+    edge from i to j (so closure[i, i] is True for the nodes on a cycle).
+
+    The closure is computed on the condensation, whose size is the number of strongly connected
+    components, then expanded to the nodes.
+
+    Parameters
+    -----------
+    adj: ndarray of bool or sparse matrix
+    sparse: boolean, optional
+        compute and return a CSR matrix; by default sparse when adj is.
+    """
+    if sparse is None:
+        sparse = sp.issparse(adj)
+    cond, labels = condensation(adj)
+    nbComp = cond.shape[0]
+    reach = _closeDAG(cond, sparse)
+    sizes = np.bincount(labels, minlength = nbComp)
+    selfLoops = sizes > 1   # a component of several nodes reaches itself
+    if sparse:
+        reach = (reach + sp.diags(selfLoops, dtype = bool, format = "csr")).tocsr()
+        expand = sp.csr_matrix((np.ones(labels.size, dtype = bool), (np.arange(labels.size), labels)),
+                               shape = (labels.size, nbComp))
+        return (expand @ reach @ expand.T).astype(bool).tocsr()
+    reach[np.flatnonzero(selfLoops), np.flatnonzero(selfLoops)] = True
+    return reach[np.ix_(labels, labels)]
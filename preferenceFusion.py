@@ -6,45 +6,331 @@ Functions for preference fusion.
 #License: Unlicense
 
 import numpy as np
-from baseClass import *
 import math
+from baseClass import PairBelief, User, orderedPair, pairRows
+from combinationRules import DSTBatch, FusionState, loadFusionState
+import instrumentation
 
 def mergePairs(pairs):
-    merged = []
+    merged = set()
     for pair in pairs:
-        merged = list(set(merged + pair))
-    return merged
-    
+        merged.update(pair)
+    return list(merged)
+
+
+def _pairLayout(users):
+    """
+    Place the pairs of the users in the table of all their alternatives.
 
+    Return
+    -----------
+    alterList: list
+        all the alternatives, sorted as orderedPair orients the pairs.
+    rows: ndarray of integers
+        sorted rows of the pairs rated by at least one user, in the upper-triangular order of alterList.
+    layout: list
+        for every user, the rows of its table with masses, their positions in rows and whether
+        they are stored the other way round.
+    """
+    alterSet = set()
+    for user in users:
+        alterSet.update(user.beliefTable_.alterList_)
+    alterList = list(orderedPair(alterSet))
+    alterIndex = {alter: i for i, alter in enumerate(alterList)}
+    layout = []
+    for user in users:
+        table = user.beliefTable_
+        userRows = table.definedRows()
+        alterIds = np.array([alterIndex[alter] for alter in table.alterList_], dtype = np.int64)
+        lo, hi = table.pairPositions(userRows)
+        globalRows, swapped = pairRows(len(alterList), alterIds[lo], alterIds[hi])
+        layout.append((userRows, globalRows, swapped))
+    rows = np.unique(np.concatenate([globalRows for _, globalRows, _ in layout] + [np.empty(0, dtype = np.int64)]))
+    layout = [(userRows, np.searchsorted(rows, globalRows), swapped) for userRows, globalRows, swapped in layout]
+    return alterList, rows, layout
 
-def fusion(users):
+
+
+def fusion(users, criterion=1, nbWorkers=1, chunkSize=None, alpha=None, beta=None, logDomain=False, dtype=np.float64,
+           cache=None):
+    """
+    Fusion of the preferences of users, pair by pair.
+    
+    Parameters
+    -----------
+    users: list of User
+    criterion: integer
+        combination rule, see combinationRules.DST. Smets rule by default.
+    nbWorkers: integer
+        number of worker processes. With more than one worker, the pairs are split into shards
+        combined in parallel; the workers read the masses from shared memory and the result is
+        the same as with the serial path.
+    chunkSize: integer, optional
+        number of pairs per shard, by default the pairs are split in 4 shards per worker.
+    alpha: ndarray, optional
+        reliability of every user, its masses are discounted in the combination (see DSTBatch).
+    beta: ndarray, optional
+        reliabilities (nbUsers, 4) of every user in the context of every relation, for contextual discounting.
+    logDomain: boolean
+        accumulate the combination in the log domain, for large crowds (see DSTBatch).
+    dtype: numpy dtype
+        type of the mass tensor of all users, float32 halves its memory.
+    cache: fusionCache.FusionCache or string, optional
+        on-disk cache of the fused pairs (or its directory). Only the pairs whose inputs are not in
+        the cache are combined, by the serial path, and the decisions of the fused user for the
+        criteria 1 to 4 are taken from the cache.
+    
+    Return
+    -----------
+    fUser: User
+        the fused user
+    """
     #in our first step, we only consider the ideal case, which is:
     #1. all users contain same number of alternatives, and 
     #2. all mass values are properly given
     
-    pairs = mergePairs([_.relationDict_.keys() for _ in users])
+    with instrumentation.stage("fusion.pairs") as st:
+        alterList, rows, layout = _pairLayout(users)
+        st.record(items = rows.size)
     
     
     
     
-    #create mass matrix on all users for each pair 
+    #create mass tensor on all users for each pair 
     #all users provide the same contribution to the final result
     nbSingleton = 4 # In our experiment, the discernment of mass function consists 16 focal element based on 4 singletons.
-    omega = math.pow(2, nbSingleton)  
+    omega = int(math.pow(2, nbSingleton))
     #TODO propose a more general way for mass matrix initialisation 
     
-    fRelationDict = {} # initialize the final relation dictionary
-    
-    for pair in pairs: 
-        massMat = np.empty((0,omega),dtype = float) 
-        for user in users:
-            if pair in user.relationDict_.keys():
-                #add the mean mass vector into the mass matrix.
-                #In this step, we do the first combination of masses on a single relation pair of one user.
-                massMat = np.vstack(massMat, user.relationDict_[pair].getMeanMassVect())
-        
-        massCom = DST(massMat.T, 1)  # using Smets rule for combination. note that massIn for DST stock each mass in a column (vertically)
-        fRelationDict[pair] = massCom.reshape(1,nbSingleton)
-    fUser = User(fRelationDict, m=1 ) #construct the final user with its relation dictionary             
-    return User 
-   
+    tensorShape = (rows.size, omega, len(users))
+    decisions = None
+    if cache is not None:
+        massCom, decisions = _cachedCombination(users, layout, tensorShape, criterion, alpha, beta, logDomain, dtype,
+                                                cache)
+    elif nbWorkers > 1:
+        massCom = _parallelCombination(users, layout, tensorShape, criterion, nbWorkers, chunkSize, alpha, beta,
+                                       logDomain, dtype)
+    else:
+        with instrumentation.stage("fusion.massVectors") as st:
+            massTensor = np.zeros(tensorShape, dtype = dtype)
+            mask = np.zeros((rows.size, len(users)), dtype = bool) # users who did not rate a pair are left out
+            _fillMassTensor(users, layout, massTensor, mask)
+            st.record(items = int(mask.sum()), nbytes = massTensor.nbytes)
+        with instrumentation.stage("fusion.combination", rows.size):
+            # mean mass vectors only have singletons and Omega as focal elements
+            massCom = DSTBatch(massTensor, criterion, mask, alpha, beta, logDomain, singletonOmega = True)  # all pairs are combined in one call, by default with Smets rule
+    
+    with instrumentation.stage("fusion.build", rows.size):
+        fUser = User(alterList) # the fused user only has the pairs rated by some user
+        table = fUser.beliefTable_
+        table.present_[:] = False
+        table.setRows(rows, _beliefColumns(massCom))
+        if decisions is not None:
+            _setDecisions(fUser, rows, decisions)
+    return fUser
+
+
+def _cachedCombination(users, layout, tensorShape, criterion, alpha, beta, logDomain, dtype, cache):
+    """Combine the pairs missing from a FusionCache and store them. Return the masses and decisions of all pairs."""
+    from fusionCache import FusionCache, pairKeys, pairDecisions
+    if not isinstance(cache, FusionCache):
+        cache = FusionCache(cache)
+    nbPairs, _, nbUsers = tensorShape
+    with instrumentation.stage("fusion.massVectors") as st:
+        massTensor = np.zeros(tensorShape, dtype = dtype)
+        mask = np.zeros((nbPairs, nbUsers), dtype = bool)
+        _fillMassTensor(users, layout, massTensor, mask)
+        st.record(items = int(mask.sum()), nbytes = massTensor.nbytes)
+    with instrumentation.stage("fusion.cache", nbPairs):
+        keys = pairKeys(massTensor, mask, criterion, alpha, beta, logDomain)
+        found, massCom, decisions = cache.lookup(keys)
+    missing = np.flatnonzero(~found)
+    with instrumentation.stage("fusion.combination", missing.size):
+        if missing.size:
+            if alpha is not None:
+                alpha = np.broadcast_to(np.asarray(alpha, dtype = float), (nbPairs, nbUsers))[missing]
+            if beta is not None:
+                beta = np.broadcast_to(np.asarray(beta, dtype = float), (nbPairs, nbUsers, 4))[missing]
+            massCom[missing] = DSTBatch(massTensor[missing], criterion, mask[missing], alpha, beta, logDomain,
+                                        singletonOmega = True)
+            decisions[missing] = pairDecisions(massCom[missing])
+    with instrumentation.stage("fusion.cache", missing.size):
+        cache.store(keys, massCom, decisions, used = keys)
+    return massCom, decisions
+
+
+def _setDecisions(fUser, rows, decisions):
+    """Give the decisions of the fused pairs (sorted rows of its table) to the table of the fused user."""
+    from fusionCache import DECISION_CRITERIA
+    table = fUser.beliefTable_
+    for c, criterion in enumerate(DECISION_CRITERIA):
+        table.decisions_[criterion] = (rows, decisions[:, c].astype(int))
+
+
+
+def _orientMassMatrix(massMat, swapped):
+    """Exchange the masses of pref and invPref of the mass vectors (columns) of pairs seen the other way round."""
+    massMat[[1, 2]] = np.where(swapped, massMat[[2, 1]], massMat[[1, 2]])
+    return massMat
+
+
+def _fillMassTensor(users, layout, massTensor, mask):
+    """
+    Write the mean mass vector of every user on every pair into massTensor (pairs x 16 x users),
+    oriented by orderedPair, and set mask where a user gives masses on a pair. layout places the
+    pairs of the users, see _pairLayout.
+    """
+    for s, (user, (userRows, ks, swapped)) in enumerate(zip(users, layout)):
+        #In this step, we do the first combination of masses on a single relation pair of one user.
+        massTensor[ks, :, s] = _orientMassMatrix(user.beliefTable_.meanMassMatrix(userRows), swapped).T
+        mask[ks, s] = True
+
+
+_shared = {}    # arrays of a worker process, attached to the shared memory of the parent
+
+
+def _attachShared(specs, criterion, alpha = None, beta = None, logDomain = False):
+    """Initializer of the worker processes: map the shared buffers as arrays."""
+    from multiprocessing import shared_memory
+    for name, (shmName, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name = shmName)
+        _shared[name + "Shm"] = shm    # keep the mapping alive
+        _shared[name] = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+    _shared["criterion"] = criterion
+    _shared["alpha"], _shared["beta"], _shared["logDomain"] = alpha, beta, logDomain
+
+
+def _combineShard(start, stop):
+    """Worker task: combine the pairs [start, stop) of the shared tensor into the shared result."""
+    _shared["massCom"][start:stop] = DSTBatch(_shared["massTensor"][start:stop], _shared["criterion"],
+                                              _shared["mask"][start:stop], _shared["alpha"], _shared["beta"],
+                                              _shared["logDomain"], singletonOmega = True)
+
+
+def _parallelCombination(users, layout, tensorShape, criterion, nbWorkers, chunkSize, alpha = None, beta = None,
+                         logDomain = False, dtype = np.float64):
+    """Combine the pairs by shards in a pool of processes reading the masses from shared memory."""
+    from concurrent.futures import ProcessPoolExecutor   # only loaded by parallel fusions
+    from multiprocessing import shared_memory
+    nbPairs, nbFE, nbUsers = tensorShape
+    shapes = {"massTensor": (tensorShape, dtype),
+              "mask": ((nbPairs, nbUsers), np.bool_),
+              "massCom": ((nbPairs, nbFE), np.float64)}
+    shms, arrays, specs = [], {}, {}
+    try:
+        for name, (shape, dtype) in shapes.items():
+            shm = shared_memory.SharedMemory(create = True, size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            shms.append(shm)
+            arrays[name] = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+            arrays[name].fill(0)
+            specs[name] = (shm.name, shape, dtype)
+        with instrumentation.stage("fusion.massVectors", nbytes = arrays["massTensor"].nbytes):
+            _fillMassTensor(users, layout, arrays["massTensor"], arrays["mask"])
+        if chunkSize is None:
+            chunkSize = max(1, -(-nbPairs // (4 * nbWorkers)))
+        with instrumentation.stage("fusion.combination", nbPairs), \
+             ProcessPoolExecutor(max_workers = nbWorkers, initializer = _attachShared,
+                                 initargs = (specs, criterion, alpha, beta, logDomain)) as pool:
+            shards = [pool.submit(_combineShard, start, min(start + chunkSize, nbPairs))
+                      for start in range(0, nbPairs, chunkSize)]
+            for shard in shards:
+                shard.result()
+        return arrays["massCom"].copy()
+    finally:
+        arrays.clear()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+
+def _beliefColumns(massCom):
+    """Masses of pref, invPref, indiff, incompa and empty in combined mass vectors (one per row)."""
+    return massCom[:, [1, 2, 4, 8, 0]]
+
+
+def _pairKeys(lo, hi):
+    """int64 keys of the pairs of alternative ids (lo, hi), the same whatever the orientation of the pair."""
+    return (np.minimum(lo, hi) << 32) | np.maximum(lo, hi)
+
+
+def _foldUser(state, user, alterIds):
+    """
+    Combine the mean mass vectors of one user into a FusionState. alterIds gives the integer id
+    of every alternative of the user's table; pairs are oriented by increasing ids.
+    """
+    table = user.beliefTable_
+    rows = table.definedRows()
+    if rows.size == 0:
+        return
+    lo, hi = table.pairPositions(rows)
+    lo, hi = alterIds[lo], alterIds[hi]
+    state.add(_pairKeys(lo, hi), _orientMassMatrix(table.meanMassMatrix(rows), lo > hi))
+
+
+def fusionState(users, criterion=1, state=None, logDomain=False):
+    """
+    Fold the preferences of users into a FusionState (see combinationRules.FusionState).
+    
+    The alternatives must be integers (below 2^32): the keys of the pairs are built from them,
+    so that states of different shards of users, possibly fused on different machines and saved
+    with FusionState.save, can be merged and turned into the fused user with userFromState.
+    
+    Parameters
+    -----------
+    users: iterable of User
+    criterion: integer
+        associative combination rule: 1 (Smets, default), 2 (Dempster), 3 (Yager), 4 (disjunctive),
+        5 (Dubois) or 12 (mean).
+    state: FusionState, optional
+        state to update, a new one by default.
+    logDomain: boolean
+        for a new state, accumulate the products in the log domain (see FusionState).
+    
+    Return
+    -----------
+    state: FusionState
+    """
+    if state is None:
+        state = FusionState(criterion, logDomain = logDomain)
+    for user in users:
+        _foldUser(state, user, np.asarray(user.beliefTable_.alterList_, dtype = np.int64))
+    return state
+
+
+def userFromState(state, alterList=None):
+    """
+    Return the fused User of a FusionState over pairs of alternatives.
+    alterList gives the alternative of every id; by default the ids are the alternatives.
+    """
+    keys, massCom = state.finalize()
+    lo, hi = keys >> 32, keys & 0xFFFFFFFF
+    if alterList is None:
+        alterList = np.unique(np.concatenate([lo, hi]))
+        lo, hi = np.searchsorted(alterList, lo), np.searchsorted(alterList, hi)
+        alterList = alterList.tolist()
+    fUser = User(list(alterList))
+    table = fUser.beliefTable_
+    table.present_[:] = False
+    rows, swapped = table.pairIndex(lo, hi)
+    table.setRows(rows, _beliefColumns(massCom), swapped)
+    return fUser
+
+
+def fusionStream(users, criterion=1, logDomain=False):
+    """
+    Fusion of the preferences of users given by any iterable (e.g. a generator).
+    
+    Every user is folded into running per-pair commonality (or implicability) products as soon as
+    it is read, so memory depends on the number of pairs, not on the number of users.
+    Only associative criteria are available, see fusionState. With logDomain, the products are
+    accumulated in the log domain, so that crowds of any size can be fused.
+    
+    Return the fused User.
+    """
+    state = FusionState(criterion, logDomain = logDomain)
+    alterIndex = {}    # alternatives are numbered in the order they are met
+    for user in users:
+        for alter in user.beliefTable_.alterList_:
+            alterIndex.setdefault(alter, len(alterIndex))
+        _foldUser(state, user, np.array([alterIndex[alter] for alter in user.beliefTable_.alterList_], dtype = np.int64))
+    return userFromState(state, list(alterIndex))
@@ -0,0 +1,221 @@
+"""
+Preference graph with incremental maintenance of its strongly connected components.
+
+The nodes are alternatives and an edge a -> b means that a is preferred or indifferent to b.
+The strongly connected components (SCC) are kept up to date edge by edge on the condensation
+of the graph, so that the cycles of a user can be checked after every change of a pair:
+- adding an edge between two components merges the components on the paths closing a cycle,
+  found by a search restricted to the components reachable from the head of the edge;
+- removing an edge inside a component recomputes the SCC of this component only.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+from collections import Counter
+
+
+def relationEdges(a, b, relation):
+    """
+    Edges of the relation between a and b (see PairBelief.getRelation):
+    aPb gives a -> b, bPa gives b -> a, aIb gives both, incomparability and ignorance give none.
+    """
+    if relation == 0:
+        return [(a, b)]
+    if relation == 1:
+        return [(b, a)]
+    if relation == 2:
+        return [(a, b), (b, a)]
+    return []
+
+
+class PreferenceGraph():
+    """Directed graph of preferences with incremental strongly connected components.
+
+    Attributes
+    -----------
+    succ_, pred_ : dict of set
+        successors and predecessors of every node.
+    comp_ : dict
+        component id of every node.
+    members_ : dict of set
+        nodes of every component.
+    compSucc_ : dict of Counter
+        edges of the condensation: for every component, number of edges towards every other component.
+    cycles_ : set
+        ids of the components with more than one node.
+    """
+    def __init__(self, nodes = ()):
+        self.succ_ = {}
+        self.pred_ = {}
+        self.comp_ = {}
+        self.members_ = {}
+        self.compSucc_ = {}
+        self.compPred_ = {}
+        self.cycles_ = set()
+        self.nextComp_ = 0
+        for node in nodes:
+            self.addNode(node)
+
+    def _newComp(self, nodes):
+        comp = self.nextComp_
+        self.nextComp_ += 1
+        self.members_[comp] = set(nodes)
+        self.compSucc_[comp] = Counter()
+        self.compPred_[comp] = Counter()
+        for node in nodes:
+            self.comp_[node] = comp
+        if len(nodes) > 1:
+            self.cycles_.add(comp)
+        return comp
+
+    def _dropComp(self, comp):
+        for other in self.compSucc_.pop(comp):
+            del self.compPred_[other][comp]
+        for other in self.compPred_.pop(comp):
+            del self.compSucc_[other][comp]
+        self.cycles_.discard(comp)
+        return self.members_.pop(comp)
+
+    def _linkComps(self, nodes):
+        """Add to the condensation the edges leaving or entering the given nodes."""
+        for u in nodes:
+            cu = self.comp_[u]
+            for v in self.succ_[u]:
+                cv = self.comp_[v]
+                if cu != cv:
+                    self.compSucc_[cu][cv] += 1
+                    self.compPred_[cv][cu] += 1
+            for v in self.pred_[u]:
+                cv = self.comp_[v]
+                if cu != cv and v not in nodes:
+                    self.compSucc_[cv][cu] += 1
+                    self.compPred_[cu][cv] += 1
+
+    def addNode(self, node):
+        if node not in self.succ_:
+            self.succ_[node] = set()
+            self.pred_[node] = set()
+            self._newComp([node])
+
+    def hasEdge(self, u, v):
+        return u in self.succ_ and v in self.succ_[u]
+
+    def edges(self):
+        return [(u, v) for u, succ in self.succ_.items() for v in succ]
+
+    def addEdge(self, u, v):
+        """Add the edge u -> v, merging the components it closes a cycle on."""
+        self.addNode(u)
+        self.addNode(v)
+        if v in self.succ_[u]:
+            return
+        self.succ_[u].add(v)
+        self.pred_[v].add(u)
+        cu, cv = self.comp_[u], self.comp_[v]
+        if cu == cv:
+            return
+        #components reachable from cv; cu is among them if the edge closes a cycle
+        reached, stack = {cv}, [cv]
+        while stack:
+            for comp in self.compSucc_[stack.pop()]:
+                if comp not in reached:
+                    reached.add(comp)
+                    stack.append(comp)
+        if cu not in reached:
+            self.compSucc_[cu][cv] += 1
+            self.compPred_[cv][cu] += 1
+            return
+        #the components on a path from cv to cu form a cycle with the new edge
+        onCycle, stack = {cu}, [cu]
+        while stack:
+            for comp in self.compPred_[stack.pop()]:
+                if comp in reached and comp not in onCycle:
+                    onCycle.add(comp)
+                    stack.append(comp)
+        nodes = set()
+        for comp in onCycle:
+            nodes |= self._dropComp(comp)
+        self._newComp(nodes)
+        self._linkComps(nodes)
+
+    def removeEdge(self, u, v):
+        """Remove the edge u -> v if it exists, splitting its component if needed."""
+        if not self.hasEdge(u, v):
+            return
+        self.succ_[u].discard(v)
+        self.pred_[v].discard(u)
+        cu, cv = self.comp_[u], self.comp_[v]
+        if cu != cv:
+            for counts, key in ((self.compSucc_[cu], cv), (self.compPred_[cv], cu)):
+                counts[key] -= 1
+                if counts[key] == 0:
+                    del counts[key]
+            return
+        nodes = self._dropComp(cu)
+        for scc in _tarjan(nodes, self.succ_):
+            self._newComp(scc)
+        self._linkComps(nodes)
+
+    def setPair(self, a, b, relation):
+        """Replace the edges between a and b by those of the given relation (see relationEdges)."""
+        wanted = relationEdges(a, b, relation)
+        for edge in ((a, b), (b, a)):
+            if edge not in wanted:
+                self.removeEdge(*edge)
+        for edge in wanted:
+            self.addEdge(*edge)
+
+    def component(self, node):
+        """Nodes of the strongly connected component of node."""
+        return set(self.members_[self.comp_[node]])
+
+    def inCycle(self, node):
+        return self.comp_[node] in self.cycles_
+
+    def hasCycle(self):
+        return len(self.cycles_) > 0
+
+    def cycles(self):
+        """Strongly connected components of more than one node, as sets."""
+        return [set(self.members_[comp]) for comp in self.cycles_]
+
+
+def _tarjan(nodes, succ):
+    """Strongly connected components of the subgraph induced by nodes (iterative Tarjan)."""
+    index, low, onStack, stack, sccs = {}, {}, set(), [], []
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(succ[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        onStack.add(root)
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in nodes:
+                    continue
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    onStack.add(child)
+                    work.append((child, iter(succ[child])))
+                    break
+                if child in onStack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        onStack.discard(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    sccs.append(scc)
+    return sccs
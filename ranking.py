@@ -0,0 +1,242 @@
+"""
+Consensus rankings of the alternatives from fused pairwise beliefs.
+
+The belief of every pair (a, b) of a fused user is summarized by two supports, P[a, b] for
+"a is preferred to b" and P[b, a] for the inverse preference: the pignistic probabilities (BetP)
+or the plausibilities of pref and invPref of its mean mass vector. From the matrix P:
+- Borda scores: sum over b of P[a, b], the expected number of wins of a.
+- Copeland scores: number of pairs won by a (P[a, b] > P[b, a]), 1/2 for a tie. Pairs without
+  any support are not counted.
+- approximate Kemeny ranking: the order maximizing the sum of P[a, b] - P[b, a] over a ranked
+  before b, searched from the Borda order by moving alternatives to their best position until no
+  move improves the order (a local optimum of the insertion neighbourhood).
+Alternatives are given by their positions 0..n-1 (e.g. in User.alterList_), P is dense.
+
+RankingAggregator keeps the scores of a fused user up to date as its pairs are fused again,
+only updating the pairs that changed, and answers top-k queries.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import numpy as np
+
+from DST_fmt_functions import mtobetpBatch, membershipMatrix
+
+MEASURES = ("betp", "pl")
+
+
+def pairSupports(table, rows, measure = "betp"):
+    """
+    Supports (pij, pji) of pref and invPref of the given rows of a PairBeliefTable, from their
+    mean mass vectors: BetP (measure "betp") or plausibility (measure "pl").
+    """
+    if measure not in MEASURES:
+        raise ValueError("unknown measure %s, use one of %s" % (measure, MEASURES))
+    meanMass = table.meanMassMatrix(rows)
+    if measure == "betp":
+        support = mtobetpBatch(meanMass)
+    else:
+        support = membershipMatrix(4) @ meanMass
+    return support[0], support[1]
+
+
+def pairwiseArrays(user, measure = "betp"):
+    """
+    Supports of the pairs of a user with masses.
+
+    Return
+    -----------
+    lo, hi: ndarray of integers
+        positions of the alternatives of every pair in user.alterList_.
+    pij, pji: ndarray
+        supports of "lo is preferred to hi" and of "hi is preferred to lo".
+    """
+    table = user.beliefTable_
+    rows = table.definedRows()
+    lo, hi = table.pairPositions(rows)
+    pij, pji = pairSupports(table, rows, measure)
+    return lo, hi, pij, pji
+
+
+def pairwiseMatrix(n, lo, hi, pij, pji, dtype = np.float32):
+    """Dense matrix P (n, n) of the supports of the pairs (lo[k], hi[k]), 0 for the missing pairs."""
+    P = np.zeros((n, n), dtype = dtype)
+    P[lo, hi] = pij
+    P[hi, lo] = pji
+    return P
+
+
+def bordaScores(P):
+    """Borda scores of the alternatives: sum of the rows of P."""
+    return P.sum(axis = 1, dtype = np.float64)
+
+
+def _copelandPoints(pij, pji):
+    """Copeland points of both alternatives of pairs: 1 for a win, 1/2 for a tie, 0 without support."""
+    known = (pij + pji) > 0
+    wins = np.where(pij > pji, 1.0, np.where(pij == pji, 0.5, 0.0)) * known
+    return wins, (known - wins) * known
+
+
+def copelandScores(P):
+    """Copeland scores of the alternatives: pairs won, ties counting 1/2."""
+    return _copelandPoints(P, P.T)[0].sum(axis = 1)
+
+
+def kemenyScore(P, order):
+    """Sum of P[a, b] - P[b, a] over the pairs with a ranked before b in order."""
+    W = (P - P.T)[np.ix_(order, order)]
+    return float(np.triu(W, 1).sum(dtype = np.float64))
+
+
+def kemenyRanking(P, order = None, maxPasses = 20, tol = 1e-12):
+    """
+    Approximate Kemeny ranking by insertion local search.
+
+    Parameters
+    -----------
+    P: ndarray (n, n)
+        supports of the pairs, see pairwiseMatrix.
+    order: ndarray of integers, optional
+        initial ranking, by decreasing Borda scores by default.
+    maxPasses: integer
+        maximal number of passes over all the alternatives, each pass is O(n^2).
+
+    Return
+    -----------
+    order: ndarray of integers
+        positions of the alternatives from the best to the worst.
+    """
+    W = np.asarray(P - P.T, dtype = np.float64)
+    order = topK(bordaScores(P), P.shape[0]) if order is None else np.array(order, dtype = np.int64)
+    n = order.size
+    for _ in range(maxPasses):
+        improved = False
+        for x in order.copy():
+            p = int(np.flatnonzero(order == x)[0])
+            cumsum = np.concatenate([[0.0], np.cumsum(W[x, order])])   # cumsum[q] = sum of W[x, order[:q]]
+            # moving x before order[q] (q < p) gains 2 sum W[x, order[q:p]],
+            # moving x after order[q] (q > p) gains -2 sum W[x, order[p+1:q+1]]
+            gains = np.empty(n)
+            gains[:p] = 2.0 * (cumsum[p] - cumsum[:p])
+            gains[p] = 0.0
+            gains[p + 1:] = -2.0 * (cumsum[p + 2:] - cumsum[p + 1])
+            q = int(np.argmax(gains))
+            if gains[q] > tol:
+                order = np.insert(np.delete(order, p), q, x)
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def topK(scores, k):
+    """Positions of the k best scores, by decreasing score (ties by position), with argpartition."""
+    scores = np.asarray(scores)
+    k = min(int(k), scores.size)
+    if k <= 0:
+        return np.empty(0, dtype = np.int64)
+    best = np.argpartition(-scores, k - 1)[:k] if k < scores.size else np.arange(scores.size)
+    return best[np.lexsort((best, -scores[best]))]
+
+
+class RankingAggregator():
+    """
+    Consensus ranking of a fused user, updated incrementally.
+
+    The supports of all the pairs are kept in a dense matrix P_ with the Borda and Copeland scores;
+    the aggregator listens to the belief table of the user, so that when pairs are fused again
+    (their masses set), only these pairs are read again, on the next query.
+
+    Parameters
+    -----------
+    user: User
+        usually the fused user of preferenceFusion.fusion or userFromState.
+    measure: string
+        "betp" or "pl", see pairSupports.
+    dtype: numpy dtype
+        type of P_, float32 by default (100 MB for 5000 alternatives).
+
+    Attributes
+    -----------
+    P_ : ndarray (n, n)
+    borda_, copeland_ : ndarray (n,)
+    """
+    def __init__(self, user, measure = "betp", dtype = np.float32):
+        if measure not in MEASURES:
+            raise ValueError("unknown measure %s, use one of %s" % (measure, MEASURES))
+        self.user_ = user
+        self.measure_ = measure
+        table = user.beliefTable_
+        n = len(table.alterList_)
+        lo, hi, pij, pji = pairwiseArrays(user, measure)
+        self.P_ = pairwiseMatrix(n, lo, hi, pij, pji, dtype)
+        self.borda_ = bordaScores(self.P_)
+        self.copeland_ = copelandScores(self.P_)
+        self.dirtyRows_ = set()
+        table.listeners_.append(self._markDirty)
+
+    def _markDirty(self, rows):
+        self.dirtyRows_.update(rows)
+
+    def close(self):
+        """Stop following the belief table of the user."""
+        self.user_.beliefTable_.listeners_.remove(self._markDirty)
+
+    def sync(self):
+        """Update P_ and the scores for the pairs whose masses changed."""
+        if not self.dirtyRows_:
+            return
+        table = self.user_.beliefTable_
+        rows = np.fromiter(self.dirtyRows_, dtype = np.int64)
+        self.dirtyRows_.clear()
+        lo, hi = table.pairPositions(rows)
+        pij = np.zeros(rows.size)
+        pji = np.zeros(rows.size)
+        defined = table.defined_[rows]
+        if np.any(defined):
+            pij[defined], pji[defined] = pairSupports(table, rows[defined], self.measure_)
+        self.update(lo, hi, pij, pji)
+
+    def update(self, lo, hi, pij, pji):
+        """Replace the supports of the pairs (lo[k], hi[k]) of distinct alternatives and update the scores."""
+        lo, hi = np.asarray(lo, dtype = np.int64), np.asarray(hi, dtype = np.int64)
+        P = self.P_
+        oldWins, oldLosses = _copelandPoints(P[lo, hi].astype(np.float64), P[hi, lo].astype(np.float64))
+        np.subtract.at(self.borda_, lo, P[lo, hi])
+        np.subtract.at(self.borda_, hi, P[hi, lo])
+        P[lo, hi] = pij
+        P[hi, lo] = pji
+        np.add.at(self.borda_, lo, P[lo, hi])
+        np.add.at(self.borda_, hi, P[hi, lo])
+        wins, losses = _copelandPoints(P[lo, hi].astype(np.float64), P[hi, lo].astype(np.float64))
+        np.add.at(self.copeland_, lo, wins - oldWins)
+        np.add.at(self.copeland_, hi, losses - oldLosses)
+
+    def scores(self, method = "copeland"):
+        """Scores of the alternatives (in the order of alterList_) by "copeland" or "borda"."""
+        self.sync()
+        if method == "copeland":
+            return self.copeland_
+        if method == "borda":
+            return self.borda_
+        raise ValueError("unknown method %s, use copeland or borda" % method)
+
+    def ranking(self, method = "kemeny", maxPasses = 20):
+        """
+        All the alternatives from the best to the worst, by "copeland", "borda" or "kemeny"
+        (approximate, started from the Borda ranking).
+        """
+        alterList = self.user_.beliefTable_.alterList_
+        if method == "kemeny":
+            self.sync()
+            order = kemenyRanking(self.P_, maxPasses = maxPasses)
+        else:
+            order = topK(self.scores(method), len(alterList))
+        return [alterList[i] for i in order.tolist()]
+
+    def topK(self, k, method = "copeland"):
+        """The k best alternatives by Copeland or Borda scores."""
+        alterList = self.user_.beliefTable_.alterList_
+        return [alterList[i] for i in topK(self.scores(method), k).tolist()]
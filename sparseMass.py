@@ -0,0 +1,145 @@
+"""
+Sparse representation of mass functions.
+
+A mass function is stored by its focal sets only: every focal set is an integer bitmask
+(bit i is set when the i-th atom belongs to the set, the same order as the dense vectors of
+DST_fmt_functions) with its mass. Memory and computations depend on the number of focal sets,
+not on 2^n, so frames of up to 63 atoms can be used.
+"""
+
+#Author: Yiru Zhang <yiru.zhang@irisa.fr>
+#License: Unlicense
+
+import numpy as np
+
+from exceptions import IllegalMassSizeError, IllegalCriterionError
+
+MAX_ATOMS = 63
+
+
+def _popcount(focals):
+    """Number of atoms of every focal set."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(focals).astype(np.int64)
+    bytesView = focals.astype(np.uint64).view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(bytesView, axis = 1).sum(axis = 1).astype(np.int64)
+
+
+class SparseMass():
+    """Mass function given by its focal sets.
+    
+    Attributes
+    -----------
+    natoms_ : int
+        number of atoms of the frame of discernment.
+    focals_ : ndarray of int64
+        focal sets as bitmasks, in increasing order, without repetition.
+    values_ : ndarray of float
+        mass of every focal set.
+    """
+    def __init__(self, focals, values, natoms):
+        if natoms < 1 or natoms > MAX_ATOMS:
+            raise IllegalMassSizeError("ACCIDENT: the frame should have 1 to %d atoms\n" % MAX_ATOMS)
+        focals = np.asarray(focals, dtype = np.int64).ravel()
+        values = np.asarray(values, dtype = float).ravel()
+        if focals.size != values.size:
+            raise IllegalMassSizeError("ACCIDENT: focals and values should have the same size\n")
+        omega = np.int64((1 << natoms) - 1)
+        if np.any((focals < 0) | (focals & ~omega != 0)):
+            raise IllegalMassSizeError("ACCIDENT: a focal set is not a subset of the frame\n")
+        self.natoms_ = natoms
+        # merge repeated focal sets and drop null masses
+        self.focals_, inverse = np.unique(focals, return_inverse = True)
+        self.values_ = np.bincount(inverse.ravel(), weights = values, minlength = self.focals_.size)
+        kept = self.values_ != 0
+        self.focals_ = self.focals_[kept]
+        self.values_ = self.values_[kept]
+    
+    def omega(self):
+        """Bitmask of the whole frame."""
+        return (1 << self.natoms_) - 1
+    
+    def getMass(self, subset):
+        """Mass of the given subset (bitmask)."""
+        k = np.searchsorted(self.focals_, subset)
+        if k < self.focals_.size and self.focals_[k] == subset:
+            return float(self.values_[k])
+        return 0.0
+    
+    def toDense(self):
+        """Return the dense mass vector of size 2^natoms."""
+        if self.natoms_ > 30:
+            raise IllegalMassSizeError("ACCIDENT: the frame is too large for a dense mass vector\n")
+        out = np.zeros(1 << self.natoms_)
+        out[self.focals_] = self.values_
+        return out
+    
+    def conjunctive(self, other):
+        """Conjunctive combination (Smets) with another SparseMass of the same frame."""
+        self._checkFrame(other)
+        return SparseMass(np.bitwise_and.outer(self.focals_, other.focals_),
+                          np.multiply.outer(self.values_, other.values_), self.natoms_)
+    
+    def disjunctive(self, other):
+        """Disjunctive combination with another SparseMass of the same frame."""
+        self._checkFrame(other)
+        return SparseMass(np.bitwise_or.outer(self.focals_, other.focals_),
+                          np.multiply.outer(self.values_, other.values_), self.natoms_)
+    
+    def discount(self, alpha):
+        """Classical discounting: the masses are multiplied by alpha, the rest goes to the frame."""
+        return SparseMass(np.r_[self.focals_, self.omega()], np.r_[alpha * self.values_, 1.0 - alpha],
+                          self.natoms_)
+    
+    def betP(self):
+        """Pignistic probability of every atom. A mass all given to the empty set gives the uniform probability."""
+        nonEmpty = self.focals_ != 0
+        focals, values = self.focals_[nonEmpty], self.values_[nonEmpty]
+        normal = values.sum()
+        if normal <= 0:
+            return np.full(self.natoms_, 1.0 / self.natoms_)
+        membership = (focals[:, np.newaxis] >> np.arange(self.natoms_)) & 1
+        return (values / _popcount(focals)) @ membership / normal
+    
+    def _checkFrame(self, other):
+        if other.natoms_ != self.natoms_:
+            raise IllegalMassSizeError("ACCIDENT: masses should be defined on the same frame\n")
+
+
+def denseToSparse(massVect):
+    """Return the SparseMass of a dense mass vector of size 2^n."""
+    massVect = np.asarray(massVect, dtype = float).ravel()
+    natoms = massVect.size.bit_length() - 1
+    if (1 << natoms) != massVect.size:
+        raise IllegalMassSizeError("ACCIDENT: the length of the mass vector should be a power of 2\n")
+    focals = np.flatnonzero(massVect)
+    return SparseMass(focals, massVect[focals], natoms)
+
+
+def combineSparse(masses, criterion = 1):
+    """
+    Combine a list of SparseMass defined on the same frame.
+    
+    criterion: integer
+        the rules of combinationRules.DST that are computed on focal sets:
+            criterion=1 Smets criterion (conjunctive combination rule)
+            criterion=2 Dempster-Shafer criterion (normalized)
+            criterion=3 Yager criterion
+            criterion=4 Disjunctive combination criterion
+    """
+    if criterion not in (1, 2, 3, 4):
+        raise IllegalCriterionError("ACCIDENT: combination criterion %s is not available on sparse masses\n" % criterion)
+    result = masses[0]
+    for mass in masses[1:]:
+        result = result.disjunctive(mass) if criterion == 4 else result.conjunctive(mass)
+    if criterion in (2, 3):
+        conflict = result.getMass(0)
+        nonEmpty = result.focals_ != 0
+        if criterion == 2:
+            #Dempster-Shafer criterion (normalized)
+            result = SparseMass(result.focals_[nonEmpty], result.values_[nonEmpty] / (1.0 - conflict), result.natoms_)
+        else:
+            #Yager criterion: the conflict is given to the ignorance
+            result = SparseMass(np.r_[result.focals_[nonEmpty], result.omega()],
+                                np.r_[result.values_[nonEmpty], conflict], result.natoms_)
+    return result
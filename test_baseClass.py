@@ -0,0 +1,94 @@
+import itertools
+
+import numpy as np
+from baseClass import *
+
+
+def test_pairIndex_roundtrip():
+    table = PairBeliefTable(range(7))
+    pairs = np.array(list(itertools.combinations(range(7), 2)))
+    rows, swapped = table.pairIndex(pairs[:, 1], pairs[:, 0])
+    assert np.array_equal(rows, np.arange(table.nbPairs_)) and swapped.all()
+    lo, hi = table.pairPositions(rows)
+    assert np.array_equal(lo, pairs[:, 0]) and np.array_equal(hi, pairs[:, 1])
+
+
+def test_table_orientation():
+    table = PairBeliefTable(["a", "b", "c"])
+    table.setMasses(["b"], ["a"], [[0.5, 0.1, 0.2, 0.0]])
+    assert np.allclose(table.getMasses(["a"], ["b"]), [[0.1, 0.5, 0.2, 0.0, 0.0, 0.2]])
+    view = table.beliefView(0, swapped=True)
+    view.setMass(0.3, 0.4)
+    assert np.allclose(table.massArr_[0], [0.4, 0.3, 0, 0, 0, 0.3])
+
+
+def test_user_relationDict_view():
+    user = User([0, 1, 2, 3])
+    assert len(user.relationDict_) == 6 and user.relationDict_[frozenset((0, 1))] is None
+    belief = PairBelief([0.1, 0.6, 0.1, 0.1])
+    user.relationDict_[frozenset((2, 1))] = belief
+    stored = user.relationDict_[frozenset((1, 2))]
+    assert stored.massValDict_ == belief.massValDict_
+    assert np.allclose(stored.getMeanMassVect(), belief.getMeanMassVect())
+    rows = user.beliefTable_.definedRows()
+    assert np.allclose(user.beliefTable_.meanMassMatrix(rows)[:, 0], belief.getMeanMassVect())
+    assert user.getRelations() == {frozenset((1, 2)): belief.getRelation()}
+    del user.relationDict_[frozenset((0, 3))]
+    assert frozenset((0, 3)) not in user.relationDict_ and len(user.relationDict_) == 5
+
+
+def test_cache_invalidation():
+    belief = PairBelief([0.6, 0.1, 0.1, 0.1])
+    assert belief.getRelation() == 0 and belief.getMeanMassVect()[1] == 0.15
+    belief.setMass(0.1, 0.6, 0.1, 0.1)
+    assert belief.getRelation() == 1 and belief.getMeanMassVect()[2] == 0.15
+    user = User([0, 1, 2], cacheSize=2)
+    user.relationDict_[frozenset((0, 1))] = belief
+    view = user.relationDict_[frozenset((0, 1))]
+    assert np.isclose(view.getBetP().sum(), 1) and user.getRelations()[frozenset((0, 1))] == 1
+    view.massValDict_["pref"], view.massValDict_["invPref"] = 0.6, 0.1
+    assert user.relationDict_[frozenset((0, 1))].getRelation() == 0
+    assert user.getRelations()[frozenset((0, 1))] == 0
+    for pair in itertools.combinations(range(3), 2):
+        user.relationDict_[frozenset(pair)] = belief
+        user.relationDict_[frozenset(pair)].getMeanMassVect()
+    assert len(user.beliefTable_.cache_) <= 2
+
+
+def test_trackGraph():
+    user = User([0, 1, 2, 3])
+    for a, b in [(0, 1), (1, 2), (2, 3)]:
+        user.relationDict_[frozenset((a, b))] = PairBelief([0.7, 0.1, 0.1, 0.1] if a < b else [0.1, 0.7, 0.1, 0.1])
+    user.trackGraph()
+    assert user.findCircles() == []
+    user.relationDict_[frozenset((0, 3))] = PairBelief([0.1, 0.7, 0.1, 0.1])
+    assert user.findCircles() == [{0, 1, 2, 3}]
+    user.relationDict_[frozenset((1, 2))].setMass(0.1, 0.7, 0.1, 0.1)
+    assert user.findCircles() == []
+    user.relationDict_[frozenset((1, 3))] = PairBelief([0.7, 0.1, 0.1, 0.1])
+    assert user.findCircles() == [{0, 1, 3}]
+    user.drawGraph()
+    assert user.prefG_.has_edge(3, 0) and not user.prefG_.has_edge(1, 2)
+    del user.relationDict_[frozenset((0, 3))]
+    user.drawGraph()
+    assert user.findCircles() == [] and not user.prefG_.has_edge(3, 0)
+
+
+def test_findCircles_backends():
+    user = User(list("abcde"))
+    rng = np.random.default_rng(5)
+    rows = np.arange(user.beliefTable_.nbPairs_)
+    user.beliefTable_.setRows(rows, rng.dirichlet(np.ones(5), rows.size)[:, :4])
+    expected = sorted(map(sorted, user.findCircles(backend="networkx")))
+    assert sorted(map(sorted, user.findCircles(backend="matrix"))) == expected
+    assert sorted(map(sorted, user.findCircles(backend="incremental"))) == expected
+
+
+def test_appriou_decision_gives_relations():
+    belief = PairBelief([0.7, 0.1, 0.1, 0.0])
+    assert belief.getRelation(5) == 0
+    user = User(list("abc"))
+    user.relationDict_[frozenset("ab")] = PairBelief([0.1, 0.8, 0.0, 0.0])
+    assert user.getRelations(5) == {frozenset("ab"): 1}
+    # a subset of several relations leaves the pair undecided
+    assert decideRelations(meanMassMatrix(np.array([[0.3, 0.3, 0.2, 0.2]])), 5, r=0).tolist() == [5]
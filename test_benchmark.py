@@ -0,0 +1,12 @@
+import json
+
+from benchmark import run, save, compare
+
+
+def test_run_and_compare(tmp_path):
+    results = run(quick=True, pattern="mtoqBatch", minTime=0.001)
+    assert {r["params"]["natoms"] for r in results} == {2, 4} and all(r["time"] > 0 for r in results)
+    path = save(results, str(tmp_path))
+    with open(path) as data:
+        assert json.load(data)["results"] == results
+    assert compare(path, path) == []
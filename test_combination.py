@@ -1,11 +1,12 @@
 from combinationRules import *
 import numpy as np
+import pytest
 
 
 
 
 massMat = np.array([0.09007352300893699, 0.4540690072094766, 0.10256771837295282, 0.19918608688158584])
-massVects = np.zeros((4,math.pow(2,4)))
+massVects = np.zeros((4,int(math.pow(2,4))))
 for i in range(4):
     massVects[i][int(math.pow(2,i))] = massMat[i]
 print (massVects)
@@ -13,3 +14,237 @@ print ("combined: ",DST(massVects,12))
 
 print("\nSmets:",DST(massVects,1))
 
+
+
+def test_DSTBatch_matches_DST():
+    massTensor = np.random.default_rng(0).dirichlet(np.ones(16), size=(5, 3)).transpose(0, 2, 1)
+    for criterion in (1, 12):
+        massCom = DSTBatch(massTensor, criterion)
+        for k in range(massTensor.shape[0]):
+            assert np.allclose(massCom[k], DST(massTensor[k], criterion)[:, 0])
+
+
+def test_DSTBatch_mask_leaves_sources_out():
+    massTensor = np.random.default_rng(1).dirichlet(np.ones(8), size=(4, 3)).transpose(0, 2, 1)
+    mask = np.array([[True, True, True], [True, False, True], [False, False, True], [False, False, False]])
+    for criterion in (1, 12):
+        massCom = DSTBatch(massTensor, criterion, mask)
+        for k in range(3):
+            assert np.allclose(massCom[k], DST(massTensor[k][:, mask[k]], criterion)[:, 0])
+        assert np.allclose(massCom[3], np.eye(8)[-1])   # no source: vacuous mass
+
+
+def _bruteCombination(massIn, pcr6):
+    """Enumerate every tuple of focal elements: conjunctive rule, or PCR6 if pcr6 is True."""
+    import itertools
+    nbFE, nbSources = massIn.shape
+    out = np.zeros(nbFE)
+    for focals in itertools.product(range(nbFE), repeat=nbSources):
+        vals = massIn[list(focals), range(nbSources)]
+        inter = np.bitwise_and.reduce(focals)
+        if inter or not pcr6:
+            out[inter] += np.prod(vals)
+        elif vals.sum() > 0:
+            for s in range(nbSources):
+                out[focals[s]] += vals[s] * np.prod(vals) / vals.sum()
+    return out
+
+
+def _bruteDisjunctive(massIn, duboisPrade=False):
+    """Enumerate every tuple: the product goes to the union, or for Dubois and Prade to the non empty intersection."""
+    import itertools
+    nbFE, nbSources = massIn.shape
+    out = np.zeros(nbFE)
+    for focals in itertools.product(range(nbFE), repeat=nbSources):
+        inter = np.bitwise_and.reduce(focals)
+        target = inter if duboisPrade and inter else np.bitwise_or.reduce(focals)
+        out[target] += np.prod(massIn[list(focals), range(nbSources)])
+    return out
+
+
+def test_DST_disjunctive_rules():
+    rng = np.random.default_rng(3)
+    massIn = rng.dirichlet(np.ones(8), size=3).T   # subnormal masses on 3 atoms
+    assert np.allclose(DST(massIn, 4)[:, 0], _bruteDisjunctive(massIn))
+    # Dubois: every source is normalized before the disjunctive combination
+    normalized = np.vstack([np.zeros(3), massIn[1:] / (1 - massIn[0])])
+    assert np.allclose(DST(massIn, 5)[:, 0], _bruteDisjunctive(normalized))
+    # Florea: (disjunctive k + conjunctive (1 - k)) / (1 - k + k^2), k the conflict
+    conj, disj = _bruteCombination(massIn, pcr6=False), _bruteDisjunctive(massIn)
+    k = conj[0]
+    florea = (disj * k + conj * (1 - k)) / (1 - k + k * k)
+    florea[0] = 0
+    assert np.allclose(DST(massIn, 7)[:, 0], florea)
+    # Dubois and Prade, on Bayesian masses
+    bayesian = np.zeros((8, 3))
+    bayesian[[1, 2, 4]] = rng.dirichlet(np.ones(3), size=3).T
+    assert np.allclose(DST(bayesian, 6)[:, 0], _bruteDisjunctive(bayesian, duboisPrade=True))
+
+
+def test_DST_normalized_rules():
+    massIn = np.random.default_rng(2).dirichlet(np.ones(7), size=3).T
+    massIn = np.vstack([np.zeros(3), massIn])   # normalized masses on 3 atoms
+    conj = _bruteCombination(massIn, pcr6=False)
+    dempster = np.r_[0, conj[1:] / (1 - conj[0])]
+    yager = np.r_[0, conj[1:-1], conj[-1] + conj[0]]
+    assert np.allclose(DST(massIn, 2)[:, 0], dempster)
+    assert np.allclose(DST(massIn, 3)[:, 0], yager)
+    assert np.allclose(DST(massIn, 8)[:, 0], _bruteCombination(massIn, pcr6=True))
+    for criterion in (4, 5, 7):
+        assert np.isclose(DST(massIn, criterion).sum(), 1)
+
+
+def test_FusionState_merge_matches_DSTBatch():
+    massTensor = np.random.default_rng(3).dirichlet(np.ones(8), size=(4, 5)).transpose(0, 2, 1)
+    keys = np.array([10, 11, 12, 13])
+    for criterion in (1, 2, 3, 4, 5, 12):
+        left, right = FusionState(criterion, nbFE=8), FusionState(criterion, nbFE=8, capacity=1)
+        for s in range(5):
+            (left if s < 2 else right).add(keys[::-1], massTensor[::-1, :, s].T.copy())
+        stateKeys, Mass = left.merge(right).finalize()
+        assert np.allclose(Mass[np.argsort(stateKeys)], DSTBatch(massTensor, criterion))
+
+
+def test_DSTBatch_fused_discounting():
+    from discounting import discounting, contextualDiscounting
+    rng = np.random.default_rng(4)
+    massTensor = rng.dirichlet(np.ones(16), size=(5, 3)).transpose(0, 2, 1)
+    mask = rng.random((5, 3)) < 0.8
+    alpha = rng.random((5, 3))
+    beta = rng.random((3, 4))
+    for criterion in (1, 2, 3, 4, 5, 7, 8, 12):
+        discounted = np.stack([discounting(massTensor[k], alpha[k]) for k in range(5)])
+        assert np.allclose(DSTBatch(massTensor, criterion, mask, alpha=alpha),
+                           DSTBatch(discounted, criterion, mask), equal_nan=True)
+        contextual = np.stack([np.column_stack([contextualDiscounting(massTensor[k][:, s], beta[s])[:, 0]
+                                                for s in range(3)]) for k in range(5)])
+        assert np.allclose(DSTBatch(massTensor, criterion, mask, beta=beta),
+                           DSTBatch(contextual, criterion, mask), equal_nan=True)
+    assert np.allclose(DST(massTensor[0], 1, alpha=0.5), DST(discounting(massTensor[0], 0.5), 1))
+
+
+def test_contextualDiscounting_singleton_context():
+    from discounting import contextualDiscounting
+    mass = np.zeros(8)
+    mass[1] = 1.0
+    assert np.allclose(contextualDiscounting(mass, [1.0, 1.0, 1.0])[:, 0], mass)
+    # unreliable in the contexts of atoms 1 and 2: the mass goes to the frame
+    assert np.allclose(contextualDiscounting(mass, [1.0, 0.0, 0.0])[:, 0], np.eye(8)[-1])
+    # reliability 0.3 for atom 1: 0.7 of the mass goes to {atom 0, atom 1}
+    assert np.allclose(contextualDiscounting(mass, [1.0, 0.3, 1.0])[[1, 3], 0], [0.3, 0.7])
+
+
+def test_logDomain_large_crowd():
+    rng = np.random.default_rng(6)
+    # 3000 sources agreeing on atom 0 with some noise: the products of commonalities underflow
+    massTensor = np.zeros((4, 16, 3000))
+    massTensor[:, [1, 2, 3, 15], :] = rng.dirichlet([8, 1, 1, 2], size=(4, 3000)).transpose(0, 2, 1)
+    mask = np.ones((4, 3000), dtype=bool)
+    mask[0, 100:] = False
+    for criterion in (1, 3, 4, 12):
+        assert np.allclose(DSTBatch(massTensor, criterion, mask, logDomain=True), DSTBatch(massTensor, criterion, mask))
+    assert (~np.isfinite(DSTBatch(massTensor, 2, mask)[1:])).any(axis=1).all()
+    Mass = DSTBatch(massTensor, 2, mask, logDomain=True)
+    assert np.allclose(Mass.sum(axis=1), 1) and np.all(np.argmax(Mass, axis=1) == 1)
+    assert np.allclose(Mass[0], DSTBatch(massTensor[:1, :, :100], 2))
+    report = combinationAccuracy(massTensor[:1, :, :100], 2)
+    assert report["maxAbsError"] < 1e-4 and report["decisionAgreement"] == 1 and report["nbytes"] * 2 == report["baselineNbytes"]
+    report = combinationAccuracy(massTensor, 2, mask)
+    assert report["baselineNonFinite"] == 3 and report["nonFinite"] == 0
+
+
+def test_FusionState_logDomain():
+    rng = np.random.default_rng(7)
+    masses = rng.dirichlet(np.ones(16), size=(2, 300))
+    state, logState = FusionState(2), FusionState(2, logDomain=True)
+    for s in range(300):
+        state.add(np.array([1, 2]), masses[:, s].T.copy())
+        logState.add(np.array([1, 2]), masses[:, s].T.copy())
+    assert not np.isfinite(state.finalize()[1]).all()
+    keys, Mass = logState.finalize()
+    assert np.allclose(Mass.sum(axis=1), 1)
+    half = FusionState(2, logDomain=True)
+    for s in range(150):
+        half.add(np.array([1, 2]), masses[:, s].T.copy())
+    other = FusionState(2, logDomain=True)
+    for s in range(150, 300):
+        other.add(np.array([2, 1]), masses[::-1, s].T.copy())
+    assert np.allclose(half.merge(other).finalize()[1], Mass)
+
+
+def test_DSTBatch_singletonOmega_fast_path():
+    from combinationRules import isSingletonOmega
+    rng = np.random.default_rng(12)
+    massTensor = np.zeros((30, 16, 5))
+    massTensor[:, [1, 2, 4, 8, 15], :] = rng.dirichlet(np.ones(5), size=(30, 5)).transpose(0, 2, 1)
+    mask = rng.random((30, 5)) < 0.7
+    mask[0] = False
+    alpha = rng.random((30, 5))
+    assert isSingletonOmega(massTensor, axis=1) and not isSingletonOmega(np.ones((4, 16, 2)), axis=1)
+    for criterion in (1, 2, 3):
+        for kwargs in ({}, {"mask": mask}, {"mask": mask, "alpha": alpha}, {"logDomain": True}):
+            assert np.allclose(DSTBatch(massTensor, criterion, **kwargs),
+                               DSTBatch(massTensor, criterion, singletonOmega=False, **kwargs), equal_nan=True)
+
+
+def test_weight_rules():
+    rng = np.random.default_rng(7)
+    massIn = rng.dirichlet(np.ones(8), size=2).T
+    # the cautious and bold rules are idempotent
+    assert np.allclose(DST(np.hstack([massIn[:, :1]] * 3), 9)[:, 0], massIn[:, 0])
+    assert np.allclose(DST(np.hstack([massIn[:, :1]] * 3), 11)[:, 0], massIn[:, 0])
+    # the cautious rule keeps the smallest weight of every simple mass
+    simple = np.zeros((8, 3))
+    simple[[3, 7], 0] = 0.4, 0.6
+    simple[[3, 7], 1] = 0.2, 0.8
+    simple[[5, 7], 2] = 0.5, 0.5
+    expected = DST(simple[:, [0, 2]], 1)
+    assert np.allclose(DST(simple, 9), expected)
+    assert np.allclose(DST(simple[:, :2], 10), simple[:, [1]])   # the largest weight of the two
+    mask = np.array([[True, False, True], [False, True, False], [False, False, False]])
+    massCom = DSTBatch(np.repeat(simple[np.newaxis], 3, axis=0), 9, mask)
+    assert np.allclose(massCom[0], expected[:, 0])
+    assert np.allclose(massCom[1], simple[:, 1])
+    assert np.allclose(massCom[2], np.eye(8)[-1])
+    # dogmatic masses are discounted by epsilon
+    bayesian = rng.dirichlet(np.ones(3), size=2).T
+    massIn = np.zeros((8, 2))
+    massIn[[1, 2, 4]] = bayesian
+    massCom = DST(massIn, 9)
+    assert np.all(np.isfinite(massCom)) and np.isclose(massCom.sum(), 1)
+
+
+def test_LNS_rules():
+    simple = np.zeros((8, 4))
+    for k, (focal, w) in enumerate([(3, 0.5), (3, 0.5), (3, 0.8), (5, 0.4)]):
+        simple[[focal, 7], k] = 1 - w, w
+    expected = np.zeros(8)
+    expected[[3, 5, 7]] = 0.75 * (1 - 0.2), 0.25 * 0.6, 1 - 0.6 - 0.15
+    assert np.allclose(DST(simple, 13)[:, 0], expected)
+    expected[[3, 5, 7]] = 0.75 * 0.5, 0.25 * 0.6, 1 - 0.75 * 0.5 - 0.25 * 0.6
+    assert np.allclose(DST(simple, 131)[:, 0], expected)
+
+
+def test_PCR6_bounded_chunks_and_large_crowds():
+    from combinationRules import _PCR6
+    rng = np.random.default_rng(9)
+    massTensor = rng.dirichlet(np.ones(8), size=(2, 4)).transpose(0, 2, 1)
+    # tuples handled by small chunks give the same result
+    assert np.allclose(_PCR6(massTensor, maxSize=64), DSTBatch(massTensor, 8))
+    # every group is combined independently of the other groups of the call
+    other = np.zeros((1, 8, 4))
+    other[0, [1, 7]] = 0.5
+    assert np.array_equal(DSTBatch(np.concatenate([massTensor, other]), 8)[:2], DSTBatch(massTensor, 8))
+    # above maxTuples, the sequential rule is only used on demand
+    with pytest.raises(IllegalCriterionError):
+        _PCR6(massTensor, maxTuples=10)
+    sequential = massTensor[:, :, 0]
+    for s in range(1, 4):
+        sequential = np.stack([_bruteCombination(np.column_stack([sequential[k], massTensor[k, :, s]]), pcr6=True)
+                               for k in range(2)])
+    assert np.allclose(_PCR6(massTensor, maxTuples=10, sequential=True), sequential)
+    crowd = rng.dirichlet(np.ones(16), size=(3, 40)).transpose(0, 2, 1)
+    with pytest.raises(IllegalCriterionError):
+        DSTBatch(crowd, 8)
+    massCom = DSTBatch(crowd, 8, sequentialPCR6=True)
+    assert np.all(np.isfinite(massCom)) and np.allclose(massCom.sum(axis=1), 1)
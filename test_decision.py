@@ -3,3 +3,32 @@ import numpy as np
 massMat = np.array([0.09007352300893699, 0.4540690072094766, 0.10256771837295282, 0.19918608688158584])
 
 print("betP decision: ",decisionDST(massMat,4))
+
+
+def test_decisionDST_batch_criteria():
+    massMat = np.random.default_rng(0).dirichlet(np.ones(8), size=20).T
+    subsets = range(8)
+    for k in range(massMat.shape[1]):
+        m = massMat[:, k]
+        bel = [sum(m[b] for b in subsets if b and b & a == b) for a in subsets]
+        pl = [sum(m[b] for b in subsets if b & a) for a in subsets]
+        belS, plS = np.array(bel)[[1, 2, 4]], np.array(pl)[[1, 2, 4]]
+        assert decisionDST(massMat, 1)[k] == np.argmax(plS)
+        assert decisionDST(massMat, 2)[k] == np.argmax(belS)
+        best = np.argmax(belS)
+        rejected = belS[best] < np.max(np.delete(plS, best))
+        assert decisionDST(massMat, 3)[k] == (-1 if rejected else best)
+        assert decisionDST(massMat, 4)[k] == np.argmax(mtobetp(m))
+        appriou = [pl[a] / bin(a).count("1") ** 0.5 if a else 0 for a in subsets]
+        assert decisionDST(massMat, 5)[k] == np.argmax(appriou)
+
+
+def test_singletonOmega_fast_path():
+    rng = np.random.default_rng(11)
+    mass = np.zeros((16, 500))
+    mass[[0, 1, 2, 4, 8, 15]] = rng.dirichlet(np.ones(6), size=500).T
+    mass[0, :250] = 0
+    mass /= mass.sum(axis=0)
+    mass[:, 0] = [0, 0.25, 0.25, 0, 0.25, 0, 0, 0, 0.25, 0, 0, 0, 0, 0, 0, 0]   # ties
+    for criterion in (1, 2, 3, 4):
+        assert np.array_equal(decisionDST(mass, criterion), decisionDST(mass, criterion, singletonOmega=False))
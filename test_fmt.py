@@ -10,3 +10,52 @@ vect = np.array([0.2, 0.3 ,0.5 ,0.8 ,0.4 ,0.9 ,0.1, 0.0])
 print("qtom: ",test_qtom(vect))
 print("mtoq: ",mtoq(vect))
 print("mtobetp: ",mtobetp(vect))
+
+
+def test_batch_matches_brute_force_transforms():
+    massMat = np.random.default_rng(0).random((16, 7))
+    subsets = range(16)
+    q = np.array([[sum(massMat[B, k] for B in subsets if B & A == A) for k in range(7)] for A in subsets])
+    b = np.array([[sum(massMat[B, k] for B in subsets if B & A == B) for k in range(7)] for A in subsets])
+    assert np.allclose(mtoqBatch(massMat), q)
+    assert np.allclose(mtobBatch(massMat), b)
+    assert np.allclose(qtomBatch(q), massMat)
+    assert np.allclose(btomBatch(b), massMat)
+    assert np.allclose(mtoq(massMat[:, 0]), q[:, 0])
+    assert np.allclose(mtob(massMat[:, 0]), b[:, 0])
+    assert np.allclose(qtom(mtoq(massMat[:, 0])), massMat[:, 0])
+
+
+def test_batch_inplace_roundtrip():
+    massMat = np.random.default_rng(1).random((32, 3))
+    work = massMat.copy()
+    assert mtoqBatch(work, inplace=True) is work
+    qtomBatch(work, inplace=True)
+    assert np.allclose(work, massMat)
+    mtobBatch(work, inplace=True)
+    btomBatch(work, inplace=True)
+    assert np.allclose(work, massMat)
+
+
+def test_mtobetpBatch():
+    massMat = np.random.default_rng(2).dirichlet(np.ones(8), size=4).T
+    betp = mtobetpBatch(massMat)
+    assert betp.shape == (3, 4)
+    assert np.allclose(betp.sum(axis=0), 1)
+    expected = np.zeros(3)
+    for subset in range(1, 8):   # share every subset equally among its atoms
+        atoms = [i for i in range(3) if subset >> i & 1]
+        expected[atoms] += massMat[subset, 0] / len(atoms)
+    assert np.allclose(betp[:, 0], expected / (1 - massMat[0, 0]))
+    assert np.allclose(mtobetp(massMat[:, 0]), betp[:, 0])
+
+
+def test_weight_decompositions():
+    massMat = np.random.default_rng(3).dirichlet(np.ones(16), size=(4, 2)).transpose(2, 0, 1)
+    assert np.allclose(wtomBatch(mtowBatch(massMat)), massMat)
+    assert np.allclose(vtomBatch(mtovBatch(massMat)), massMat)
+    simple = np.zeros(8)
+    simple[[3, 7]] = 0.3, 0.7    # simple mass {0, 1}^0.7
+    assert np.allclose(mtowBatch(simple), np.where(np.arange(8) == 3, 0.7, 1.0))
+    simple[[0, 7]] = 0.7, 0.0    # disjunctive simple mass: 0.7 on the empty set
+    assert np.allclose(mtovBatch(simple), np.where(np.arange(8) == 3, 0.7, 1.0))
@@ -0,0 +1,41 @@
+import numpy as np
+from preferenceFusion import fusion
+from fusionCache import FusionCache
+from generator import generateUsers
+
+
+def test_fusion_cache_reuses_unchanged_pairs(tmp_path):
+    users = generateUsers(4, list(range(8)), rng=0, conflict=0.3)
+    alpha = np.array([1.0, 0.9, 0.8, 0.5])
+    expected = fusion(users, 2, alpha=alpha)
+    cache = FusionCache(str(tmp_path / "cache"))
+    cached = fusion(users, 2, alpha=alpha, cache=cache)
+    assert cache.misses_ == 28 and len(cache) == 28
+    assert np.allclose(cached.beliefTable_.massArr_, expected.beliefTable_.massArr_)
+    for criterion in (1, 2, 3, 4):
+        assert cached.getRelations(criterion) == expected.getRelations(criterion)
+    # a new run on the same directory only combines the changed pair
+    users[1].beliefTable_.setRows([5], [[0.7, 0.1, 0.1, 0.0]])
+    cache = FusionCache(str(tmp_path / "cache"), prune=True)
+    cached = fusion(users, 2, alpha=alpha, cache=cache)
+    assert (cache.hits_, cache.misses_, len(cache)) == (27, 1, 28)
+    assert np.allclose(cached.beliefTable_.massArr_, fusion(users, 2, alpha=alpha).beliefTable_.massArr_)
+    # other parameters give other keys
+    fusion(users, 1, cache=cache)
+    assert cache.hits_ == 0
+    fusion(users, 1, dtype=np.float32, cache=cache)
+    assert cache.hits_ == 0
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == ["cache.npy"]   # no temporary file left
+
+
+def test_fusion_cache_discards_a_damaged_file(tmp_path):
+    users = generateUsers(3, list(range(5)), rng=1)
+    cache = FusionCache(str(tmp_path))
+    fusion(users, 1, cache=cache)
+    assert len(cache) == 10
+    path = tmp_path / "cache.npy"
+    path.write_bytes(path.read_bytes()[:-100])   # interrupted write
+    cache = FusionCache(str(tmp_path))
+    assert len(cache) == 0
+    fusion(users, 1, cache=cache)
+    assert (cache.misses_, len(FusionCache(str(tmp_path)))) == (10, 10)
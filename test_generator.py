@@ -0,0 +1,30 @@
+import numpy as np
+from baseClass import *
+from generator import *
+
+
+def test_randomMasses_relations():
+    relations = drawRelations(1000, 0, [0.5, 0.2, 0.1, 0.1, 0.1])
+    assert np.isclose(np.mean(relations == 0), 0.5, atol=0.05)
+    masses = randomMasses(1000, 1, relations)
+    assert np.allclose(masses.sum(axis=1), 1) and np.array_equal(np.argmax(masses, axis=1), relations)
+    assert np.array_equal(randomMasses(10, 7, relations[:10]), randomMasses(10, 7, relations[:10]))
+
+
+def test_userStream_conflict():
+    alters = list(range(12))
+
+    def agreement(conflict):
+        first, second = [u.getRelations() for u in userStream(2, alters, rng=3, conflict=conflict, concentration=0.2)]
+        return np.mean([first[p] == second[p] for p in first])
+    assert agreement(0.0) > agreement(1.0) + 0.4
+    users = generateUsers(2, alters, rng=3, conflict=1.0, density=0.5)
+    assert all(0.3 < len(u.relationDict_) / 66 < 0.7 for u in users)
+
+
+def test_autoGen():
+    belief = PairBelief([0, 0, 0, 0])
+    belief.autoGen(2, rng=0)
+    values = [belief.massValDict_[key] for key in belief.massTypeList_]
+    assert np.isclose(sum(values), 1) and np.argmax(values) == 2
+    belief.autoGen()
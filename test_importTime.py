@@ -0,0 +1,38 @@
+import os
+import sys
+import subprocess
+
+# generous bound (seconds) on the cumulative import time of a module in a fresh interpreter, numpy
+# excluded (it is imported first), so that a loaded machine does not fail the test
+IMPORT_BUDGET = 2.0
+
+
+def _fresh(code, *options):
+    """Run code in a fresh interpreter, from the directory of the modules, and return its output and error words."""
+    run = subprocess.run([sys.executable, *options, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return run.stdout.split(), run.stderr
+
+
+def _importTime(module):
+    """Cumulative import time (seconds) of module, from python -X importtime, after numpy."""
+    _, report = _fresh("import numpy, %s" % module, "-X", "importtime")
+    for line in report.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    raise AssertionError("no import time reported for %s" % module)
+
+
+def test_core_import_is_light():
+    loaded, _ = _fresh("import sys, beliefCore; "
+                       "print(any(m in sys.modules for m in ('matplotlib', 'networkx', 'scipy', 'baseClass')))")
+    assert loaded == ["False"]
+    assert _importTime("beliefCore") < IMPORT_BUDGET
+
+
+def test_fusion_does_not_load_graph_libraries():
+    loaded, _ = _fresh("import sys, preferenceFusion; print(any(m in sys.modules for m in ('matplotlib', 'networkx')))")
+    assert loaded == ["False"]
+    assert _importTime("preferenceFusion") < IMPORT_BUDGET
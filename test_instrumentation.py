@@ -0,0 +1,30 @@
+import numpy as np
+import instrumentation
+from baseClass import *
+from preferenceFusion import fusion
+from test_preferenceFusion import _randomUsers
+
+
+def test_fusion_stages():
+    users = _randomUsers(3, list("abcd"))
+    records = []
+    hook = lambda name, record: records.append(name)
+    instrumentation.reset()
+    instrumentation.addHook(hook)
+    instrumentation.enable(trackMemory=True)
+    try:
+        fUser = fusion(users, 1)
+        fUser.getRelations()
+        PairBelief([0.2, 0.3, 0.1, 0.1]).getMeanMassVect()
+    finally:
+        instrumentation.disable()
+        instrumentation.removeHook(hook)
+    report = instrumentation.report()
+    for name in ("fusion.pairs", "fusion.massVectors", "fusion.combination", "fusion.build",
+                 "DST", "DST.singletonOmega", "decision", "meanMassVect"):
+        assert report[name]["calls"] >= 1 and name in records
+    assert report["fusion.pairs"]["items"] == 6 and report["fusion.massVectors"]["nbytes"] == 6 * 16 * 3 * 8
+    assert report["fusion.massVectors"]["allocated"] > 0
+    instrumentation.reset()
+    fusion(users, 1)
+    assert instrumentation.report() == {} and instrumentation.reportJSON() == "{}"
@@ -0,0 +1,36 @@
+import numpy as np
+from baseClass import *
+from loader import *
+from preferenceFusion import fusion, userFromState
+from test_preferenceFusion import _randomUsers, _sameBeliefs
+
+
+def _writeCSV(path, users):
+    with open(path, "w") as csvFile:
+        csvFile.write(",".join(COLUMNS) + "\n")
+        for u, user in enumerate(users):
+            for pair, belief in user.relationDict_.items():
+                if belief is not None:
+                    a, b = sorted(pair)[::-1] if u % 2 else sorted(pair)
+                    masses = user.beliefTable_.getMasses([a], [b])[0, :4]
+                    csvFile.write("%d,%d,%d,%s\n" % (u, a, b, ",".join(repr(float(x)) for x in masses)))
+
+
+def test_csv_columns_fusion(tmp_path):
+    users = _randomUsers(5, list(range(6)), seed=2)
+    path = str(tmp_path / "masses.csv")
+    _writeCSV(path, users)
+    nbRows = csvToColumns(path, str(tmp_path / "columns"), chunkSize=7)
+    columns = loadColumns(str(tmp_path / "columns"))
+    assert isinstance(columns["masses"], np.memmap) and columns["users"].shape == (nbRows,)
+    parsed = readCSV(path)
+    assert all(np.array_equal(parsed[name], columns[name]) for name in parsed)
+    fused = userFromState(fusionStateColumns(columns, 1, chunkSize=11))
+    _sameBeliefs(fused, fusion(users, 1))
+    relations = decideColumns(columns, chunkSize=4)
+    user = User(str(tmp_path / "columns"), userId=1)
+    _sameBeliefs(user, users[1])
+    rows = np.flatnonzero(columns["users"] == 1)
+    alters = columns["alters"][rows]
+    assert all(user.relationDict_[frozenset(p)].getRelation() == (r if p[0] < p[1] else [1, 0, 2, 3, 4, 5][r])
+               for p, r in zip(alters.tolist(), relations[rows].tolist()))
@@ -0,0 +1,57 @@
+import numpy as np
+from metrics import *
+from combinationRules import DST, DSTBatch
+
+
+def _jousselmeLoop(m1, m2):
+    n = m1.size
+    d = 0.0
+    for a in range(n):
+        for b in range(n):
+            union = bin(a | b).count("1")
+            jac = 1.0 if union == 0 else bin(a & b).count("1") / union
+            d += (m1[a] - m2[a]) * jac * (m1[b] - m2[b])
+    return np.sqrt(0.5 * d)
+
+
+def test_jousselme():
+    rng = np.random.default_rng(8)
+    masses = rng.dirichlet(np.ones(8), size=5).T
+    expected = np.array([[_jousselmeLoop(masses[:, i], masses[:, j]) for j in range(5)] for i in range(5)])
+    assert np.allclose(jousselmeMatrix(masses), expected)
+    assert np.allclose(jousselme(masses, masses[:, :1]), expected[:, 0])
+    assert np.isclose(jousselme(np.eye(8)[1], np.eye(8)[2]), 1.0)
+
+
+def test_conflict():
+    rng = np.random.default_rng(9)
+    massTensor = rng.dirichlet(np.ones(16), size=(3, 2)).transpose(0, 2, 1)
+    assert np.allclose(conflict(massTensor), [DST(massTensor[k], 1)[0, 0] for k in range(3)])
+    assert np.allclose(pairConflict(massTensor[:, :, 0].T, massTensor[:, :, 1].T), conflict(massTensor))
+
+
+def test_consensus_reliability():
+    rng = np.random.default_rng(10)
+    massTensor = np.zeros((20, 16, 4))
+    massTensor[:, 1, :3] = 0.9
+    massTensor[:, 2, 3] = 0.9   # the last source disagrees
+    massTensor[:, 15, :] = 0.1
+    mask = rng.random((20, 4)) < 0.9
+    mask[:, 3] = True
+    distances, consensus = consensusDistances(massTensor, mask)
+    assert np.isnan(distances[~mask]).all()
+    assert np.allclose(distances[mask], jousselme(np.moveaxis(massTensor, 1, 0), consensus.T[:, :, np.newaxis])[mask])
+    alpha = reliability(distances, perSource=True)
+    assert alpha.shape == (4,) and np.argmin(alpha) == 3 and np.all(alpha[:3] > alpha[3])
+    assert reliability(distances).shape == (20, 4)
+    DSTBatch(massTensor, 1, mask, alpha=alpha)
+
+
+def test_userReliability():
+    from generator import generateUsers
+    from preferenceFusion import fusion
+    users = generateUsers(4, list(range(6)), rng=2, concentration=0.3)
+    outlier = generateUsers(1, list(range(6)), rng=5, concentration=0.3)
+    alpha = userReliability(users + outlier)
+    assert alpha.shape == (5,) and np.argmin(alpha) == 4
+    fusion(users + outlier, 1, alpha=alpha)
@@ -0,0 +1,37 @@
+import itertools
+
+import numpy as np
+import networkx as nx
+from prefMatrix import *
+
+
+def _randomRelations(n, seed):
+    pairs = np.array(list(itertools.combinations(range(n), 2)))
+    relations = np.random.default_rng(seed).choice([0, 1, 1, 2, 3, 5], size=len(pairs))
+    return pairs[:, 0], pairs[:, 1], relations
+
+
+def test_adjacency_dense_sparse():
+    lo, hi, relations = _randomRelations(9, 0)
+    dense = adjacencyMatrix(9, lo, hi, relations)
+    assert np.array_equal(adjacencyMatrix(9, lo, hi, relations, sparse=True).toarray(), dense)
+    assert dense[lo[relations == 2], hi[relations == 2]].all() and dense[hi[relations == 2], lo[relations == 2]].all()
+    assert not dense[lo[relations >= 3], hi[relations >= 3]].any()
+
+
+def test_cycles_and_closure():
+    for seed in range(5):
+        lo, hi, relations = _randomRelations(12, seed)
+        relations[relations == 2] = 3
+        adj = adjacencyMatrix(12, lo, hi, relations, sparse=seed % 2 == 0)
+        graph = nx.from_numpy_array(np.asarray(adj.todense()) if seed % 2 == 0 else adj.astype(int), create_using=nx.DiGraph)
+        expected = sorted(sorted(c) for c in nx.strongly_connected_components(graph) if len(c) > 1)
+        assert sorted(sorted(c.tolist()) for c in cycles(adj)) == expected
+        closure = transitiveClosure(adj)
+        closure = closure.toarray() if seed % 2 == 0 else closure
+        reference = np.zeros((12, 12), dtype=bool)
+        for i in range(12):
+            for j in nx.descendants(graph, i):
+                reference[i, j] = True
+            reference[i, i] = any(nx.has_path(graph, k, i) for k in graph.successors(i))
+        assert np.array_equal(closure, reference)
@@ -0,0 +1,67 @@
+import numpy as np
+from preferenceFusion import *
+from baseClass import meanMassMatrix
+from combinationRules import DST
+
+
+def _randomUsers(nbUsers, alters, seed=0):
+    rng = np.random.default_rng(seed)
+    users = []
+    for _ in range(nbUsers):
+        order = list(alters)
+        rng.shuffle(order)   # users do not list the alternatives in the same order
+        user = User(order)
+        for pair in user.relationDict_:
+            user.relationDict_[pair] = PairBelief(list(rng.dirichlet(np.ones(5))[:4]))
+        users.append(user)
+    del users[-1].relationDict_[frozenset(alters[:2])]
+    return users
+
+
+def _sameBeliefs(userA, userB):
+    assert set(userA.relationDict_) == set(userB.relationDict_)
+    for pair, belief in userA.relationDict_.items():
+        assert np.allclose(list(belief.massValDict_.values()),
+                           list(userB.relationDict_[pair].massValDict_.values()))
+
+
+def test_fusionStream_matches_fusion():
+    users = _randomUsers(4, list("abcdef"))
+    for criterion in (1, 2, 3, 4, 12):
+        _sameBeliefs(fusion(users, criterion), fusionStream(iter(users), criterion))
+
+
+def test_parallel_fusion_matches_serial():
+    users = _randomUsers(3, list("abcdefg"), seed=1)
+    serial = fusion(users, 2)
+    parallel = fusion(users, 2, nbWorkers=2, chunkSize=4)
+    assert np.array_equal(serial.beliefTable_.massArr_, parallel.beliefTable_.massArr_)
+
+
+def test_merged_fusion_states(tmp_path):
+    users = _randomUsers(5, list(range(6)), seed=2)
+    for criterion in (1, 4, 12):
+        shardA = fusionState(users[:2], criterion)
+        shardA.save(tmp_path / "shardA.npz")
+        shardB = fusionState(users[2:], criterion)
+        merged = loadFusionState(tmp_path / "shardA.npz").merge(shardB)
+        _sameBeliefs(userFromState(merged), fusion(users, criterion))
+
+
+def test_fusion_discounted_users():
+    from discounting import discounting
+    users = _randomUsers(3, list("abcd"), seed=3)
+    alpha = np.array([0.9, 0.5, 0.2])
+    fused = fusion(users, 1, alpha=alpha)
+    masses = meanMassMatrix(np.vstack([u.beliefTable_.getMasses(["c"], ["d"])[:, :4] for u in users]))
+    expected = DST(discounting(masses, alpha), 1)[:, 0]
+    assert np.allclose(fused.beliefTable_.getMasses(["c"], ["d"])[0, :5], expected[[1, 2, 4, 8, 0]])
+    _sameBeliefs(fused, fusion(users, 1, nbWorkers=2, alpha=alpha))
+
+
+def test_parallel_PCR6_matches_serial():
+    from generator import generateUsers
+    users = generateUsers(9, list(range(4)), rng=3, conflict=0.3, density=0.8)
+    serial = fusion(users, 8)
+    parallel = fusion(users, 8, nbWorkers=2, chunkSize=2)
+    assert np.array_equal(serial.beliefTable_.massArr_, parallel.beliefTable_.massArr_)
@@ -0,0 +1,36 @@
+import itertools
+
+import numpy as np
+import networkx as nx
+from preferenceGraph import *
+
+
+def _sccs(graph):
+    return sorted(sorted(c) for c in graph.cycles())
+
+
+def test_incremental_scc_random():
+    rng = np.random.default_rng(3)
+    graph, reference = PreferenceGraph(range(8)), nx.DiGraph()
+    reference.add_nodes_from(range(8))
+    for _ in range(400):
+        u, v = rng.choice(8, size=2, replace=False).tolist()
+        if rng.random() < 0.6:
+            graph.addEdge(u, v)
+            reference.add_edge(u, v)
+        elif reference.has_edge(u, v):
+            graph.removeEdge(u, v)
+            reference.remove_edge(u, v)
+        expected = sorted(sorted(c) for c in nx.strongly_connected_components(reference) if len(c) > 1)
+        assert _sccs(graph) == expected
+
+
+def test_setPair():
+    graph = PreferenceGraph()
+    graph.setPair("a", "b", 0)
+    graph.setPair("b", "c", 0)
+    assert not graph.hasCycle()
+    graph.setPair("a", "c", 1)
+    assert _sccs(graph) == [["a", "b", "c"]] and graph.inCycle("b")
+    graph.setPair("c", "a", 3)
+    assert not graph.hasCycle() and graph.edges() and graph.component("a") == {"a"}
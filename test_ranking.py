@@ -0,0 +1,40 @@
+import numpy as np
+from ranking import *
+from generator import generateUsers
+from preferenceFusion import fusion
+
+
+def test_rankings_recover_a_consistent_order():
+    users = generateUsers(3, list(range(6)), rng=0, relationProbs=[1, 0, 0, 0, 0], concentration=0.2)
+    aggregator = RankingAggregator(fusion(users, 2))
+    for method in ("copeland", "borda", "kemeny"):
+        assert aggregator.ranking(method) == list(range(6))
+    assert aggregator.topK(2) == [0, 1]
+
+
+def test_kemeny_improves_borda():
+    rng = np.random.default_rng(1)
+    P = rng.random((30, 30))
+    np.fill_diagonal(P, 0)
+    borda = topK(bordaScores(P), 30)
+    order = kemenyRanking(P)
+    assert sorted(order.tolist()) == list(range(30))
+    assert kemenyScore(P, order) >= kemenyScore(P, borda)
+    # no single move improves the local optimum
+    assert np.array_equal(kemenyRanking(P, order), order)
+
+
+def test_topK():
+    scores = np.array([0.3, 0.9, 0.1, 0.9, 0.5])
+    assert topK(scores, 3).tolist() == [1, 3, 4]
+    assert topK(scores, 10).tolist() == [1, 3, 4, 0, 2]
+
+
+def test_aggregator_follows_fusion_updates():
+    user = fusion(generateUsers(4, list(range(8)), rng=2, conflict=0.4), 2)
+    aggregator = RankingAggregator(user, measure="pl")
+    user.beliefTable_.setRows([0, 5, 9], [[0.0, 0.9, 0.0, 0.0], [0.6, 0.2, 0.1, 0.0], [0.0, 0.0, 0.0, 0.0]])
+    expected = RankingAggregator(user, measure="pl")
+    for method in ("copeland", "borda"):
+        assert np.allclose(aggregator.scores(method), expected.scores(method))
+    assert np.array_equal(aggregator.P_, expected.P_)
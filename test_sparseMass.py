@@ -0,0 +1,25 @@
+import numpy as np
+from sparseMass import *
+from combinationRules import DST
+from discounting import discounting
+from DST_fmt_functions import mtobetp
+
+
+def test_sparse_matches_dense():
+    massIn = np.random.default_rng(0).dirichlet(np.ones(16), size=3).T
+    massIn[massIn < 0.05] = 0
+    massIn /= massIn.sum(axis=0)
+    sparse = [denseToSparse(massIn[:, s]) for s in range(3)]
+    assert np.allclose(sparse[0].toDense(), massIn[:, 0])
+    for criterion in (1, 2, 3, 4):
+        assert np.allclose(combineSparse(sparse, criterion).toDense(), DST(massIn, criterion)[:, 0])
+    assert np.allclose(sparse[1].discount(0.7).toDense(), discounting(massIn[:, 1], 0.7)[:, 0])
+    assert np.allclose(sparse[2].betP(), mtobetp(massIn[:, 2]))
+
+
+def test_large_frame():
+    natoms = 40
+    singletons = [SparseMass([1 << i, (1 << natoms) - 1], [0.3, 0.7], natoms) for i in range(natoms)]
+    result = combineSparse(singletons, 2)
+    assert np.isclose(result.values_.sum(), 1)
+    assert np.allclose(result.betP(), 1.0 / natoms)